@@ -0,0 +1,26 @@
+import sys
+import time
+from optmod import VariableScalar, Problem, minimize, sin, cos
+
+# Chain of nested expressions (depth 2n), as built incrementally
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+x = VariableScalar(name='x', value=0.1)
+y = VariableScalar(name='y', value=0.2)
+
+t0 = time.time()
+f = x
+for i in range(n):
+    f = sin(f)*y if i % 2 else cos(f) + x
+print('build:', time.time()-t0)
+
+for name, task in [('value', lambda: f.get_value()),
+                   ('variables', lambda: len(f.get_variables())),
+                   ('analyze', lambda: f.__analyze__()['affine']),
+                   ('evaluator', lambda: f.get_fast_evaluator([x, y]).num_nodes),
+                   ('derivatives', lambda: f.get_derivatives([x, y])[x].get_value()),
+                   ('std problem', lambda: Problem(minimize(f), [f <= 1.]).__get_std_problem__().x.size),
+                   ('repr', lambda: len(str(f)))]:
+    t0 = time.time()
+    result = task()
+    print('%s:' %name, time.time()-t0, result)
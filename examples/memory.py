@@ -0,0 +1,26 @@
+import tracemalloc
+from optmod import VariableScalar, sin
+from optmod.constant import Constant
+from optmod.function import multiply
+
+n = 100000
+
+def bytes_per_node(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after-before)/len(nodes)
+
+x = [VariableScalar(name='x') for i in range(n)]
+
+# Bytes per node with a per-instance __dict__ (before __slots__, Python 3.11)
+tasks = [('variable', 164, lambda: [VariableScalar(name='x') for i in range(n)]),
+         ('constant', 120, lambda: [Constant(float(i)) for i in range(n)]),
+         ('multiply', 168, lambda: [multiply([x[i], x[i-1]]) for i in range(n)]),
+         ('sin', 160, lambda: [sin(x[i]) for i in range(n)])]
+
+print('%-10s %8s %8s' %('node', 'dict', 'slots'))
+for name, baseline, build in tasks:
+    print('%-10s %8d %8.0f' %(name, baseline, bytes_per_node(build)))
@@ -6,6 +6,7 @@ from . import function
 from . import problem
 from . import coptmod
 
+from .expression import interning
 from .variable import VariableScalar, VariableMatrix, VariableDict
 from .function import sin, cos
 from .problem import minimize, maximize, EmptyObjective, Problem
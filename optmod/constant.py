@@ -6,6 +6,8 @@ from .expression import Expression
 
 class Constant(Expression):
 
+    __slots__ = ()
+
     def __init__(self, value):
 
         Expression.__init__(self)
@@ -30,12 +32,9 @@ class Constant(Expression):
 
         return coptmod.NODE_TYPE_CONSTANT
 
-    def __fill_evaluator__(self, evaluator):
+    def __intern_key__(self):
 
-        evaluator.add_node(self.__evaluator_node_type__(),
-                           id(self),
-                           self.__value__,
-                           [])
+        return (Constant, self.__value__)
 
     def is_zero(self):
 
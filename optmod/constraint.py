@@ -37,7 +37,7 @@ class Constraint(object):
                 'l_list',
                 'prop_list']
 
-    def __get_std_components__(self, counters=None):
+    def __get_std_components__(self, counters=None, derivatives=True):
 
         cA_list = [] # list of constraints
         cJ_list = [] # list of constraints
@@ -57,7 +57,7 @@ class Constraint(object):
         exp = self.lhs-self.rhs
         op = self.op
 
-        exp_comp = exp.__get_std_components__()
+        exp_comp = exp.__get_std_components__(derivatives=derivatives)
         phi = exp_comp['phi']
         gphi_list = exp_comp['gphi_list']
         Hphi_list = exp_comp['Hphi_list']
@@ -101,7 +101,9 @@ class Constraint(object):
                 else:
                     l_list.append((s, 0, self))
                 counters['A_row'] += 1
+                a = dict(a) # analysis is cached by the expression
                 a[s] = 1.
+                prop_list[-1] = dict(phi_prop, a=a)
 
         # Nonlinear
         else:
@@ -129,7 +131,9 @@ class Constraint(object):
                 else:
                     l_list.append((s, 0, self))
                 counters['J_row'] += 1
+                a = dict(a) # analysis is cached by the expression
                 a[s] = 1.
+                prop_list[-1] = dict(phi_prop, a=a)
 
         # Return
         return {'cA_list': cA_list,
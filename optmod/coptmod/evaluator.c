@@ -12,33 +12,988 @@
 
 struct Evaluator {
 
+  // Nodes (struct of arrays, indexed by node index)
   int max_nodes;
   int num_nodes;
-  Node* nodes;
+  char* types;
+  uintptr_t* ids;
+  double* node_values;
+  int* arg_start;
+  int* num_args;
+
+  // Node arguments (node indices)
+  int max_args;
+  int total_args;
+  int* args;
+
+  // Map from node id to node index (open addressing)
+  int map_size;
+  int* map;
 
   int num_inputs;
-  Node** inputs;
+  int* inputs;
 
   int num_outputs;
-  Node** outputs;
+  int* outputs;
   double* values;
 
-  Node* hash;
+  // Tape (node indices sorted by level, arguments in CSR format)
+  int tape_size;
+  int tape_valid;
+  int* tape;
+  int* tape_arg_start;
+  int* tape_args;
+
+  int num_levels;
+  int* levels;
+
+  // Jacobian (nodes reachable from each output and sparsity pattern)
+  int jac_valid;
+  int* jac_tape_start;
+  int* jac_tape;
+  int* jac_start;
+  int* jac_col;
+
+  // Hessian (lower triangular sparsity pattern and column coloring)
+  int hess_valid;
+  int hess_nnz;
+  int* hess_row;
+  int* hess_col;
+  int num_colors;
+  int* color_input_start;
+  int* color_inputs;
+  int* color_entry_start;
+  int* color_entries;
+
+  int num_threads;
 };
 
+int EVALUATOR_hash(uintptr_t id, int map_size) {
+
+  uint64_t h = (uint64_t)id;
+
+  h ^= h >> 33;
+  h *= 0xff51afd7ed558ccdULL;
+  h ^= h >> 33;
+
+  return (int)(h & (uint64_t)(map_size-1));
+}
+
+void EVALUATOR_map_insert(Evaluator* e, int index) {
+
+  int i;
+
+  i = EVALUATOR_hash(e->ids[index], e->map_size);
+  while (e->map[i] >= 0)
+    i = (i+1) & (e->map_size-1);
+  e->map[i] = index;
+}
+
+void EVALUATOR_map_resize(Evaluator* e, int map_size) {
+
+  int i;
+
+  free(e->map);
+  e->map_size = map_size;
+  e->map = (int*)malloc(sizeof(int)*map_size);
+  for (i = 0; i < map_size; i++)
+    e->map[i] = -1;
+  for (i = 0; i < e->num_nodes; i++)
+    EVALUATOR_map_insert(e, i);
+}
+
+int EVALUATOR_find_node(Evaluator* e, uintptr_t id) {
+
+  int i;
+
+  if (!e)
+    return -1;
+
+  i = EVALUATOR_hash(id, e->map_size);
+  while (e->map[i] >= 0) {
+    if (e->ids[e->map[i]] == id)
+      return e->map[i];
+    i = (i+1) & (e->map_size-1);
+  }
+  return -1;
+}
+
+void EVALUATOR_set_max_nodes(Evaluator* e, int max_nodes) {
+
+  if (!e || max_nodes < e->num_nodes)
+    return;
+
+  if (max_nodes < 1)
+    max_nodes = 1;
+
+  e->types = (char*)realloc(e->types, sizeof(char)*max_nodes);
+  e->ids = (uintptr_t*)realloc(e->ids, sizeof(uintptr_t)*max_nodes);
+  e->node_values = (double*)realloc(e->node_values, sizeof(double)*max_nodes);
+  e->arg_start = (int*)realloc(e->arg_start, sizeof(int)*max_nodes);
+  e->num_args = (int*)realloc(e->num_args, sizeof(int)*max_nodes);
+  e->max_nodes = max_nodes;
+}
+
+int EVALUATOR_new_node(Evaluator* e, uintptr_t id) {
+
+  int n;
+
+  // Dynamic resize
+  if (e->num_nodes >= e->max_nodes)
+    EVALUATOR_set_max_nodes(e, 2*e->max_nodes);
+
+  // Init
+  n = e->num_nodes;
+  e->types[n] = NODE_TYPE_UNKNOWN;
+  e->ids[n] = id;
+  e->node_values[n] = 0;
+  e->arg_start[n] = 0;
+  e->num_args[n] = 0;
+  e->num_nodes += 1;
+  e->tape_valid = 0;
+
+  // Map (load factor at most 1/2)
+  if (2*e->num_nodes > e->map_size)
+    EVALUATOR_map_resize(e, 2*e->map_size);
+  else
+    EVALUATOR_map_insert(e, n);
+
+  return n;
+}
+
+int EVALUATOR_new_args(Evaluator* e, int num) {
+
+  int start;
+  int new_max_args;
+
+  if (e->total_args+num > e->max_args) {
+    new_max_args = 2*e->max_args;
+    if (new_max_args < e->total_args+num)
+      new_max_args = e->total_args+num;
+    e->args = (int*)realloc(e->args, sizeof(int)*new_max_args);
+    e->max_args = new_max_args;
+  }
+
+  start = e->total_args;
+  e->total_args += num;
+  return start;
+}
+
+void EVALUATOR_compile(Evaluator* e) {
+
+  // Local vars
+  int i;
+  int k;
+  int t;
+  int n;
+  int arg;
+  int top;
+  int num;
+  char* visited;
+  int* order;
+  int* stack_nodes;
+  int* stack_args;
+  int* node_levels;
+
+  // Check
+  if (!e)
+    return;
+
+  // Work arrays
+  visited = (char*)calloc(e->num_nodes+1, sizeof(char));
+  order = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  stack_nodes = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  stack_args = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  node_levels = (int*)calloc(e->num_nodes+1, sizeof(int));
+
+  // Post-order traversal from outputs (children before parents)
+  e->tape_size = 0;
+  for (i = 0; i < e->num_outputs; i++) {
+
+    n = e->outputs[i];
+    if (n < 0 || visited[n])
+      continue;
+
+    visited[n] = 1;
+    stack_nodes[0] = n;
+    stack_args[0] = 0;
+    top = 1;
+
+    while (top > 0) {
+      n = stack_nodes[top-1];
+      k = stack_args[top-1];
+      if (k < e->num_args[n]) {
+        stack_args[top-1] += 1;
+        arg = e->args[e->arg_start[n]+k];
+        if (!visited[arg]) {
+          visited[arg] = 1;
+          stack_nodes[top] = arg;
+          stack_args[top] = 0;
+          top += 1;
+        }
+      }
+      else {
+        order[e->tape_size] = n;
+        e->tape_size += 1;
+        top -= 1;
+      }
+    }
+  }
+
+  // Levels (a node's level exceeds those of its arguments)
+  e->num_levels = 0;
+  for (i = 0; i < e->tape_size; i++) {
+    n = order[i];
+    for (k = 0; k < e->num_args[n]; k++) {
+      arg = e->args[e->arg_start[n]+k];
+      if (node_levels[arg] >= node_levels[n])
+        node_levels[n] = node_levels[arg]+1;
+    }
+    if (node_levels[n] >= e->num_levels)
+      e->num_levels = node_levels[n]+1;
+  }
+
+  // Level offsets
+  free(e->levels);
+  e->levels = (int*)calloc(e->num_levels+1, sizeof(int));
+  for (i = 0; i < e->tape_size; i++)
+    e->levels[node_levels[order[i]]+1] += 1;
+  for (i = 0; i < e->num_levels; i++)
+    e->levels[i+1] += e->levels[i];
+
+  // Tape sorted by level
+  free(e->tape);
+  e->tape = (int*)malloc(sizeof(int)*(e->tape_size+1));
+  for (i = 0; i < e->num_levels; i++)
+    stack_args[i] = e->levels[i];
+  for (i = 0; i < e->tape_size; i++) {
+    n = order[i];
+    e->tape[stack_args[node_levels[n]]] = n;
+    stack_args[node_levels[n]] += 1;
+  }
+
+  // Tape arguments
+  free(e->tape_arg_start);
+  e->tape_arg_start = (int*)malloc(sizeof(int)*(e->tape_size+1));
+  num = 0;
+  for (t = 0; t < e->tape_size; t++) {
+    e->tape_arg_start[t] = num;
+    num += e->num_args[e->tape[t]];
+  }
+  e->tape_arg_start[e->tape_size] = num;
+  free(e->tape_args);
+  e->tape_args = (int*)malloc(sizeof(int)*(num+1));
+  for (t = 0; t < e->tape_size; t++) {
+    n = e->tape[t];
+    for (k = 0; k < e->num_args[n]; k++)
+      e->tape_args[e->tape_arg_start[t]+k] = e->args[e->arg_start[n]+k];
+  }
+
+  // Clean up
+  free(visited);
+  free(order);
+  free(stack_nodes);
+  free(stack_args);
+  free(node_levels);
+
+  // Done
+  e->tape_valid = 1;
+  e->jac_valid = 0;
+  e->hess_valid = 0;
+}
+
+void EVALUATOR_eval_tape(Evaluator* e, double* node_values, double* var_values, double* values, int parallel) {
+
+  int i;
+  int l;
+  int t;
+  int start;
+  int end;
+
+  for (i = 0; i < e->num_inputs; i++) {
+    if (e->inputs[i] >= 0)
+      node_values[e->inputs[i]] = var_values[i];
+  }
+
+  for (l = 0; l < e->num_levels; l++) {
+    start = e->levels[l];
+    end = e->levels[l+1];
+    if (parallel && e->num_threads > 1 && end-start >= EVALUATOR_MIN_PARALLEL_SIZE) {
+      #pragma omp parallel for num_threads(e->num_threads)
+      for (t = start; t < end; t++) {
+        if (!NODE_is_leaf(e->types[e->tape[t]]))
+          node_values[e->tape[t]] = NODE_eval(e->types[e->tape[t]],
+                                              node_values,
+                                              e->tape_args+e->tape_arg_start[t],
+                                              e->tape_arg_start[t+1]-e->tape_arg_start[t]);
+      }
+    }
+    else {
+      for (t = start; t < end; t++) {
+        if (!NODE_is_leaf(e->types[e->tape[t]]))
+          node_values[e->tape[t]] = NODE_eval(e->types[e->tape[t]],
+                                              node_values,
+                                              e->tape_args+e->tape_arg_start[t],
+                                              e->tape_arg_start[t+1]-e->tape_arg_start[t]);
+      }
+    }
+  }
+
+  for (i = 0; i < e->num_outputs; i++) {
+    if (e->outputs[i] >= 0)
+      values[i] = node_values[e->outputs[i]];
+    else
+      values[i] = 0;
+  }
+}
+
 void EVALUATOR_eval(Evaluator* e, double* var_values) {
 
+  if (!e)
+    return;
+
+  if (!e->tape_valid)
+    EVALUATOR_compile(e);
+
+  EVALUATOR_eval_tape(e, e->node_values, var_values, e->values, 1);
+}
+
+void EVALUATOR_eval_batch(Evaluator* e, double* var_values, int num_points, double* values) {
+
+  int k;
+  double* buffer;
+
+  if (!e)
+    return;
+
+  if (!e->tape_valid)
+    EVALUATOR_compile(e);
+
+  // Points in parallel (one node value buffer per thread)
+  if (e->num_threads > 1 && num_points > 1) {
+    #pragma omp parallel private(buffer) num_threads(e->num_threads)
+    {
+      buffer = (double*)malloc(sizeof(double)*(e->num_nodes+1));
+      memcpy(buffer, e->node_values, sizeof(double)*e->num_nodes);
+      #pragma omp for
+      for (k = 0; k < num_points; k++)
+        EVALUATOR_eval_tape(e, buffer, var_values+k*e->num_inputs, values+k*e->num_outputs, 0);
+      free(buffer);
+    }
+  }
+
+  // Points in sequence
+  else {
+    for (k = 0; k < num_points; k++)
+      EVALUATOR_eval_tape(e, e->node_values, var_values+k*e->num_inputs, values+k*e->num_outputs, 1);
+  }
+}
+
+int EVALUATOR_compare_ints(const void* a, const void* b) {
+
+  return (*(int*)a) - (*(int*)b);
+}
+
+void EVALUATOR_analyze_jacobian(Evaluator* e) {
+
+  // Local vars
   int i;
+  int k;
+  int n;
+  int arg;
+  int top;
+  int num;
+  int max_tape;
+  int max_nnz;
+  int* marks;
+  int* input_index;
+  int* stack_nodes;
+  int* stack_args;
 
+  // Check
   if (!e)
     return;
 
+  // Tape
+  if (!e->tape_valid)
+    EVALUATOR_compile(e);
+  if (e->jac_valid)
+    return;
+
+  // Work arrays
+  marks = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  input_index = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  stack_nodes = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  stack_args = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  for (i = 0; i < e->num_nodes; i++) {
+    marks[i] = -1;
+    input_index[i] = -1;
+  }
+  for (i = 0; i < e->num_inputs; i++) {
+    if (e->inputs[i] >= 0)
+      input_index[e->inputs[i]] = i;
+  }
+
+  // Reset
+  max_tape = e->tape_size+1;
+  max_nnz = e->num_inputs+1;
+  free(e->jac_tape_start);
+  free(e->jac_tape);
+  free(e->jac_start);
+  free(e->jac_col);
+  e->jac_tape_start = (int*)malloc(sizeof(int)*(e->num_outputs+1));
+  e->jac_tape = (int*)malloc(sizeof(int)*max_tape);
+  e->jac_start = (int*)malloc(sizeof(int)*(e->num_outputs+1));
+  e->jac_col = (int*)malloc(sizeof(int)*max_nnz);
+  e->jac_tape_start[0] = 0;
+  e->jac_start[0] = 0;
+
+  // Post-order traversal from each output
+  for (k = 0; k < e->num_outputs; k++) {
+
+    num = e->jac_tape_start[k];
+    n = e->outputs[k];
+
+    if (n >= 0) {
+
+      marks[n] = k;
+      stack_nodes[0] = n;
+      stack_args[0] = 0;
+      top = 1;
+
+      while (top > 0) {
+        n = stack_nodes[top-1];
+        i = stack_args[top-1];
+        if (i < e->num_args[n]) {
+          stack_args[top-1] += 1;
+          arg = e->args[e->arg_start[n]+i];
+          if (marks[arg] != k) {
+            marks[arg] = k;
+            stack_nodes[top] = arg;
+            stack_args[top] = 0;
+            top += 1;
+          }
+        }
+        else {
+          if (num >= max_tape) {
+            max_tape *= 2;
+            e->jac_tape = (int*)realloc(e->jac_tape, sizeof(int)*max_tape);
+          }
+          e->jac_tape[num] = n;
+          num += 1;
+          top -= 1;
+        }
+      }
+    }
+    e->jac_tape_start[k+1] = num;
+
+    // Sparsity pattern (inputs reachable from output, sorted)
+    num = e->jac_start[k];
+    for (i = e->jac_tape_start[k]; i < e->jac_tape_start[k+1]; i++) {
+      n = e->jac_tape[i];
+      if (input_index[n] >= 0) {
+        if (num >= max_nnz) {
+          max_nnz *= 2;
+          e->jac_col = (int*)realloc(e->jac_col, sizeof(int)*max_nnz);
+        }
+        e->jac_col[num] = input_index[n];
+        num += 1;
+      }
+    }
+    qsort(e->jac_col+e->jac_start[k], num-e->jac_start[k], sizeof(int), EVALUATOR_compare_ints);
+    e->jac_start[k+1] = num;
+  }
+
+  // Clean up
+  free(marks);
+  free(input_index);
+  free(stack_nodes);
+  free(stack_args);
+
+  // Done
+  e->jac_valid = 1;
+}
+
+void EVALUATOR_reverse_sweep(Evaluator* e, int k, double* adjoints) {
+
+  int i;
+  int n;
+
+  // Reset
+  for (i = e->jac_tape_start[k]; i < e->jac_tape_start[k+1]; i++)
+    adjoints[e->jac_tape[i]] = 0;
+  if (e->outputs[k] < 0)
+    return;
+  adjoints[e->outputs[k]] = 1.;
+
+  // Sweep (parents before children)
+  for (i = e->jac_tape_start[k+1]-1; i >= e->jac_tape_start[k]; i--) {
+    n = e->jac_tape[i];
+    if (adjoints[n] != 0.)
+      NODE_backprop(e->types[n],
+                    adjoints[n],
+                    e->node_values,
+                    adjoints,
+                    e->args+e->arg_start[n],
+                    e->num_args[n]);
+  }
+}
+
+void EVALUATOR_eval_gradient(Evaluator* e, double* var_values, int index, double* gradient) {
+
+  int i;
+  double* adjoints;
+
+  if (!e || index < 0 || index >= e->num_outputs)
+    return;
+
+  EVALUATOR_analyze_jacobian(e);
+  EVALUATOR_eval_tape(e, e->node_values, var_values, e->values, 1);
+
+  adjoints = (double*)malloc(sizeof(double)*(e->num_nodes+1));
+  EVALUATOR_reverse_sweep(e, index, adjoints);
   for (i = 0; i < e->num_inputs; i++)
-    NODE_set_value(e->inputs[i], var_values[i]);
+    gradient[i] = 0;
+  for (i = e->jac_start[index]; i < e->jac_start[index+1]; i++)
+    gradient[e->jac_col[i]] = adjoints[e->inputs[e->jac_col[i]]];
+  free(adjoints);
+}
 
-  for (i = 0; i < e->num_outputs; i++)
-    e->values[i] = NODE_get_value(e->outputs[i]);
+void EVALUATOR_eval_jacobian(Evaluator* e, double* var_values, double* data) {
+
+  int i;
+  int k;
+  double* adjoints;
+
+  if (!e)
+    return;
+
+  EVALUATOR_analyze_jacobian(e);
+  EVALUATOR_eval_tape(e, e->node_values, var_values, e->values, 1);
+
+  // Outputs (rows) in parallel, one adjoint buffer per thread
+  #pragma omp parallel private(adjoints, i) num_threads(e->num_threads) if (e->num_threads > 1 && e->num_outputs >= e->num_threads)
+  {
+    adjoints = (double*)malloc(sizeof(double)*(e->num_nodes+1));
+    #pragma omp for
+    for (k = 0; k < e->num_outputs; k++) {
+      EVALUATOR_reverse_sweep(e, k, adjoints);
+      for (i = e->jac_start[k]; i < e->jac_start[k+1]; i++)
+        data[i] = adjoints[e->inputs[e->jac_col[i]]];
+    }
+    free(adjoints);
+  }
+}
+
+int EVALUATOR_compare_keys(const void* a, const void* b) {
+
+  int64_t ka = *(int64_t*)a;
+  int64_t kb = *(int64_t*)b;
+
+  return (ka > kb) - (ka < kb);
+}
+
+void EVALUATOR_new_pairs(int64_t** pairs, int64_t* max_pairs, int64_t num_pairs, int64_t num) {
+
+  if (num_pairs+num > *max_pairs) {
+    *max_pairs = 2*(*max_pairs);
+    if (*max_pairs < num_pairs+num)
+      *max_pairs = num_pairs+num;
+    *pairs = (int64_t*)realloc(*pairs, sizeof(int64_t)*(*max_pairs));
+  }
+}
+
+void EVALUATOR_analyze_hessian(Evaluator* e) {
+
+  // Local vars
+  int i;
+  int j;
+  int k;
+  int n;
+  int t;
+  int c;
+  int m;
+  int num;
+  int a0;
+  int a1;
+  int* input_index;
+  int** deps;
+  int* num_deps;
+  int* buffer;
+  int max_buffer;
+  int64_t* pairs;
+  int64_t max_pairs;
+  int64_t num_pairs;
+  int* adj_start;
+  int* adj;
+  int* colors;
+  int* forbidden;
+
+  // Check
+  if (!e)
+    return;
+
+  // Tape
+  if (!e->tape_valid)
+    EVALUATOR_compile(e);
+  if (e->hess_valid)
+    return;
+
+  // Input index of each node
+  input_index = (int*)malloc(sizeof(int)*(e->num_nodes+1));
+  for (i = 0; i < e->num_nodes; i++)
+    input_index[i] = -1;
+  for (i = 0; i < e->num_inputs; i++) {
+    if (e->inputs[i] >= 0)
+      input_index[e->inputs[i]] = i;
+  }
+
+  // Dependencies (sorted inputs) of each node and nonlinear interactions
+  deps = (int**)calloc(e->num_nodes+1, sizeof(int*));
+  num_deps = (int*)calloc(e->num_nodes+1, sizeof(int));
+  max_buffer = e->num_inputs+1;
+  buffer = (int*)malloc(sizeof(int)*max_buffer);
+  max_pairs = e->num_inputs+1;
+  num_pairs = 0;
+  pairs = (int64_t*)malloc(sizeof(int64_t)*max_pairs);
+  for (t = 0; t < e->tape_size; t++) {
+
+    n = e->tape[t];
+
+    // Leaf
+    if (NODE_is_leaf(e->types[n])) {
+      if (input_index[n] >= 0) {
+        deps[n] = (int*)malloc(sizeof(int));
+        deps[n][0] = input_index[n];
+        num_deps[n] = 1;
+      }
+      continue;
+    }
+
+    // Union of argument dependencies
+    num = 0;
+    for (k = e->tape_arg_start[t]; k < e->tape_arg_start[t+1]; k++)
+      num += num_deps[e->tape_args[k]];
+    if (num > max_buffer) {
+      max_buffer = num;
+      buffer = (int*)realloc(buffer, sizeof(int)*max_buffer);
+    }
+    num = 0;
+    for (k = e->tape_arg_start[t]; k < e->tape_arg_start[t+1]; k++) {
+      for (i = 0; i < num_deps[e->tape_args[k]]; i++) {
+        buffer[num] = deps[e->tape_args[k]][i];
+        num += 1;
+      }
+    }
+    qsort(buffer, num, sizeof(int), EVALUATOR_compare_ints);
+    m = 0;
+    for (i = 0; i < num; i++) {
+      if (m == 0 || buffer[i] != buffer[m-1]) {
+        buffer[m] = buffer[i];
+        m += 1;
+      }
+    }
+    if (m > 0) {
+      deps[n] = (int*)malloc(sizeof(int)*m);
+      memcpy(deps[n], buffer, sizeof(int)*m);
+    }
+    num_deps[n] = m;
+
+    // Interactions
+    switch (e->types[n]) {
+    case NODE_TYPE_MULTIPLY:
+      if (e->tape_arg_start[t+1]-e->tape_arg_start[t] < 2)
+        break;
+      a0 = e->tape_args[e->tape_arg_start[t]];
+      a1 = e->tape_args[e->tape_arg_start[t]+1];
+      EVALUATOR_new_pairs(&pairs, &max_pairs, num_pairs, (int64_t)num_deps[a0]*num_deps[a1]);
+      for (i = 0; i < num_deps[a0]; i++) {
+        for (j = 0; j < num_deps[a1]; j++) {
+          if (deps[a0][i] >= deps[a1][j])
+            pairs[num_pairs] = (int64_t)deps[a0][i]*e->num_inputs+deps[a1][j];
+          else
+            pairs[num_pairs] = (int64_t)deps[a1][j]*e->num_inputs+deps[a0][i];
+          num_pairs += 1;
+        }
+      }
+      break;
+    case NODE_TYPE_SIN:
+    case NODE_TYPE_COS:
+      EVALUATOR_new_pairs(&pairs, &max_pairs, num_pairs, (int64_t)m*(m+1)/2);
+      for (i = 0; i < m; i++) {
+        for (j = 0; j <= i; j++) {
+          pairs[num_pairs] = (int64_t)deps[n][i]*e->num_inputs+deps[n][j];
+          num_pairs += 1;
+        }
+      }
+      break;
+    default:
+      break;
+    }
+  }
+
+  // Pattern (sorted by row then column)
+  qsort(pairs, num_pairs, sizeof(int64_t), EVALUATOR_compare_keys);
+  num = 0;
+  for (i = 0; i < num_pairs; i++) {
+    if (num == 0 || pairs[i] != pairs[num-1]) {
+      pairs[num] = pairs[i];
+      num += 1;
+    }
+  }
+  free(e->hess_row);
+  free(e->hess_col);
+  e->hess_nnz = num;
+  e->hess_row = (int*)malloc(sizeof(int)*(num+1));
+  e->hess_col = (int*)malloc(sizeof(int)*(num+1));
+  for (i = 0; i < num; i++) {
+    e->hess_row[i] = (int)(pairs[i]/e->num_inputs);
+    e->hess_col[i] = (int)(pairs[i]%e->num_inputs);
+  }
+
+  // Symmetric adjacency
+  adj_start = (int*)calloc(e->num_inputs+1, sizeof(int));
+  for (i = 0; i < e->hess_nnz; i++) {
+    adj_start[e->hess_row[i]+1] += 1;
+    if (e->hess_row[i] != e->hess_col[i])
+      adj_start[e->hess_col[i]+1] += 1;
+  }
+  for (i = 0; i < e->num_inputs; i++)
+    adj_start[i+1] += adj_start[i];
+  adj = (int*)malloc(sizeof(int)*(adj_start[e->num_inputs]+1));
+  for (i = 0; i < e->num_inputs; i++)
+    buffer[i] = adj_start[i];
+  for (i = 0; i < e->hess_nnz; i++) {
+    adj[buffer[e->hess_row[i]]] = e->hess_col[i];
+    buffer[e->hess_row[i]] += 1;
+    if (e->hess_row[i] != e->hess_col[i]) {
+      adj[buffer[e->hess_col[i]]] = e->hess_row[i];
+      buffer[e->hess_col[i]] += 1;
+    }
+  }
+
+  // Greedy coloring (columns sharing a nonzero row get different colors)
+  colors = (int*)malloc(sizeof(int)*(e->num_inputs+1));
+  forbidden = (int*)malloc(sizeof(int)*(e->num_inputs+1));
+  for (i = 0; i < e->num_inputs; i++) {
+    colors[i] = -1;
+    forbidden[i] = -1;
+  }
+  e->num_colors = 0;
+  for (j = 0; j < e->num_inputs; j++) {
+    if (adj_start[j] == adj_start[j+1])
+      continue;
+    for (k = adj_start[j]; k < adj_start[j+1]; k++) {
+      i = adj[k];
+      for (m = adj_start[i]; m < adj_start[i+1]; m++) {
+        if (colors[adj[m]] >= 0)
+          forbidden[colors[adj[m]]] = j;
+      }
+    }
+    c = 0;
+    while (forbidden[c] == j)
+      c += 1;
+    colors[j] = c;
+    if (c >= e->num_colors)
+      e->num_colors = c+1;
+  }
+
+  // Inputs of each color
+  free(e->color_input_start);
+  free(e->color_inputs);
+  e->color_input_start = (int*)calloc(e->num_colors+1, sizeof(int));
+  for (j = 0; j < e->num_inputs; j++) {
+    if (colors[j] >= 0)
+      e->color_input_start[colors[j]+1] += 1;
+  }
+  for (c = 0; c < e->num_colors; c++)
+    e->color_input_start[c+1] += e->color_input_start[c];
+  e->color_inputs = (int*)malloc(sizeof(int)*(e->color_input_start[e->num_colors]+1));
+  for (c = 0; c < e->num_colors; c++)
+    buffer[c] = e->color_input_start[c];
+  for (j = 0; j < e->num_inputs; j++) {
+    if (colors[j] >= 0) {
+      e->color_inputs[buffer[colors[j]]] = j;
+      buffer[colors[j]] += 1;
+    }
+  }
+
+  // Pattern entries recovered from each color (by column)
+  free(e->color_entry_start);
+  free(e->color_entries);
+  e->color_entry_start = (int*)calloc(e->num_colors+1, sizeof(int));
+  for (i = 0; i < e->hess_nnz; i++)
+    e->color_entry_start[colors[e->hess_col[i]]+1] += 1;
+  for (c = 0; c < e->num_colors; c++)
+    e->color_entry_start[c+1] += e->color_entry_start[c];
+  e->color_entries = (int*)malloc(sizeof(int)*(e->hess_nnz+1));
+  for (c = 0; c < e->num_colors; c++)
+    buffer[c] = e->color_entry_start[c];
+  for (i = 0; i < e->hess_nnz; i++) {
+    e->color_entries[buffer[colors[e->hess_col[i]]]] = i;
+    buffer[colors[e->hess_col[i]]] += 1;
+  }
+
+  // Clean up
+  for (i = 0; i < e->num_nodes; i++)
+    free(deps[i]);
+  free(deps);
+  free(num_deps);
+  free(buffer);
+  free(pairs);
+  free(input_index);
+  free(adj_start);
+  free(adj);
+  free(colors);
+  free(forbidden);
+
+  // Done
+  e->hess_valid = 1;
+}
+
+void EVALUATOR_eval_hessian(Evaluator* e, double* var_values, double* weights, double* data) {
+
+  // Local vars
+  int i;
+  int k;
+  int n;
+  int t;
+  int c;
+  double* adjoints;
+  double* tangents;
+  double* adjoint_tangents;
+
+  // Check
+  if (!e)
+    return;
+
+  // Values
+  EVALUATOR_analyze_hessian(e);
+  EVALUATOR_eval_tape(e, e->node_values, var_values, e->values, 1);
+
+  // Adjoints of weighted sum of outputs
+  adjoints = (double*)calloc(e->num_nodes+1, sizeof(double));
+  for (k = 0; k < e->num_outputs; k++) {
+    if (e->outputs[k] >= 0)
+      adjoints[e->outputs[k]] += weights[k];
+  }
+  for (t = e->tape_size-1; t >= 0; t--) {
+    n = e->tape[t];
+    if (adjoints[n] != 0.)
+      NODE_backprop(e->types[n],
+                    adjoints[n],
+                    e->node_values,
+                    adjoints,
+                    e->tape_args+e->tape_arg_start[t],
+                    e->tape_arg_start[t+1]-e->tape_arg_start[t]);
+  }
+
+  // Hessian-vector product for each color (forward tangents then reverse)
+  #pragma omp parallel private(i, n, t, tangents, adjoint_tangents) num_threads(e->num_threads) if (e->num_threads > 1 && e->num_colors > 1)
+  {
+    tangents = (double*)malloc(sizeof(double)*(e->num_nodes+1));
+    adjoint_tangents = (double*)malloc(sizeof(double)*(e->num_nodes+1));
+    #pragma omp for
+    for (c = 0; c < e->num_colors; c++) {
+
+      // Forward
+      for (i = 0; i < e->num_nodes; i++) {
+        tangents[i] = 0;
+        adjoint_tangents[i] = 0;
+      }
+      for (i = e->color_input_start[c]; i < e->color_input_start[c+1]; i++)
+        tangents[e->inputs[e->color_inputs[i]]] = 1.;
+      for (t = 0; t < e->tape_size; t++) {
+        n = e->tape[t];
+        if (!NODE_is_leaf(e->types[n]))
+          tangents[n] = NODE_tangent(e->types[n],
+                                     e->node_values,
+                                     tangents,
+                                     e->tape_args+e->tape_arg_start[t],
+                                     e->tape_arg_start[t+1]-e->tape_arg_start[t]);
+      }
+
+      // Reverse
+      for (t = e->tape_size-1; t >= 0; t--) {
+        n = e->tape[t];
+        if (adjoints[n] != 0. || adjoint_tangents[n] != 0.)
+          NODE_backprop_tangent(e->types[n],
+                                adjoints[n],
+                                adjoint_tangents[n],
+                                e->node_values,
+                                tangents,
+                                adjoint_tangents,
+                                e->tape_args+e->tape_arg_start[t],
+                                e->tape_arg_start[t+1]-e->tape_arg_start[t]);
+      }
+
+      // Recover
+      for (i = e->color_entry_start[c]; i < e->color_entry_start[c+1]; i++)
+        data[e->color_entries[i]] = adjoint_tangents[e->inputs[e->hess_row[e->color_entries[i]]]];
+    }
+    free(tangents);
+    free(adjoint_tangents);
+  }
+
+  free(adjoints);
+}
+
+int EVALUATOR_get_hessian_nnz(Evaluator* e) {
+
+  if (!e)
+    return 0;
+
+  EVALUATOR_analyze_hessian(e);
+  return e->hess_nnz;
+}
+
+void EVALUATOR_get_hessian_structure(Evaluator* e, int* row, int* col) {
+
+  int i;
+
+  if (!e)
+    return;
+
+  EVALUATOR_analyze_hessian(e);
+  for (i = 0; i < e->hess_nnz; i++) {
+    row[i] = e->hess_row[i];
+    col[i] = e->hess_col[i];
+  }
+}
+
+int EVALUATOR_get_num_colors(Evaluator* e) {
+
+  if (!e)
+    return 0;
+
+  EVALUATOR_analyze_hessian(e);
+  return e->num_colors;
+}
+
+int EVALUATOR_get_jacobian_nnz(Evaluator* e) {
+
+  if (!e)
+    return 0;
+
+  EVALUATOR_analyze_jacobian(e);
+  return e->jac_start[e->num_outputs];
+}
+
+void EVALUATOR_get_jacobian_structure(Evaluator* e, int* row, int* col) {
+
+  int i;
+  int k;
+
+  if (!e)
+    return;
 
+  EVALUATOR_analyze_jacobian(e);
+  for (k = 0; k < e->num_outputs; k++) {
+    for (i = e->jac_start[k]; i < e->jac_start[k+1]; i++) {
+      row[i] = k;
+      col[i] = e->jac_col[i];
+    }
+  }
 }
 
 int EVALUATOR_get_max_nodes(Evaluator* e) {
@@ -62,6 +1017,13 @@ int EVALUATOR_get_num_inputs(Evaluator* e) {
     return 0;
 }
 
+int EVALUATOR_get_num_threads(Evaluator* e) {
+  if (e)
+    return e->num_threads;
+  else
+    return 0;
+}
+
 int EVALUATOR_get_num_outputs(Evaluator* e) {
   if (e)
     return e->num_outputs;
@@ -69,6 +1031,16 @@ int EVALUATOR_get_num_outputs(Evaluator* e) {
     return 0;
 }
 
+int EVALUATOR_get_tape_size(Evaluator* e) {
+  if (e) {
+    if (!e->tape_valid)
+      EVALUATOR_compile(e);
+    return e->tape_size;
+  }
+  else
+    return 0;
+}
+
 double* EVALUATOR_get_values(Evaluator* e) {
   if (e)
     return e->values;
@@ -76,191 +1048,204 @@ double* EVALUATOR_get_values(Evaluator* e) {
     return NULL;
 }
 
-Evaluator* EVALUATOR_new(int num_inputs, int num_outputs) {
+Evaluator* EVALUATOR_new(int num_inputs, int num_outputs, int max_nodes) {
   int i;
   Evaluator* e = (Evaluator*)malloc(sizeof(Evaluator));
-  e->max_nodes = num_outputs;
+  e->max_nodes = 0;
   e->num_nodes = 0;
-  e->nodes = NODE_array_new(e->max_nodes);
+  e->types = NULL;
+  e->ids = NULL;
+  e->node_values = NULL;
+  e->arg_start = NULL;
+  e->num_args = NULL;
+  e->max_args = 0;
+  e->total_args = 0;
+  e->args = NULL;
+  e->map_size = 0;
+  e->map = NULL;
+  EVALUATOR_map_resize(e, 16);
+  EVALUATOR_reserve(e, max_nodes > 0 ? max_nodes : num_outputs, 0);
   e->num_inputs = num_inputs;
   e->num_outputs = num_outputs;
-  e->inputs = (Node**)malloc(sizeof(Node*)*num_inputs);
-  e->outputs = (Node**)malloc(sizeof(Node*)*num_outputs);
+  e->inputs = (int*)malloc(sizeof(int)*num_inputs);
+  e->outputs = (int*)malloc(sizeof(int)*num_outputs);
   e->values = (double*)malloc(sizeof(double)*num_outputs);
-  e->hash = NULL;
+  e->tape_size = 0;
+  e->tape_valid = 0;
+  e->tape = NULL;
+  e->tape_arg_start = NULL;
+  e->tape_args = NULL;
+  e->num_levels = 0;
+  e->levels = NULL;
+  e->jac_valid = 0;
+  e->jac_tape_start = NULL;
+  e->jac_tape = NULL;
+  e->jac_start = NULL;
+  e->jac_col = NULL;
+  e->hess_valid = 0;
+  e->hess_nnz = 0;
+  e->hess_row = NULL;
+  e->hess_col = NULL;
+  e->num_colors = 0;
+  e->color_input_start = NULL;
+  e->color_inputs = NULL;
+  e->color_entry_start = NULL;
+  e->color_entries = NULL;
+  e->num_threads = 1;
   for (i = 0; i < e->num_inputs; i++)
-    e->inputs[i] = NULL;
+    e->inputs[i] = -1;
   for (i = 0; i < e->num_outputs; i++) {
-    e->outputs[i] = NULL;
+    e->outputs[i] = -1;
     e->values[i] = 0.;
   }
   return e;
 }
 
-void EVALUATOR_inc_num_nodes(Evaluator* e) {
+void EVALUATOR_add_node(Evaluator* e, int type, uintptr_t id, double value, uintptr_t* arg_ids, int num_args) {
 
-  // Local vars
   int i;
-  Node* n;
-  Node* new_n;
-  Node* new_nodes;
-  Node* new_hash;
-  int new_max_nodes;
+  int n;
+  int arg;
 
-  // Check
   if (!e)
     return;
 
-  // Increment
-  e->num_nodes += 1;
+  e->tape_valid = 0;
 
-  // Dynamic resize
-  if (e->num_nodes >= e->max_nodes) {
-
-    // New nodes
-    new_max_nodes = 2*e->max_nodes;
-    new_nodes = NODE_array_new(new_max_nodes);
-
-    // New hash
-    new_hash = NULL;
-    for (i = 0; i < e->num_nodes; i++) {
-      n = NODE_array_get(e->nodes, i);
-      new_n = NODE_array_get(new_nodes, i);
-      NODE_set_id(new_n, NODE_get_id(n));
-      new_hash = NODE_hash_add(new_hash, new_n);
-    }
+  // Node
+  n = EVALUATOR_find_node(e, id);
+  if (n < 0)
+    n = EVALUATOR_new_node(e, id);
 
-    // Copy old node data
-    for (i = 0; i < e->num_nodes; i++) {
-      n = NODE_array_get(e->nodes, i);
-      new_n = NODE_array_get(new_nodes, i);
-      NODE_copy_from_node(new_n, n, new_hash);
-    }
-
-    // Update hash
-    NODE_hash_del(e->hash);
-    e->hash = new_hash;
-
-    // Update inputs
-    for (i = 0; i < e->num_inputs; i++)
-      e->inputs[i] = NODE_hash_find(e->hash, NODE_get_id(e->inputs[i]));
-
-    // Update outputs
-    for (i = 0; i < e->num_outputs; i++)
-      e->outputs[i] = NODE_hash_find(e->hash, NODE_get_id(e->outputs[i]));
-
-    // Update nodes
-    NODE_array_del(e->nodes, e->num_nodes);
-    e->nodes = new_nodes;
-    e->max_nodes = new_max_nodes;
+  // Args (reuse storage if it fits)
+  if (num_args > e->num_args[n])
+    e->arg_start[n] = EVALUATOR_new_args(e, num_args);
+  e->num_args[n] = num_args;
+  for (i = 0; i < num_args; i++) {
+    arg = EVALUATOR_find_node(e, arg_ids[i]);
+    if (arg < 0)
+      arg = EVALUATOR_new_node(e, arg_ids[i]);
+    e->args[e->arg_start[n]+i] = arg;
   }
+
+  // Data
+  e->types[n] = (char)type;
+  e->node_values[n] = value;
 }
 
-void EVALUATOR_add_node(Evaluator* e, int type, uintptr_t id, double value, uintptr_t* arg_ids, int num_args) {
+void EVALUATOR_add_nodes(Evaluator* e, int num, int* types, uintptr_t* ids, double* values, int* arg_ptr, uintptr_t* arg_ids) {
 
   int i;
-  Node* n;
-  Node* arg;
-  Node** args;
-  int n_index;
-  int* args_index;
+  int max_nodes;
+  int max_args;
 
-  if (!e)
+  if (!e || num <= 0)
     return;
 
-  n = NODE_hash_find(e->hash, id);
-  if (!n) {
-    n_index = e->num_nodes;
-    n = NODE_array_get(e->nodes, n_index);
-    NODE_set_id(n, id);
-    e->hash = NODE_hash_add(e->hash, n);
-    EVALUATOR_inc_num_nodes(e);
-  }
-  else
-    n_index = NODE_get_index(n);
-
-  if (num_args > 0) {
-    args = (Node**)malloc(sizeof(Node*)*num_args);
-    args_index = (int*)malloc(sizeof(int)*num_args);
-  }
-  else {
-    args = NULL;
-    args_index = NULL;
-  }
-
-  for (i = 0; i < num_args; i++) {
-    arg = NODE_hash_find(e->hash, arg_ids[i]);
-    if (!arg) {
-      args_index[i] = e->num_nodes;
-      arg = NODE_array_get(e->nodes, args_index[i]);
-      NODE_set_id(arg, arg_ids[i]);
-      e->hash = NODE_hash_add(e->hash, arg);
-      EVALUATOR_inc_num_nodes(e);
-    }
-    else
-      args_index[i] = NODE_get_index(arg);
-  }
-
-  // Root
-  n = NODE_array_get(e->nodes, n_index);
-  NODE_set_type(n, type);
-  NODE_set_value(n, value);
+  // Reserve (nodes and their arguments, grown geometrically)
+  max_nodes = e->num_nodes+num;
+  if (max_nodes > e->max_nodes && max_nodes < 2*e->max_nodes)
+    max_nodes = 2*e->max_nodes;
+  max_args = e->total_args+arg_ptr[num]-arg_ptr[0];
+  if (max_args > e->max_args && max_args < 2*e->max_args)
+    max_args = 2*e->max_args;
+  EVALUATOR_reserve(e, max_nodes, max_args);
 
-  // Args
-  if (0 < num_args && num_args <= 2) {
-    NODE_set_arg1(n, NODE_array_get(e->nodes, args_index[0]));
-    if (num_args > 1)
-      NODE_set_arg2(n, NODE_array_get(e->nodes, args_index[1]));
-    if (args)
-      free(args);
-  }
-  else {
-    for (i = 0; i < num_args; i++)
-      args[i] = NODE_array_get(e->nodes, args_index[i]);
-    NODE_set_args(n, args, num_args);
-  }
-  if (args_index)
-    free(args_index);
+  // Add
+  for (i = 0; i < num; i++)
+    EVALUATOR_add_node(e, types[i], ids[i], values[i], arg_ids+arg_ptr[i], arg_ptr[i+1]-arg_ptr[i]);
 }
 
 void EVALUATOR_del(Evaluator* e) {
   if (e) {
-    NODE_hash_del(e->hash);
-    NODE_array_del(e->nodes, e->num_nodes);
+    free(e->types);
+    free(e->ids);
+    free(e->node_values);
+    free(e->arg_start);
+    free(e->num_args);
+    free(e->args);
+    free(e->map);
     free(e->inputs);
     free(e->outputs);
     free(e->values);
+    free(e->tape);
+    free(e->tape_arg_start);
+    free(e->tape_args);
+    free(e->levels);
+    free(e->jac_tape_start);
+    free(e->jac_tape);
+    free(e->jac_start);
+    free(e->jac_col);
+    free(e->hess_row);
+    free(e->hess_col);
+    free(e->color_input_start);
+    free(e->color_inputs);
+    free(e->color_entry_start);
+    free(e->color_entries);
     free(e);
   }
 }
 
-void EVALUATOR_set_output_node(Evaluator* e, int index, uintptr_t id) {
+void EVALUATOR_reserve(Evaluator* e, int max_nodes, int max_args) {
+
+  int map_size;
+
+  if (!e)
+    return;
+
+  // Nodes
+  if (max_nodes > e->max_nodes)
+    EVALUATOR_set_max_nodes(e, max_nodes);
 
-  Node* n;
+  // Map (load factor at most 1/2)
+  map_size = e->map_size;
+  while (map_size < 2*max_nodes)
+    map_size *= 2;
+  if (map_size > e->map_size)
+    EVALUATOR_map_resize(e, map_size);
+
+  // Args
+  if (max_args > e->max_args) {
+    e->args = (int*)realloc(e->args, sizeof(int)*max_args);
+    e->max_args = max_args;
+  }
+}
+
+void EVALUATOR_set_output_node(Evaluator* e, int index, uintptr_t id) {
 
   if (!e)
     return;
 
-  n = NODE_hash_find(e->hash, id);
-  if (0 <= index && 0 < e->num_outputs)
-    e->outputs[index] = n;
+  if (0 <= index && index < e->num_outputs) {
+    e->outputs[index] = EVALUATOR_find_node(e, id);
+    e->tape_valid = 0;
+  }
+}
+
+void EVALUATOR_set_num_threads(Evaluator* e, int num_threads) {
+  if (e && num_threads > 0)
+    e->num_threads = num_threads;
 }
 
 void EVALUATOR_set_input_var(Evaluator* e, int index, uintptr_t id) {
 
-  Node* n;
+  int n;
 
   if (!e)
     return;
 
-  n = NODE_hash_find(e->hash, id);
-  if (0 <= index && index < e->num_inputs && NODE_get_type(n) == NODE_TYPE_VARIABLE)
+  n = EVALUATOR_find_node(e, id);
+  if (0 <= index && index < e->num_inputs && n >= 0 && e->types[n] == NODE_TYPE_VARIABLE) {
     e->inputs[index] = n;
+    e->jac_valid = 0;
+    e->hess_valid = 0;
+  }
 }
 
 void EVALUATOR_show(Evaluator* e) {
 
   int i;
+  int k;
 
   if (!e)
     return;
@@ -270,16 +1255,19 @@ void EVALUATOR_show(Evaluator* e) {
   printf("num_inputs: %d\n", e->num_inputs);
   printf("num_outputs: %d\n", e->num_outputs);
   printf("max_nodes: %d\n", e->max_nodes);
-  printf("num_nodes: %d\n\n", e->num_nodes);
+  printf("num_nodes: %d\n", e->num_nodes);
+  printf("tape_size: %d\n", e->tape_size);
+  printf("num_levels: %d\n", e->num_levels);
+  printf("num_threads: %d\n\n", e->num_threads);
 
   printf("inputs:\n");
   for (i = 0; i < e->num_inputs; i++)
-    printf("%ld, ", NODE_get_id(e->inputs[i]));
+    printf("%ld, ", e->inputs[i] >= 0 ? (long)e->ids[e->inputs[i]] : 0);
   printf("\n\n");
 
   printf("outputs:\n");
   for (i = 0; i < e->num_outputs; i++)
-    printf("%ld, ", NODE_get_id(e->outputs[i]));
+    printf("%ld, ", e->outputs[i] >= 0 ? (long)e->ids[e->outputs[i]] : 0);
   printf("\n\n");
 
   printf("values:\n");
@@ -289,7 +1277,13 @@ void EVALUATOR_show(Evaluator* e) {
 
   printf("nodes:\n\n");
   for (i = 0; i < e->num_nodes; i++) {
-    NODE_show(NODE_array_get(e->nodes, i));
-    printf("\n");
+    printf("Node\n");
+    printf("type: %s\n", NODE_get_type_name(e->types[i]));
+    printf("id: %ld\n", (long)e->ids[i]);
+    printf("value: %.4e\n", e->node_values[i]);
+    printf("num args: %d\n", e->num_args[i]);
+    for (k = 0; k < e->num_args[i]; k++)
+      printf("%ld ", (long)e->ids[e->args[e->arg_start[i]+k]]);
+    printf("\n\n");
   }
 }
@@ -10,18 +10,48 @@
 #include <inttypes.h>
 #include "node.h"
 
+#define EVALUATOR_MIN_PARALLEL_SIZE 1024
 
 typedef struct Evaluator Evaluator;
 
+void EVALUATOR_analyze_hessian(Evaluator* e);
+void EVALUATOR_analyze_jacobian(Evaluator* e);
+int EVALUATOR_compare_ints(const void* a, const void* b);
+int EVALUATOR_compare_keys(const void* a, const void* b);
+void EVALUATOR_compile(Evaluator* e);
 void EVALUATOR_add_node(Evaluator* e, int type, uintptr_t id, double value, uintptr_t* arg_ids, int num_args);
+void EVALUATOR_add_nodes(Evaluator* e, int num, int* types, uintptr_t* ids, double* values, int* arg_ptr, uintptr_t* arg_ids);
 void EVALUATOR_del(Evaluator* e);
 void EVALUATOR_eval(Evaluator* e, double* var_values);
+void EVALUATOR_eval_gradient(Evaluator* e, double* var_values, int index, double* gradient);
+void EVALUATOR_eval_hessian(Evaluator* e, double* var_values, double* weights, double* data);
+void EVALUATOR_eval_jacobian(Evaluator* e, double* var_values, double* data);
+void EVALUATOR_eval_tape(Evaluator* e, double* node_values, double* var_values, double* values, int parallel);
+void EVALUATOR_eval_batch(Evaluator* e, double* var_values, int num_points, double* values);
+int EVALUATOR_find_node(Evaluator* e, uintptr_t id);
+int EVALUATOR_get_hessian_nnz(Evaluator* e);
+void EVALUATOR_get_hessian_structure(Evaluator* e, int* row, int* col);
+int EVALUATOR_get_jacobian_nnz(Evaluator* e);
+void EVALUATOR_get_jacobian_structure(Evaluator* e, int* row, int* col);
 int EVALUATOR_get_max_nodes(Evaluator* e);
 int EVALUATOR_get_num_nodes(Evaluator* e);
 int EVALUATOR_get_num_inputs(Evaluator* e);
+int EVALUATOR_get_num_colors(Evaluator* e);
 int EVALUATOR_get_num_outputs(Evaluator* e);
+int EVALUATOR_get_num_threads(Evaluator* e);
+int EVALUATOR_get_tape_size(Evaluator* e);
 double* EVALUATOR_get_values(Evaluator* e);
-Evaluator* EVALUATOR_new(int num_inputs, int num_outputs);
+int EVALUATOR_hash(uintptr_t id, int map_size);
+void EVALUATOR_map_insert(Evaluator* e, int index);
+void EVALUATOR_map_resize(Evaluator* e, int map_size);
+Evaluator* EVALUATOR_new(int num_inputs, int num_outputs, int max_nodes);
+int EVALUATOR_new_args(Evaluator* e, int num);
+int EVALUATOR_new_node(Evaluator* e, uintptr_t id);
+void EVALUATOR_new_pairs(int64_t** pairs, int64_t* max_pairs, int64_t num_pairs, int64_t num);
+void EVALUATOR_reverse_sweep(Evaluator* e, int k, double* adjoints);
+void EVALUATOR_reserve(Evaluator* e, int max_nodes, int max_args);
+void EVALUATOR_set_max_nodes(Evaluator* e, int max_nodes);
 void EVALUATOR_set_output_node(Evaluator* e, int index, uintptr_t id);
 void EVALUATOR_set_input_var(Evaluator* e, int index, uintptr_t id);
+void EVALUATOR_set_num_threads(Evaluator* e, int num_threads);
 void EVALUATOR_show(Evaluator* e);
@@ -3,15 +3,30 @@ cdef extern from "evaluator.h":
 
     ctypedef struct Evaluator
 
+    void EVALUATOR_compile(Evaluator* e)
     void EVALUATOR_add_node(Evaluator* e, int type, uintptr_t id, double value, uintptr_t* arg_ids, int num_args)
+    void EVALUATOR_add_nodes(Evaluator* e, int num, int* types, uintptr_t* ids, double* values, int* arg_ptr, uintptr_t* arg_ids)
     void EVALUATOR_del(Evaluator* e)
-    void EVALUATOR_eval(Evaluator* e, double* var_values)
+    void EVALUATOR_eval(Evaluator* e, double* var_values) nogil
+    void EVALUATOR_eval_batch(Evaluator* e, double* var_values, int num_points, double* values) nogil
+    void EVALUATOR_eval_gradient(Evaluator* e, double* var_values, int index, double* gradient) nogil
+    void EVALUATOR_eval_hessian(Evaluator* e, double* var_values, double* weights, double* data) nogil
+    void EVALUATOR_eval_jacobian(Evaluator* e, double* var_values, double* data) nogil
+    int EVALUATOR_get_hessian_nnz(Evaluator* e)
+    void EVALUATOR_get_hessian_structure(Evaluator* e, int* row, int* col)
+    int EVALUATOR_get_num_colors(Evaluator* e)
+    int EVALUATOR_get_jacobian_nnz(Evaluator* e)
+    void EVALUATOR_get_jacobian_structure(Evaluator* e, int* row, int* col)
     int EVALUATOR_get_max_nodes(Evaluator* e)
     int EVALUATOR_get_num_nodes(Evaluator* e)
     int EVALUATOR_get_num_inputs(Evaluator* e)
     int EVALUATOR_get_num_outputs(Evaluator* e)
+    int EVALUATOR_get_num_threads(Evaluator* e)
+    int EVALUATOR_get_tape_size(Evaluator* e)
     double* EVALUATOR_get_values(Evaluator* e)
-    Evaluator* EVALUATOR_new(int num_inputs, int num_outputs)
+    Evaluator* EVALUATOR_new(int num_inputs, int num_outputs, int max_nodes)
+    void EVALUATOR_reserve(Evaluator* e, int max_nodes, int max_args)
     void EVALUATOR_set_output_node(Evaluator* e, int index, uintptr_t id)
     void EVALUATOR_set_input_var(Evaluator* e, int index, uintptr_t id)
+    void EVALUATOR_set_num_threads(Evaluator* e, int num_threads)
     void EVALUATOR_show(Evaluator* e)
@@ -8,12 +8,14 @@ cdef class Evaluator:
     cdef evaluator.Evaluator* _ptr
     cdef tuple shape
     cdef bint scalar_output
+    cdef uintptr_t next_id
+    cdef dict reserved_ids
 
-    def __init__(self, num_inputs, num_outputs, shape=None, scalar_output=False):
+    def __init__(self, num_inputs, num_outputs, shape=None, scalar_output=False, num_threads=1, max_nodes=0):
 
         pass
 
-    def __cinit__(self, num_inputs, num_outputs, shape=None, scalar_output=False):
+    def __cinit__(self, num_inputs, num_outputs, shape=None, scalar_output=False, num_threads=1, max_nodes=0):
 
         if shape is None:
             shape = (1, num_outputs)
@@ -27,10 +29,16 @@ cdef class Evaluator:
         if shape[0]*shape[1] != num_outputs:
             raise ValueError('invalid shape')
 
-        self._ptr = evaluator.EVALUATOR_new(num_inputs, num_outputs)
+        if num_threads < 1:
+            raise ValueError('invalid number of threads')
+
+        self._ptr = evaluator.EVALUATOR_new(num_inputs, num_outputs, max_nodes)
+        evaluator.EVALUATOR_set_num_threads(self._ptr, num_threads)
 
         self.shape = shape
         self.scalar_output = scalar_output
+        self.next_id = 1
+        self.reserved_ids = {}
 
     def __dealloc__(self):
 
@@ -43,6 +51,44 @@ cdef class Evaluator:
         x = np.array(arg_ids, dtype=np.uintp)
         evaluator.EVALUATOR_add_node(self._ptr, type, id, value, <uintptr_t*>(x.data), x.size)
 
+    def add_nodes(self, types, ids, values, arg_ptr, arg_ids):
+
+        cdef np.ndarray[int, mode='c'] t = np.array(types, dtype=np.intc)
+        cdef np.ndarray[uintptr_t, mode='c'] i = np.array(ids, dtype=np.uintp)
+        cdef np.ndarray[double, mode='c'] v = np.array(values, dtype=float)
+        cdef np.ndarray[int, mode='c'] p = np.array(arg_ptr, dtype=np.intc)
+        cdef np.ndarray[uintptr_t, mode='c'] a = np.array(arg_ids, dtype=np.uintp)
+
+        if not (t.size == i.size == v.size == p.size-1):
+            raise ValueError('invalid node arrays')
+        if p[0] != 0 or p[p.size-1] != a.size or np.any(np.diff(p) < 0):
+            raise ValueError('invalid argument pointers')
+
+        evaluator.EVALUATOR_add_nodes(self._ptr,
+                                      t.size,
+                                      <int*>(t.data),
+                                      <uintptr_t*>(i.data),
+                                      <double*>(v.data),
+                                      <int*>(p.data),
+                                      <uintptr_t*>(a.data))
+
+    def node_ids(self, key, num):
+
+        # Base of num node ids base, base+2, ..., reserved from a counter.
+        # Reserved ids are odd and object addresses are not, so they never
+        # collide with ids of expressions. The same key and number give the
+        # same ids, so nodes filled again are replaced
+        base = self.reserved_ids.get((key, num))
+        if base is None:
+            base = self.next_id
+            self.next_id += 2*num
+            self.reserved_ids[(key, num)] = base
+        return base
+
+    def compile(self):
+
+        evaluator.EVALUATOR_compile(self._ptr)
+
     def get_value(self):
 
         cdef np.npy_intp shape[2]
@@ -62,12 +108,116 @@ cdef class Evaluator:
 
     def eval(self, var_values):
 
+        cdef np.ndarray[double, mode='c'] x = np.ascontiguousarray(var_values, dtype=float)
+        cdef evaluator.Evaluator* ptr = self._ptr
+        cdef double* xp
+
+        assert(x.ndim == 1)
+        assert(x.size == self.num_inputs)
+
+        # The GIL is released, so distinct evaluators can run concurrently
+        # from Python threads. A single evaluator is not thread-safe.
+        xp = <double*>(x.data)
+        with nogil:
+            evaluator.EVALUATOR_eval(ptr, xp)
+
+    def eval_batch(self, var_values):
+
+        cdef np.ndarray[double, ndim=2, mode='c'] x = np.ascontiguousarray(var_values, dtype=float)
+        cdef np.ndarray[double, ndim=2, mode='c'] v
+        cdef evaluator.Evaluator* ptr = self._ptr
+        cdef double* xp
+        cdef double* vp
+        cdef int num_points
+
+        assert(x.ndim == 2)
+        assert(x.shape[1] == self.num_inputs)
+
+        v = np.zeros((x.shape[0], self.num_outputs), dtype=float)
+        xp = <double*>(x.data)
+        vp = <double*>(v.data)
+        num_points = x.shape[0]
+        with nogil:
+            evaluator.EVALUATOR_eval_batch(ptr, xp, num_points, vp)
+
+        return v
+
+    def eval_gradient(self, var_values, gradient, index=0):
+
+        cdef np.ndarray[double, mode='c'] x = np.array(var_values, dtype=float)
+        cdef np.ndarray[double, mode='c'] g = gradient
+        cdef evaluator.Evaluator* ptr = self._ptr
+        cdef double* xp
+        cdef double* gp
+        cdef int k = index
+
+        assert(x.ndim == 1)
+        assert(x.size == self.num_inputs)
+        assert(g.size == self.num_inputs)
+        assert(0 <= k < self.num_outputs)
+
+        xp = <double*>(x.data)
+        gp = <double*>(g.data)
+        with nogil:
+            evaluator.EVALUATOR_eval_gradient(ptr, xp, k, gp)
+
+    def eval_jacobian(self, var_values, data):
+
         cdef np.ndarray[double, mode='c'] x = np.array(var_values, dtype=float)
+        cdef np.ndarray[double, mode='c'] d = data
+        cdef evaluator.Evaluator* ptr = self._ptr
+        cdef double* xp
+        cdef double* dp
 
         assert(x.ndim == 1)
         assert(x.size == self.num_inputs)
+        assert(d.size == evaluator.EVALUATOR_get_jacobian_nnz(self._ptr))
+
+        xp = <double*>(x.data)
+        dp = <double*>(d.data)
+        with nogil:
+            evaluator.EVALUATOR_eval_jacobian(ptr, xp, dp)
+
+    def eval_hessian(self, var_values, weights, data):
+
+        cdef np.ndarray[double, mode='c'] x = np.array(var_values, dtype=float)
+        cdef np.ndarray[double, mode='c'] w = np.array(weights, dtype=float)
+        cdef np.ndarray[double, mode='c'] d = data
+        cdef evaluator.Evaluator* ptr = self._ptr
+        cdef double* xp
+        cdef double* wp
+        cdef double* dp
+
+        assert(x.ndim == 1)
+        assert(x.size == self.num_inputs)
+        assert(w.size == self.num_outputs)
+        assert(d.size == evaluator.EVALUATOR_get_hessian_nnz(self._ptr))
+
+        xp = <double*>(x.data)
+        wp = <double*>(w.data)
+        dp = <double*>(d.data)
+        with nogil:
+            evaluator.EVALUATOR_eval_hessian(ptr, xp, wp, dp)
+
+    def get_hessian_structure(self):
+
+        cdef int nnz = evaluator.EVALUATOR_get_hessian_nnz(self._ptr)
+        cdef np.ndarray[int, mode='c'] row = np.zeros(nnz, dtype=np.intc)
+        cdef np.ndarray[int, mode='c'] col = np.zeros(nnz, dtype=np.intc)
+
+        evaluator.EVALUATOR_get_hessian_structure(self._ptr, <int*>(row.data), <int*>(col.data))
 
-        evaluator.EVALUATOR_eval(self._ptr, <double*>(x.data))
+        return row, col
+
+    def get_jacobian_structure(self):
+
+        cdef int nnz = evaluator.EVALUATOR_get_jacobian_nnz(self._ptr)
+        cdef np.ndarray[int, mode='c'] row = np.zeros(nnz, dtype=np.intc)
+        cdef np.ndarray[int, mode='c'] col = np.zeros(nnz, dtype=np.intc)
+
+        evaluator.EVALUATOR_get_jacobian_structure(self._ptr, <int*>(row.data), <int*>(col.data))
+
+        return row, col
 
     def set_output_node(self, i, id):
 
@@ -77,6 +227,17 @@ cdef class Evaluator:
 
         evaluator.EVALUATOR_set_input_var(self._ptr, i, id)
 
+    def reserve(self, max_nodes, max_args=0):
+
+        evaluator.EVALUATOR_reserve(self._ptr, max_nodes, max_args)
+
+    def set_num_threads(self, num_threads):
+
+        if num_threads < 1:
+            raise ValueError('invalid number of threads')
+
+        evaluator.EVALUATOR_set_num_threads(self._ptr, num_threads)
+
     def show(self):
 
         evaluator.EVALUATOR_show(self._ptr)
@@ -93,6 +254,15 @@ cdef class Evaluator:
     property num_outputs:
         def __get__(self): return evaluator.EVALUATOR_get_num_outputs(self._ptr)
 
+    property num_colors:
+        def __get__(self): return evaluator.EVALUATOR_get_num_colors(self._ptr)
+
+    property num_threads:
+        def __get__(self): return evaluator.EVALUATOR_get_num_threads(self._ptr)
+
+    property tape_size:
+        def __get__(self): return evaluator.EVALUATOR_get_tape_size(self._ptr)
+
     property shape:
         def __get__(self): return self.shape
 
@@ -12,13 +12,11 @@
 
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <math.h>
 #include <inttypes.h>
-#include "uthash.h"
 
 
-#define NODE_BUFFER_SIZE 100
-
 #define NODE_TYPE_UNKNOWN 0
 #define NODE_TYPE_CONSTANT 1
 #define NODE_TYPE_VARIABLE 2
@@ -29,27 +27,11 @@
 #define NODE_TYPE_SIN 7
 #define NODE_TYPE_COS 8
 
-typedef struct Node Node;
-
-Node* NODE_array_new(int num);
-Node* NODE_array_get(Node* n, int i);
-void NODE_array_del(Node* n, int num);
-void NODE_copy_from_node(Node* n, Node* other, Node* hash);
-int NODE_get_index(Node* n);
-uintptr_t NODE_get_id(Node* n);
-int NODE_get_type(Node* n);
-double NODE_get_value(Node* n);
-char* NODE_get_type_name(Node* n);
-Node* NODE_hash_add(Node* hash, Node* n);
-Node* NODE_hash_find(Node* hash, uintptr_t id);
-void NODE_hash_del(Node* hash);
-void NODE_init(Node* n);
-void NODE_set_type(Node* n, int type);
-void NODE_set_id(Node* n, uintptr_t id);
-void NODE_set_value(Node* n, double value);
-void NODE_set_arg1(Node* n, Node* arg1);
-void NODE_set_arg2(Node* n, Node* arg2);
-void NODE_set_args(Node* n, Node** args, int num);
-void NODE_show(Node* n);
+void NODE_backprop(int type, double adjoint, double* values, double* adjoints, int* args, int num_args);
+void NODE_backprop_tangent(int type, double adjoint, double adjoint_tangent, double* values, double* tangents, double* adjoint_tangents, int* args, int num_args);
+double NODE_eval(int type, double* values, int* args, int num_args);
+char* NODE_get_type_name(int type);
+int NODE_is_leaf(int type);
+double NODE_tangent(int type, double* values, double* tangents, int* args, int num_args);
 
 #endif
@@ -1,18 +1,65 @@
 import numpy as np
 from . import coptmod
-from functools import reduce
 from collections import OrderedDict
+from scipy.sparse import coo_matrix, csr_matrix, issparse
 
 
-class Expression(object):
+class interning(object):
+    """
+    Context in which structurally equal expressions are constructed
+    once and shared.
+    """
+
+    table = None
+
+    def __enter__(self):
+
+        self.outer = interning.table
+        if interning.table is None:
+            interning.table = {}
+            InterningType.__call__ = intern_call
+        return self
+
+    def __exit__(self, *args):
+
+        interning.table = self.outer
+        if interning.table is None:
+            del InterningType.__call__
+
+
+class InterningType(type):
+
+    # Constructor is intern_call while interning is active and the plain
+    # type.__call__ otherwise (no Python-level call per expression)
+    pass
+
+
+def intern_call(cls, *args, **kwargs):
 
-    name = ''
+    obj = type.__call__(cls, *args, **kwargs)
+
+    if isinstance(obj, Expression):
+        key = obj.__intern_key__()
+        if key is not None:
+            return interning.table.setdefault(key, obj)
+
+    return obj
+
+
+# Base with the interning metaclass (class statement syntax differs
+# between Python 2 and 3)
+ExpressionBase = InterningType('ExpressionBase', (object,), {'__slots__': ()})
+
+
+class Expression(ExpressionBase):
+
+    __slots__ = ('name', '__value__')
     __array_priority__ = 1000.
-    __value__ = 0.
 
     def __init__(self):
 
-        pass
+        self.name = ''
+        self.__value__ = 0.
 
     def __repr__(self):
 
@@ -28,14 +75,15 @@ class Expression(object):
 
     def __add__(self, x):
 
+        # Sparse expression matrix
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
         # Arrray
         if isinstance(x, np.ndarray):
             if self.is_zero():
                 return ExpressionMatrix(x)
-            self.__array_priority__ = 0.
-            r =  ExpressionMatrix(x.__add__(self))
-            self.__array_priority__ = Expression.__array_priority__
-            return r
+            return ExpressionMatrix(np.add(x, self))
 
         # Expresiosn matrix
         if isinstance(x, ExpressionMatrix):
@@ -52,13 +100,16 @@ class Expression(object):
         if self.is_constant() and x.is_constant():
             return make_Expression(self.__value__ + x.__value__)
 
-        # Flat args
-        args = []
-        for a in [self, x]:
-            if isinstance(a, add):
-                args.extend(a.arguments)
-            else:
-                args.append(a)
+        # Linear or quadratic
+        if is_quadratic(self) and is_quadratic(x):
+            return quadratic_combination([self, x], [1., 1.])
+
+        # Flat args (appended to the argument buffer of self if possible)
+        args = x.arguments if type(x) is add else [x]
+        if type(self) is add:
+            args = extend_list(self.__args__, self.__size__, args)
+        else:
+            args = [self] + args
 
         # Return
         return add(args)
@@ -69,14 +120,15 @@ class Expression(object):
 
     def __sub__(self, x):
 
+        # Sparse expression matrix
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
         # Array
         if isinstance(x, np.ndarray):
             if self.is_zero():
                 return ExpressionMatrix(-x)
-            self.__array_priority__ = 0.
-            r =  ExpressionMatrix(x.__rsub__(self))
-            self.__array_priority__ = Expression.__array_priority__
-            return r
+            return ExpressionMatrix(np.subtract(self, x))
 
         # Expression matrix
         if isinstance(x, ExpressionMatrix):
@@ -90,14 +142,15 @@ class Expression(object):
 
     def __rsub__(self, x):
 
+        # Sparse expression matrix
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
         # Array
         if isinstance(x, np.ndarray):
             if self.is_zero():
                 return ExpressionMatrix(x)
-            self.__array_priority__ = 0.
-            r =  ExpressionMatrix(x.__sub__(self))
-            self.__array_priority__ = Expression.__array_priority__
-            return r
+            return ExpressionMatrix(np.subtract(x, self))
 
         # Expression matrix
         if isinstance(x, ExpressionMatrix):
@@ -111,14 +164,15 @@ class Expression(object):
 
     def __mul__(self, x):
 
+        # Sparse expression matrix
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
         # Array
         if isinstance(x, np.ndarray):
             if self.is_one():
                 return ExpressionMatrix(x)
-            self.__array_priority__ = 0.
-            r =  ExpressionMatrix(x.__mul__(self))
-            self.__array_priority__ = Expression.__array_priority__
-            return r
+            return ExpressionMatrix(np.multiply(x, self))
 
         # Expression matrix
         if isinstance(x, ExpressionMatrix):
@@ -136,6 +190,12 @@ class Expression(object):
             return make_Expression(0.)
         if self.is_constant() and x.is_constant():
             return make_Expression(self.__value__*x.__value__)
+        if self.is_constant() and is_quadratic(x):
+            return quadratic_combination([x], [self.__value__])
+        if x.is_constant() and is_quadratic(self):
+            return quadratic_combination([self], [x.__value__])
+        if is_linear(self) and is_linear(x):
+            return quadratic_product(self, x)
         if self.is_constant() and isinstance(x, add):
             return add([self.__mul__(arg) for arg in x.arguments])
         if x.is_constant() and isinstance(self, add):
@@ -172,7 +232,10 @@ class Expression(object):
 
     def __cmp_util__(self, op, x):
 
-        if isinstance(x, np.ndarray):
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
+        elif isinstance(x, np.ndarray):
             return ConstraintArray(np.vectorize(self.__cmp_util__)(op, x))
 
         elif isinstance(x, ExpressionMatrix):
@@ -191,7 +254,7 @@ class Expression(object):
                 'a': {},
                 'b': np.NaN}
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
 
         phi = self
         gphi_list = []
@@ -204,15 +267,19 @@ class Expression(object):
             for var, value in prop['a'].items():
                 gphi_list.append((var, make_Expression(value)))
 
-        # Not affine
-        else:
+        # Not affine (second derivatives only for pairs in sparsity pattern)
+        elif derivatives:
             vars_set = set(prop['a'].keys())
             vars_list = list(vars_set)
+            pairs = self.__sparsity__()[1]
             derivs = self.get_derivatives(vars_set)
             for i, var1 in enumerate(vars_list):
                 d = derivs[var1]
                 gphi_list.append((var1, d))
-                dvars_list = vars_list[i:]
+                dvars_list = [var2 for var2 in vars_list[i:]
+                              if sparsity_pair(var1, var2) in pairs]
+                if not dvars_list:
+                    continue
                 dvars_set = set(dvars_list)
                 dderivs = d.get_derivatives(dvars_set)
                 for var2 in dvars_list:
@@ -226,13 +293,21 @@ class Expression(object):
                 'Hphi_list': Hphi_list,
                 'phi_prop': prop}
 
+    def __sparsity__(self):
+
+        return (frozenset(self.get_variables()), frozenset())
+
     def __evaluator_node_type__(self):
 
         return NotImplemented
 
-    def __fill_evaluator__(self, evaluator):
+    def __intern_key__(self):
 
-        raise NotImplementedError
+        return None
+
+    def __fill_evaluator__(self, evaluator, visited=None):
+
+        fill_evaluator(evaluator, [self], visited=visited)
 
     def __set_value__(self):
 
@@ -261,7 +336,7 @@ class Expression(object):
         e = coptmod.Evaluator(len(variables),
                               1,
                               scalar_output=True)
-        self.__fill_evaluator__(e)
+        self.__fill_evaluator__(e, set())
         for i, var in enumerate(variables):
             e.set_input_var(i, id(var))
         e.set_output_node(0, id(self))
@@ -297,10 +372,184 @@ def make_Expression(obj):
         return Constant(obj)
 
 
+def sparsity_pair(x, y):
+
+    # Hessian entry of two variables (ordered by id)
+    return (x, y) if x.id <= y.id else (y, x)
+
+
+def sparsity_union(sets):
+
+    # Sets are shared between nodes and never modified
+    sets = [s for s in sets if s]
+    if len(sets) == 1:
+        return sets[0]
+    return frozenset().union(*sets)
+
+
+def topological_sort(exprs):
+
+    order = []
+    visited = set()
+    stack = [(x, False) for x in exprs]
+    while stack:
+        x, expanded = stack.pop()
+        if expanded:
+            order.append(x)
+            continue
+        if id(x) in visited or not x.is_function():
+            continue
+        visited.add(id(x))
+        stack.append((x, True))
+        for arg in x.arguments:
+            if id(arg) not in visited:
+                stack.append((arg, False))
+    return order
+
+
+def collect_variables(exprs):
+
+    # Shared nodes are visited once and cached variable sets are reused
+    variables = set()
+    visited = set()
+    stack = list(exprs)
+    while stack:
+        x = stack.pop()
+        if x.is_variable():
+            variables.add(x)
+        elif x.is_function() and id(x) not in visited:
+            visited.add(id(x))
+            if x.__cache__ is not None and 'variables' in x.__cache__:
+                variables.update(x.__cache__['variables'])
+            else:
+                stack.extend(x.arguments)
+    return variables
+
+
+def fill_evaluator(evaluator, exprs, visited=None):
+
+    if visited is None:
+        visited = set()
+
+    types = []
+    ids = []
+    values = []
+    arg_ptr = [0]
+    arg_ids = []
+
+    stack = list(exprs)
+    while stack:
+        x = stack.pop()
+        if id(x) in visited:
+            continue
+        visited.add(id(x))
+        type = x.__evaluator_node_type__()
+        if type is NotImplemented:
+            raise NotImplementedError
+        types.append(type)
+        ids.append(id(x))
+        if isinstance(x, LinearExpression):
+            values.append(0.)
+            fill_linear_expression(evaluator, x, types, ids, values, arg_ptr, arg_ids)
+            stack.extend(x.variables)
+            continue
+        if isinstance(x, QuadraticExpression):
+            values.append(0.)
+            fill_quadratic_expression(evaluator, x, types, ids, values, arg_ptr, arg_ids)
+            stack.extend(x.arguments)
+            continue
+        if x.is_function():
+            values.append(0.)
+            arg_ids.extend([id(arg) for arg in x.arguments])
+            stack.extend(x.arguments)
+        else:
+            values.append(x.__value__)
+        arg_ptr.append(len(arg_ids))
+
+    evaluator.add_nodes(types, ids, values, arg_ptr, arg_ids)
+
+
+def fill_linear_expression(evaluator, x, types, ids, values, arg_ptr, arg_ids):
+
+    # Term nodes are keyed by ids reserved in the evaluator for x, so they
+    # cannot collide with expressions or with terms of other expressions
+    n = len(x.variables)
+    ptr = evaluator.node_ids(id(x), 2*n+1)
+    nodes = []
+
+    # Repeated variables are merged into their first term
+    terms = {}
+    for i, (var, c) in enumerate(zip(x.variables, x.coefficients.tolist())):
+        if id(var) in terms:
+            terms[id(var)][1] += c
+        else:
+            terms[id(var)] = [i, c]
+
+    # Single term (root is the term node)
+    if types[-1] != coptmod.NODE_TYPE_ADD:
+        if types[-1] == coptmod.NODE_TYPE_NEGATE:
+            arg_ids.append(id(x.variables[0]))
+        else:
+            arg_ids.extend([ptr, id(x.variables[0])])
+            nodes.append((coptmod.NODE_TYPE_CONSTANT, ptr, x.coefficients[0], []))
+
+    # Sum of terms
+    else:
+        for var_id, (i, c) in terms.items():
+            if c == 1.:
+                arg_ids.append(var_id)
+            elif c == -1.:
+                arg_ids.append(ptr+4*i+2)
+                nodes.append((coptmod.NODE_TYPE_NEGATE, ptr+4*i+2, 0., [var_id]))
+            else:
+                arg_ids.append(ptr+4*i+2)
+                nodes.append((coptmod.NODE_TYPE_CONSTANT, ptr+4*i, c, []))
+                nodes.append((coptmod.NODE_TYPE_MULTIPLY, ptr+4*i+2, 0., [ptr+4*i, var_id]))
+        if x.constant != 0.:
+            arg_ids.append(ptr+4*n)
+            nodes.append((coptmod.NODE_TYPE_CONSTANT, ptr+4*n, x.constant, []))
+    arg_ptr.append(len(arg_ids))
+
+    for type, node_id, value, args in nodes:
+        types.append(type)
+        ids.append(node_id)
+        values.append(value)
+        arg_ids.extend(args)
+        arg_ptr.append(len(arg_ids))
+
+
+def fill_quadratic_expression(evaluator, x, types, ids, values, arg_ptr, arg_ids):
+
+    # Term nodes are keyed by ids reserved in the evaluator
+    # (same scheme as fill_linear_expression)
+    ptr = evaluator.node_ids(id(x), 3*len(x.rows))
+    nodes = []
+
+    for k, (row, col, q) in enumerate(zip(x.rows, x.cols, x.values.tolist())):
+        nodes.append((coptmod.NODE_TYPE_MULTIPLY, ptr+6*k+2, 0., [id(row), id(col)]))
+        if q == 1.:
+            arg_ids.append(ptr+6*k+2)
+        else:
+            arg_ids.append(ptr+6*k+4)
+            nodes.append((coptmod.NODE_TYPE_CONSTANT, ptr+6*k, q, []))
+            nodes.append((coptmod.NODE_TYPE_MULTIPLY, ptr+6*k+4, 0., [ptr+6*k, ptr+6*k+2]))
+    if not x.linear.is_zero():
+        arg_ids.append(id(x.linear))
+    arg_ptr.append(len(arg_ids))
+
+    for type, node_id, value, args in nodes:
+        types.append(type)
+        ids.append(node_id)
+        values.append(value)
+        arg_ids.extend(args)
+        arg_ptr.append(len(arg_ids))
+
+
 class ExpressionMatrix(object):
 
     data = None
     shape = None
+    __order__ = None
     __array_priority__ = 10000.
 
     def __init__(self, obj=None):
@@ -351,7 +600,10 @@ class ExpressionMatrix(object):
 
     def __add__(self, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
+        elif isinstance(x, ExpressionMatrix):
             return ExpressionMatrix(self.data.__add__(x.data))
 
         else:
@@ -363,7 +615,10 @@ class ExpressionMatrix(object):
 
     def __sub__(self, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
+        elif isinstance(x, ExpressionMatrix):
             return ExpressionMatrix(self.data.__sub__(x.data))
 
         else:
@@ -371,7 +626,10 @@ class ExpressionMatrix(object):
 
     def __rsub__(self, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
+        elif isinstance(x, ExpressionMatrix):
             return ExpressionMatrix(self.data.__rsub__(x.data))
 
         else:
@@ -379,7 +637,7 @@ class ExpressionMatrix(object):
 
     def __mul__(self, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, (ExpressionMatrix, SparseExpressionMatrix)):
             return NotImplemented
 
         elif isinstance(x, np.ndarray):
@@ -390,7 +648,7 @@ class ExpressionMatrix(object):
 
     def __rmul__(self, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, (ExpressionMatrix, SparseExpressionMatrix)):
             return NotImplemented
 
         elif isinstance(x, np.ndarray):
@@ -399,6 +657,24 @@ class ExpressionMatrix(object):
         else:
             return self.__mul__(x)
 
+    def __matmul__(self, x):
+
+        x = constant_operand(x)
+        if x is None:
+            return NotImplemented
+
+        else:
+            return ExpressionMatrix(constant_matmul(x.T, np.asarray(self.data).T).T)
+
+    def __rmatmul__(self, x):
+
+        x = constant_operand(x)
+        if x is None:
+            return NotImplemented
+
+        else:
+            return ExpressionMatrix(constant_matmul(x, np.asarray(self.data)))
+
     def __eq__(self, x):
 
         return self.__cmp_util__('==', x)
@@ -413,12 +689,19 @@ class ExpressionMatrix(object):
 
     def __cmp_util__(self, op, x):
 
-        if isinstance(x, ExpressionMatrix):
+        if isinstance(x, SparseExpressionMatrix):
+            return NotImplemented
+
+        elif isinstance(x, ExpressionMatrix):
             return ConstraintArray(np.vectorize(lambda a,b: a.__cmp_util__(op, b))(self.data, x.data))
 
         else:
             return ConstraintArray(np.vectorize(lambda a,b: a.__cmp_util__(op, b))(self.data, np.asarray(x)))
 
+    def __fill_evaluator__(self, evaluator, visited=None):
+
+        fill_evaluator(evaluator, np.asarray(self.data).flatten().tolist(), visited=visited)
+
     def get_data(self):
 
         return self.data
@@ -426,16 +709,19 @@ class ExpressionMatrix(object):
     def get_value(self):
 
         if self.data.size:
-            return np.vectorize(lambda x: x.get_value())(self.data)
+            if self.__order__ is None:
+                self.__order__ = topological_sort(np.asarray(self.data).flatten().tolist())
+            for x in self.__order__:
+                x.__set_value__()
+            values = np.fromiter([x.__value__ for x in np.asarray(self.data).flat],
+                                 dtype=np.float64, count=self.data.size)
+            return np.asmatrix(values.reshape(self.data.shape))
         else:
             return np.asmatrix(self.data, dtype=np.float64)
 
     def get_variables(self):
 
-        return reduce(lambda x,y: x.union(y),
-                      map(lambda arg: arg.get_variables(),
-                      np.asarray(self.data).flatten().tolist()),
-                      set())
+        return collect_variables(np.asarray(self.data).flatten().tolist())
 
     def get_fast_evaluator(self, variables):
 
@@ -445,23 +731,311 @@ class ExpressionMatrix(object):
                               self.shape[0]*self.shape[1],
                               shape=self.shape,
                               scalar_output=False)
+        self.__fill_evaluator__(e, set())
         for i in range(self.shape[0]):
             for j in range(self.shape[1]):
-                x = self.data[i,j]
-                x.__fill_evaluator__(e)
-                e.set_output_node(i*self.shape[1]+j, id(x))
+                e.set_output_node(i*self.shape[1]+j, id(self.data[i,j]))
         for i, var in enumerate(variables):
             e.set_input_var(i, id(var))
         return e
 
-class SparseExpressionMatrix:
+def constant_operand(x):
+
+    # Constant matrix operand of @ (lists and tuples are converted) or None
+    if isinstance(x, (list, tuple)):
+        x = np.asarray(x)
+    if isinstance(x, np.ndarray) or issparse(x):
+        return x
+    return None
+
+def constant_matmul(A, X):
+
+    # A @ X for a constant dense or sparse matrix A and an object array X;
+    # every entry is one sum built from a row of A in CSR form
+    A = A.tocsr() if issparse(A) else csr_matrix(np.atleast_2d(np.asarray(A, dtype=np.float64)))
+    if A.shape[1] != X.shape[0]:
+        raise ValueError('shapes not aligned')
+
+    Y = np.empty((A.shape[0], X.shape[1]), dtype=object)
+    for j in range(X.shape[1]):
+        col = X[:,j].tolist()
+        variables = all([x.is_variable() for x in col])
+        linear = variables or all([is_linear(x) for x in col])
+        for i in range(A.shape[0]):
+            start, end = A.indptr[i], A.indptr[i+1]
+            exprs = [col[k] for k in A.indices[start:end]]
+            coefficients = A.data[start:end]
+            if variables:
+                Y[i,j] = make_linear(exprs, coefficients.copy(), 0.)
+            elif linear:
+                Y[i,j] = linear_combination(exprs, coefficients)
+            else:
+                Y[i,j] = sum_terms([x*c for x, c in zip(exprs, coefficients)])
+    return Y
+
+
+class SparseExpressionMatrix(object):
     """
-    Not yet implemented.
+    Sparse matrix of expressions in coordinate format. Entries are
+    sorted by row and column, without duplicates or zero constants.
     """
 
-    pass
+    row = None
+    col = None
+    data = None
+    shape = None
+    __order__ = None
+    __array_priority__ = 10000.
+
+    def __init__(self, obj=None, shape=None):
+
+        if isinstance(obj, SparseExpressionMatrix):
+            self.row = obj.row
+            self.col = obj.col
+            self.data = obj.data
+            self.shape = obj.shape
+
+        elif issparse(obj):
+            obj = obj.tocoo()
+            self.__set_entries__([make_Expression(x) for x in obj.data.tolist()],
+                                 obj.row, obj.col, obj.shape)
+
+        elif isinstance(obj, tuple):
+            data, (row, col) = obj
+            if shape is None:
+                shape = (int(np.max(row))+1 if len(row) else 0,
+                         int(np.max(col))+1 if len(col) else 0)
+            self.__set_entries__([make_Expression(x) for x in data], row, col, shape)
+
+        elif obj is not None:
+            data = np.asarray(ExpressionMatrix(obj).data)
+            row, col = np.nonzero(np.vectorize(lambda x: not x.is_zero(), otypes=[bool])(data))
+            self.__set_entries__(data[row, col].tolist(), row, col, data.shape)
+
+        if shape is not None and tuple(shape) != self.shape:
+            raise ValueError('invalid shape')
+
+    def __set_entries__(self, data, row, col, shape):
+
+        row = np.asarray(row, dtype=int)
+        col = np.asarray(col, dtype=int)
+        shape = tuple(int(n) for n in shape)
+        if row.size and (np.any(row < 0) or np.any(col < 0) or
+                         np.max(row) >= shape[0] or np.max(col) >= shape[1]):
+            raise ValueError('index out of bounds')
+
+        # Sort and sum duplicates
+        order = np.lexsort((col, row))
+        row = row[order]
+        col = col[order]
+        if row.size:
+            starts = np.flatnonzero(np.concatenate([[True], (np.diff(row) != 0) | (np.diff(col) != 0)]))
+        else:
+            starts = np.zeros(0, dtype=int)
+        ends = np.append(starts[1:], row.size)
+        entries = []
+        keep = []
+        for start, end in zip(starts, ends):
+            if end-start == 1:
+                x = data[order[start]]
+            else:
+                x = sum_terms([data[k] for k in order[start:end]])
+            if not x.is_zero():
+                entries.append(x)
+                keep.append(start)
+
+        self.row = row[keep]
+        self.col = col[keep]
+        self.data = np.empty(len(entries), dtype=object)
+        self.data[:] = entries
+        self.shape = shape
+
+    def __repr__(self):
+
+        return ''.join(['  (%d, %d)\t%s\n' %(i, j, x)
+                        for i, j, x in zip(self.row, self.col, self.data)])
+
+    def __getitem__(self, key):
+
+        i, j = key
+        m, n = self.shape
+        if not (-m <= i < m and -n <= j < n):
+            raise IndexError('index out of bounds')
+        keys = self.row*n + self.col
+        k = (i % m)*n + (j % n)
+        pos = np.searchsorted(keys, k)
+        if pos < keys.size and keys[pos] == k:
+            return self.data[pos]
+        return make_Expression(0.)
+
+    def __neg__(self):
+
+        return self.__map__(lambda x: -x)
+
+    def __add__(self, x):
+
+        if isinstance(x, SparseExpressionMatrix) or issparse(x):
+            x = SparseExpressionMatrix(x)
+            if x.shape != self.shape:
+                raise ValueError('shapes do not match')
+            return SparseExpressionMatrix((np.concatenate([self.data, x.data]),
+                                           (np.concatenate([self.row, x.row]),
+                                            np.concatenate([self.col, x.col]))),
+                                          shape=self.shape)
+
+        else:
+            return self.todense().__add__(x)
+
+    def __radd__(self, x):
+
+        return self.__add__(x)
+
+    def __sub__(self, x):
+
+        return self.__add__(-x)
+
+    def __rsub__(self, x):
+
+        return (-self).__add__(x)
+
+    def __mul__(self, x):
+
+        if isinstance(x, (np.ndarray, ExpressionMatrix, SparseExpressionMatrix)) or issparse(x):
+            return NotImplemented
+
+        else:
+            x = make_Expression(x)
+            return self.__map__(lambda a: a*x)
+
+    def __rmul__(self, x):
+
+        return self.__mul__(x)
+
+    def __matmul__(self, x):
+
+        x = constant_operand(x)
+        if x is None:
+            return NotImplemented
+
+        else:
+            return sparse_constant_matmul(x.T, self.transpose()).transpose()
+
+    def __rmatmul__(self, x):
+
+        x = constant_operand(x)
+        if x is None:
+            return NotImplemented
+
+        else:
+            return sparse_constant_matmul(x, self)
+
+    def __eq__(self, x):
+
+        return self.__cmp_util__('==', x)
+
+    def __le__(self, x):
+
+        return self.__cmp_util__('<=', x)
+
+    def __ge__(self, x):
+
+        return self.__cmp_util__('>=', x)
+
+    def __cmp_util__(self, op, x):
+
+        # Sparse right-hand side
+        if isinstance(x, SparseExpressionMatrix) or issparse(x):
+            return (self - x).__cmp_util__(op, 0.)
+
+        # Constant right-hand side (missing entries must satisfy 0 op x)
+        if np.isscalar(x) or (isinstance(x, np.ndarray) and x.dtype != np.dtype(object)):
+            b = np.broadcast_to(np.asarray(x, dtype=np.float64), self.shape)
+            ok = {'==': lambda v: v == 0., '<=': lambda v: v >= 0., '>=': lambda v: v <= 0.}[op]
+            if np.isscalar(x):
+                feasible = ok(b[0,0]) or self.nnz == self.shape[0]*self.shape[1]
+            else:
+                missing = np.ones(self.shape, dtype=bool)
+                missing[self.row, self.col] = False
+                feasible = np.all(ok(b[missing]))
+            if not feasible:
+                raise ValueError('infeasible constraint')
+            c = ConstraintArray()
+            c.data = np.empty(self.data.size, dtype=object)
+            c.data[:] = [Constraint(a, op, bb) for a, bb in zip(self.data, b[self.row, self.col].tolist())]
+            c.shape = c.data.shape
+            return c
+
+        # Other
+        return self.todense().__cmp_util__(op, x)
+
+    def __map__(self, fn):
+
+        return SparseExpressionMatrix(([fn(x) for x in self.data], (self.row, self.col)),
+                                      shape=self.shape)
+
+    @property
+    def nnz(self):
+
+        return self.data.size
+
+    def transpose(self):
+
+        return SparseExpressionMatrix((self.data, (self.col, self.row)),
+                                      shape=(self.shape[1], self.shape[0]))
+
+    def todense(self):
+
+        data = np.empty(self.shape, dtype=object)
+        data.fill(make_Expression(0.))
+        data[self.row, self.col] = self.data
+        return ExpressionMatrix(np.asmatrix(data))
+
+    def get_value(self):
+
+        if self.__order__ is None:
+            self.__order__ = topological_sort(self.data.tolist())
+        for x in self.__order__:
+            x.__set_value__()
+        values = np.fromiter([x.__value__ for x in self.data], dtype=np.float64, count=self.data.size)
+        return coo_matrix((values, (self.row, self.col)), shape=self.shape)
+
+    def get_variables(self):
+
+        return collect_variables(self.data.tolist())
+
+
+def sparse_constant_matmul(A, S):
+
+    # A @ S for a constant dense or sparse matrix A; entries of S are
+    # visited row by row (S is sorted by row)
+    A = A.tocsr() if issparse(A) else csr_matrix(np.atleast_2d(np.asarray(A, dtype=np.float64)))
+    if A.shape[1] != S.shape[0]:
+        raise ValueError('shapes not aligned')
+
+    ptr = np.searchsorted(S.row, np.arange(S.shape[0]+1))
+    data = []
+    row = []
+    col = []
+    for i in range(A.shape[0]):
+        terms = OrderedDict()
+        for k, c in zip(A.indices[A.indptr[i]:A.indptr[i+1]], A.data[A.indptr[i]:A.indptr[i+1]]):
+            for t in range(ptr[k], ptr[k+1]):
+                exprs, coefficients = terms.setdefault(S.col[t], ([], []))
+                exprs.append(S.data[t])
+                coefficients.append(c)
+        for j, (exprs, coefficients) in terms.items():
+            if all([is_linear(x) for x in exprs]):
+                data.append(linear_combination(exprs, coefficients))
+            else:
+                data.append(sum_terms([x*c for x, c in zip(exprs, coefficients)]))
+            row.append(i)
+            col.append(j)
+
+    return SparseExpressionMatrix((data, (row, col)), shape=(A.shape[0], S.shape[1]))
 
 # Circular imports
 from .constant import Constant
-from .function import add, multiply
+from .function import add, multiply, LinearExpression, QuadraticExpression, extend_list
+from .function import is_linear, is_quadratic, quadratic_combination, quadratic_product
+from .function import linear_combination, make_linear, sum_terms
 from .constraint import Constraint, ConstraintArray
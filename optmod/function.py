@@ -1,32 +1,62 @@
 import numpy as np
+from . import utils
 from . import coptmod
-from functools import reduce
+from collections import OrderedDict
 from .constant import Constant
-from collections import defaultdict
 from .variable import VariableScalar
-from .expression import Expression, ExpressionMatrix, make_Expression
+from .expression import (Expression, ExpressionMatrix, make_Expression, topological_sort,
+                         collect_variables, sparsity_pair, sparsity_union)
 
 
 class Function(Expression):
 
-    arguments = []
+    __slots__ = ('arguments', '__cache__')
+    __analyze_args__ = True # analysis uses properties of arguments
 
     def __init__(self, args=[]):
 
         Expression.__init__(self)
         self.arguments = args
+        self.__cache__ = None
 
     def __repr__(self):
 
-        args = [x.__repr__() for x in self.arguments]
-        return '%s(%s)' %(self.name, ','.join(args))
+        # Strings and arguments to print, expanded with an explicit stack
+        parts = []
+        stack = [self]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, str):
+                parts.append(x)
+            elif x.is_function():
+                stack.extend(reversed(x.__repr_parts__()))
+            else:
+                parts.append(x.__repr__())
+        return ''.join(parts)
+
+    def __repr_parts__(self):
+
+        parts = [self.name+'(']
+        for arg in self.arguments:
+            parts += [arg, ',']
+        parts[-1] = ')'
+        return parts
 
     def __analyze__(self):
 
-        a = {}
+        # Only the properties of the queried node are cached
+        cache = self.__get_cache__()
+        if 'prop' not in cache:
+            cache['prop'] = analyze(self)
+        return cache['prop']
+
+    def __analyze_node__(self, args):
 
-        for i, arg in enumerate(self.arguments):
-            prop = arg.__analyze__()
+        # Arguments are (properties, owned) pairs, owned dicts may be updated
+        (prop, owned), args = args[0], args[1:]
+        a = prop['a'] if owned else dict(prop['a'])
+
+        for prop, owned in args:
             a.update(prop['a'])
 
         return {'affine': False,
@@ -37,69 +67,75 @@ class Function(Expression):
 
         return NotImplemented
 
-    def __fill_evaluator__(self, evaluator):
+    def __sparsity__(self):
 
-        evaluator.add_node(self.__evaluator_node_type__(),
-                           id(self),
-                           0.,
-                           [id(arg) for arg in self.arguments])
+        # Variables and pairs of variables with possibly nonzero second
+        # derivatives, arguments first (no derivatives are constructed)
+        sparsity = {}
+        for x in topological_sort([self]):
+            sparsity[id(x)] = x.__sparsity_node__(sparsity)
+        return sparsity[id(self)]
 
-        for arg in self.arguments:
-            arg.__fill_evaluator__(evaluator)
+    def __sparsity_node__(self, sparsity):
 
-    def __all_simple_paths__(self, vars, path):
+        args = [arg_sparsity(sparsity, arg) for arg in self.arguments]
+        vars = sparsity_union([v for v, p in args])
+        pairs = [p for v, p in args]
+        pairs.append(frozenset(sparsity_pair(x, y) for x in vars for y in vars))
+        return (vars, sparsity_union(pairs))
 
-        if any([not isinstance(var, VariableScalar) for var in vars]):
-            raise TypeError('agrument must be set of variables')
+    def __partials__(self):
 
-        vars = set(vars)
+        return [self.__partial__(arg) for arg in self.arguments]
 
-        path = path + (self,)
-        paths = defaultdict(list)
-        for arg in self.arguments:
-            if arg in vars:
-                paths[arg].append(path+(arg,))
-            elif arg.is_function():
-                for key, value in arg.__all_simple_paths__(vars, path).items():
-                    paths[key].extend(value)
-        return paths
+    def __intern_key__(self):
+
+        return (type(self), tuple(id(arg) for arg in self.arguments))
 
     def get_derivatives(self, vars):
 
-        paths = self.__all_simple_paths__(vars, ())
-        derivs = {}
-        for var in vars:
-            d = 0.
-            for path in paths[var]:
-                prod = make_Expression(1.)
-                for parent, child in zip(path[:-1], path[1:]):
-                    prod = prod*parent.__partial__(child)
-                d = d + prod
-            derivs[var] = make_Expression(d)
-        return derivs
+        if any([not isinstance(var, VariableScalar) for var in vars]):
+            raise TypeError('agrument must be set of variables')
+
+        var_ids = set([id(var) for var in vars])
+
+        # Reverse accumulation (adjoint of each node built once and shared)
+        terms = {id(self): [make_Expression(1.)]}
+        for n in reversed(topological_sort([self])):
+            if id(n) not in terms:
+                continue
+            adj = sum_terms(terms.pop(id(n)))
+            if adj.is_zero():
+                continue
+            for arg, partial in zip(n.arguments, n.__partials__()):
+                if arg.is_function() or id(arg) in var_ids:
+                    terms.setdefault(id(arg), []).append(adj*partial)
+
+        return dict((var, sum_terms(terms.get(id(var), []))) for var in vars)
 
     def get_variables(self):
 
-        return reduce(lambda x,y: x.union(y),
-                      map(lambda arg: arg.get_variables(), self.arguments),
-                      set())
+        cache = self.__get_cache__()
+        if 'variables' not in cache:
+            cache['variables'] = frozenset(collect_variables([self]))
+        return set(cache['variables'])
 
     def get_value(self):
 
-        process = [self]
-        processed = []
-        while process:
-            new_nodes = []
-            for n in process:
-                processed.insert(0, n)
-                if isinstance(n, Function):
-                    for nn in n.arguments:
-                        new_nodes.append(nn)
-            process = new_nodes
-        for n in processed:
+        cache = self.__get_cache__()
+        if 'order' not in cache:
+            cache['order'] = topological_sort([self])
+        for n in cache['order']:
             n.__set_value__()
         return self.__value__
 
+    def __get_cache__(self):
+
+        # Results cached on this node (storage created on first use)
+        if self.__cache__ is None:
+            self.__cache__ = {}
+        return self.__cache__
+
     def is_function(self):
 
         return True
@@ -107,6 +143,8 @@ class Function(Expression):
 
 class ElementWiseFunction(Function):
 
+    __slots__ = ()
+
     def __new__(cls, arg):
 
         if isinstance(arg, ExpressionMatrix):
@@ -126,17 +164,31 @@ class ElementWiseFunction(Function):
 
 class add(Function):
 
+    # Arguments are the first __size__ entries of __args__, a list that
+    # later sums may extend in place (see extend_list)
+    __slots__ = ('__args__', '__size__')
+
     def __init__(self, args):
 
-        Function.__init__(self, args)
+        Expression.__init__(self)
 
         self.name = 'add'
-        assert(len(self.arguments) >= 2)
+        self.__args__ = args
+        self.__size__ = len(args)
+        self.__cache__ = None
+        assert(self.__size__ >= 2)
 
-    def __repr__(self):
+    @property
+    def arguments(self):
 
-        args = [x.__repr__()+' + ' for x in self.arguments]
-        return (''.join(args))[:-3]
+        return view_list(self.__args__, self.__size__)
+
+    def __repr_parts__(self):
+
+        parts = []
+        for arg in self.arguments:
+            parts += [arg, ' + ']
+        return parts[:-1]
 
     def __partial__(self, arg):
 
@@ -145,15 +197,16 @@ class add(Function):
                 return make_Expression(1.)
         raise ValueError('invalid argument')
 
-    def __analyze__(self):
+    def __partials__(self):
+
+        # Same unit partial for every argument (no search per argument)
+        return [make_Expression(1.)]*self.__size__
 
-        args = self.arguments
+    def __analyze_node__(self, args):
 
-        props = []
-        for i, arg in enumerate(args):
-            props.append(arg.__analyze__())
+        props = [prop for prop, owned in args]
 
-        new_a = props[0]['a']
+        new_a = props[0]['a'] if args[0][1] else dict(props[0]['a'])
         for prop in props[1:]:
             for x in prop['a']:
                 if x in new_a:
@@ -165,17 +218,140 @@ class add(Function):
                 'a': new_a,
                 'b': sum([prop['b'] for prop in props])}
 
+    def __sparsity_node__(self, sparsity):
+
+        args = [arg_sparsity(sparsity, arg) for arg in self.arguments]
+        return (sparsity_union([v for v, p in args]),
+                sparsity_union([p for v, p in args]))
+
     def __evaluator_node_type__(self):
 
         return coptmod.NODE_TYPE_ADD
 
+    def __intern_key__(self):
+
+        return (add, tuple(sorted(id(arg) for arg in self.arguments)))
+
     def __set_value__(self):
 
         self.__value__ = np.sum(list(map(lambda a: a.__value__, self.arguments)))
 
 
+def cached(x, key):
+
+    return x.__cache__.get(key) if x.__cache__ is not None else None
+
+
+def analyze(root):
+
+    # Properties of root, computed arguments first without caching those of
+    # other nodes. Properties are dropped once their last parent used them,
+    # and that parent owns (may update) their dict
+    order = []
+    num_parents = {}
+    visited = set()
+    stack = [(root, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if expanded:
+            order.append(x)
+            continue
+        if id(x) in visited:
+            continue
+        visited.add(id(x))
+        stack.append((x, True))
+        if x.__analyze_args__:
+            for arg in x.arguments:
+                if arg.is_function() and cached(arg, 'prop') is None:
+                    num_parents[id(arg)] = num_parents.get(id(arg), 0) + 1
+                    if id(arg) not in visited:
+                        stack.append((arg, False))
+
+    props = {}
+    for x in order:
+        args = None
+        if x.__analyze_args__:
+            args = []
+            for arg in x.arguments:
+                if id(arg) not in props:
+                    args.append(analyze_arg(arg))
+                elif num_parents[id(arg)] > 1:
+                    num_parents[id(arg)] -= 1
+                    args.append((props[id(arg)], False))
+                else:
+                    args.append((props.pop(id(arg)), True))
+        props[id(x)] = x.__analyze_node__(args)
+    return props[id(root)]
+
+
+def analyze_arg(x):
+
+    # Properties of an argument outside of the current pass
+    if not x.is_function():
+        return (x.__analyze__(), True)
+    prop = cached(x, 'prop')
+    if prop is not None:
+        return (prop, False)
+    return (analyze(x), True)
+
+
+def arg_sparsity(sparsity, arg):
+
+    return sparsity[id(arg)] if arg.is_function() else arg.__sparsity__()
+
+
+def view_list(buf, size):
+
+    return buf if len(buf) == size else buf[:size]
+
+
+def extend_list(buf, size, items):
+
+    # If nothing was appended past size yet, buf is extended in place
+    # (earlier expressions only see their prefix), so repeated sums
+    # f = f + term are amortized O(1)
+    if len(buf) != size:
+        buf = buf[:size]
+    buf.extend(items)
+    return buf
+
+
+def extend_array(buf, size, values):
+
+    n = size + len(values)
+    if n > buf.size:
+        new = np.empty(max(2*n, 8))
+        new[:size] = buf[:size]
+        buf = new
+    buf[size:n] = values
+    return buf
+
+
+def sum_terms(terms):
+
+    # Affine and quadratic terms (also inside flattened sums) are merged
+    quad = []
+    args = []
+    for t in terms:
+        for a in (t.arguments if type(t) is add else [t]):
+            if is_quadratic(a):
+                quad.append(a)
+            else:
+                args.append(a)
+    if quad or not args:
+        quad = quadratic_combination(quad, [1.]*len(quad))
+        if not args or not quad.is_zero():
+            args.append(quad)
+
+    if len(args) == 1:
+        return args[0]
+    return add(args)
+
+
 class multiply(Function):
 
+    __slots__ = ()
+
     def __init__(self, args):
 
         Function.__init__(self, args)
@@ -183,15 +359,17 @@ class multiply(Function):
         self.name = 'multiply'
         assert(len(self.arguments) == 2)
 
-    def __repr__(self):
+    def __repr_parts__(self):
 
         a = self.arguments[0]
         b = self.arguments[1]
 
-        needp = lambda x: True if isinstance(x, add) else False
+        needp = lambda x: (isinstance(x, add) and
+                           not (isinstance(x, LinearExpression) and
+                                len(x.variables) == 1 and x.constant == 0.))
 
-        return '%s*%s' %('(%s)' %str(a) if needp(a) else '%s' %str(a),
-                         '(%s)' %str(b) if needp(b) else '%s' %str(b))
+        return ((['(', a, ')'] if needp(a) else [a]) + ['*'] +
+                (['(', b, ')'] if needp(b) else [b]))
 
     def __partial__(self, arg):
 
@@ -204,12 +382,9 @@ class multiply(Function):
         else:
             raise ValueError('invalid argument')
 
-    def __analyze__(self):
-
-        arg1, arg2 = self.arguments
+    def __analyze_node__(self, args):
 
-        prop1 = arg1.__analyze__()
-        prop2 = arg2.__analyze__()
+        prop1, prop2 = [prop for prop, owned in args]
 
         a1 = dict([(x, val*prop2['b']) for x, val in prop1['a'].items()])
         a2 = dict([(x, val*prop1['b']) for x, val in prop2['a'].items()])
@@ -221,17 +396,391 @@ class multiply(Function):
                 'a': new_a,
                 'b': prop1['b']*prop2['b']}
 
+    def __sparsity_node__(self, sparsity):
+
+        (vars1, pairs1), (vars2, pairs2) = [arg_sparsity(sparsity, arg) for arg in self.arguments]
+        cross = frozenset(sparsity_pair(x, y) for x in vars1 for y in vars2)
+        return (sparsity_union([vars1, vars2]),
+                sparsity_union([pairs1, pairs2, cross]))
+
     def __evaluator_node_type__(self):
 
         return coptmod.NODE_TYPE_MULTIPLY
 
+    def __intern_key__(self):
+
+        return (multiply, tuple(sorted(id(arg) for arg in self.arguments)))
+
     def __set_value__(self):
 
         self.__value__ = np.prod([a.__value__ for a in self.arguments])
 
 
+class LinearExpression(add):
+
+    __slots__ = ('__vars__', '__coefs__', 'constant')
+    __analyze_args__ = False
+
+    def __init__(self, variables, coefficients, constant=0., size=None):
+
+        Expression.__init__(self)
+
+        self.name = 'add'
+        if size is None:
+            self.__vars__ = list(variables)
+            self.__coefs__ = np.array(coefficients, dtype=np.float64)
+            self.__size__ = len(self.__vars__)
+        else:
+            self.__vars__ = variables
+            self.__coefs__ = coefficients
+            self.__size__ = size
+        self.constant = float(constant)
+        self.__cache__ = None
+
+        assert(self.__size__ <= min(len(self.__vars__), self.__coefs__.size))
+
+    @property
+    def variables(self):
+
+        return view_list(self.__vars__, self.__size__)
+
+    @property
+    def coefficients(self):
+
+        return self.__coefs__[:self.__size__]
+
+    def __repr_parts__(self):
+
+        terms = [x.__repr__() if c == 1. else '%s*%s' %(x.__repr__(), utils.repr_number(c))
+                 for x, c in zip(self.variables, self.coefficients)]
+        if self.constant != 0.:
+            terms.append(utils.repr_number(self.constant))
+        return [' + '.join(terms)]
+
+    @property
+    def arguments(self):
+
+        return self.variables
+
+    def __partial__(self, arg):
+
+        for x, c in zip(self.variables, self.coefficients):
+            if arg is x:
+                return make_Expression(c)
+        raise ValueError('invalid argument')
+
+    def __partials__(self):
+
+        return [make_Expression(c) for c in self.coefficients]
+
+    def __analyze_node__(self, args):
+
+        a = {}
+        for x, c in zip(self.variables, self.coefficients.tolist()):
+            a[x] = a.get(x, 0.) + c
+
+        return {'affine': True,
+                'a': a,
+                'b': self.constant}
+
+    def __sparsity_node__(self, sparsity):
+
+        return (frozenset(self.variables), frozenset())
+
+    def __evaluator_node_type__(self):
+
+        if len(self.variables) == 1 and self.constant == 0.:
+            if self.coefficients[0] == -1.:
+                return coptmod.NODE_TYPE_NEGATE
+            return coptmod.NODE_TYPE_MULTIPLY
+        return coptmod.NODE_TYPE_ADD
+
+    def __intern_key__(self):
+
+        return (LinearExpression,
+                tuple(id(x) for x in self.variables),
+                tuple(self.coefficients.tolist()),
+                self.constant)
+
+    def __set_value__(self):
+
+        self.__value__ = self.constant + np.dot(self.coefficients,
+                                                [x.__value__ for x in self.variables])
+
+
+def is_linear(x):
+
+    return isinstance(x, (VariableScalar, Constant, LinearExpression))
+
+
+def linear_combination(exprs, scalars):
+
+    # Terms are appended to the buffers of a leading unscaled LinearExpression
+    base = None
+    if exprs and type(exprs[0]) is LinearExpression and scalars[0] == 1.:
+        base = exprs[0]
+        exprs = exprs[1:]
+        scalars = scalars[1:]
+
+    variables = []
+    coefficients = []
+    constant = base.constant if base is not None else 0.
+    for x, s in zip(exprs, scalars):
+        if isinstance(x, Constant):
+            constant += s*x.__value__
+        elif isinstance(x, VariableScalar):
+            variables.append(x)
+            coefficients.append([s])
+        else:
+            variables.extend(x.variables)
+            coefficients.append(s*x.coefficients if s != 1. else x.coefficients)
+            constant += s*x.constant
+
+    if base is not None:
+        return extend_linear(base, variables, coefficients, constant)
+    if not variables:
+        return make_Expression(constant)
+    return make_linear(variables, np.concatenate(coefficients), constant)
+
+
+def extend_linear(x, variables, coefficients, constant):
+
+    n = x.__size__
+    if n + len(variables) == 1:
+        return make_linear(x.variables, x.coefficients, constant)
+    coefs = x.__coefs__ if len(x.__vars__) == n else x.__coefs__[:n]
+    variables = extend_list(x.__vars__, n, variables)
+    coefs = extend_array(coefs, n, np.concatenate(coefficients) if coefficients else [])
+    return LinearExpression(variables, coefs, constant, size=len(variables))
+
+
+def make_linear(variables, coefficients, constant):
+
+    if not variables:
+        return make_Expression(constant)
+    if len(variables) == 1 and coefficients[0] == 1. and constant == 0.:
+        return variables[0]
+    return LinearExpression(variables, coefficients, constant)
+
+
+class QuadraticExpression(add):
+
+    __slots__ = ('__rows__', '__cols__', '__values__', 'linear')
+    __analyze_args__ = False
+
+    def __init__(self, rows, cols, values, linear=0., size=None):
+
+        Expression.__init__(self)
+
+        self.name = 'add'
+        if size is None:
+            self.__rows__ = list(rows)
+            self.__cols__ = list(cols)
+            self.__values__ = np.array(values, dtype=np.float64)
+            self.__size__ = len(self.__rows__)
+        else:
+            self.__rows__ = rows
+            self.__cols__ = cols
+            self.__values__ = values
+            self.__size__ = size
+        self.linear = make_Expression(linear)
+        self.__cache__ = None
+
+        assert(len(self.__rows__) == len(self.__cols__))
+        assert(self.__size__ <= min(len(self.__rows__), self.__values__.size))
+        assert(is_linear(self.linear))
+
+    @property
+    def rows(self):
+
+        return view_list(self.__rows__, self.__size__)
+
+    @property
+    def cols(self):
+
+        return view_list(self.__cols__, self.__size__)
+
+    @property
+    def values(self):
+
+        return self.__values__[:self.__size__]
+
+    def __repr_parts__(self):
+
+        terms = ['%s*%s' %(x, y) if q == 1. else '%s*%s*%s' %(x, utils.repr_number(q), y)
+                 for x, y, q in zip(self.rows, self.cols, self.values)]
+        if not self.linear.is_zero():
+            return [' + '.join(terms), ' + ', self.linear]
+        return [' + '.join(terms)]
+
+    @property
+    def arguments(self):
+
+        if self.linear.is_zero():
+            return self.rows + self.cols
+        return self.rows + self.cols + [self.linear]
+
+    def __partial__(self, arg):
+
+        d = [p for x, p in zip(self.arguments, self.__partials__()) if x is arg]
+        if not d:
+            raise ValueError('invalid argument')
+        return sum_terms(d)
+
+    def __partials__(self):
+
+        partials = ([linear_combination([y], [q]) for y, q in zip(self.cols, self.values)] +
+                    [linear_combination([x], [q]) for x, q in zip(self.rows, self.values)])
+        if not self.linear.is_zero():
+            partials.append(make_Expression(1.))
+        return partials
+
+    def __analyze_node__(self, args):
+
+        prop, owned = analyze_arg(self.linear)
+
+        a = prop['a'] if owned else dict(prop['a'])
+        for x in self.rows + self.cols:
+            a.setdefault(x, 0.)
+
+        return {'affine': False,
+                'a': a,
+                'b': prop['b']}
+
+    def __get_std_components__(self, derivatives=True):
+
+        gphi_list = []
+        Hphi_list = []
+
+        prop = self.__analyze__()
+
+        # Gradient is affine and Hessian is constant
+        if derivatives:
+            g = OrderedDict((x, ([], [])) for x in prop['a'])
+            H = OrderedDict()
+            for x, y, q in zip(self.rows, self.cols, self.values.tolist()):
+                g[x][0].append(y)
+                g[x][1].append(q)
+                g[y][0].append(x)
+                g[y][1].append(q)
+                key = sparsity_pair(x, y)
+                H[key] = H.get(key, 0.) + (2.*q if x is y else q)
+            for x, c in self.linear.__analyze__()['a'].items():
+                g[x][0].append(make_Expression(1.))
+                g[x][1].append(c)
+            for x, (exprs, scalars) in g.items():
+                gphi_list.append((x, linear_combination(exprs, scalars)))
+            for (x, y), q in H.items():
+                if q != 0.:
+                    Hphi_list.append((x, y, make_Expression(q)))
+
+        return {'phi': self,
+                'gphi_list': gphi_list,
+                'Hphi_list': Hphi_list,
+                'phi_prop': prop}
+
+    def __sparsity_node__(self, sparsity):
+
+        vars, pairs = arg_sparsity(sparsity, self.linear)
+        return (sparsity_union([vars, frozenset(self.rows + self.cols)]),
+                frozenset(sparsity_pair(x, y) for x, y in zip(self.rows, self.cols)))
+
+    def __evaluator_node_type__(self):
+
+        return coptmod.NODE_TYPE_ADD
+
+    def __intern_key__(self):
+
+        terms = [(min(id(x), id(y)), max(id(x), id(y)), q)
+                 for x, y, q in zip(self.rows, self.cols, self.values.tolist())]
+        return (QuadraticExpression, tuple(sorted(terms)), id(self.linear))
+
+    def __set_value__(self):
+
+        self.__value__ = self.linear.__value__ + np.dot(self.values,
+                                                        [x.__value__*y.__value__
+                                                         for x, y in zip(self.rows, self.cols)])
+
+
+def is_quadratic(x):
+
+    return is_linear(x) or isinstance(x, QuadraticExpression)
+
+
+def quadratic_combination(exprs, scalars):
+
+    # Terms are appended to the buffers of a leading unscaled QuadraticExpression
+    base = None
+    if exprs and type(exprs[0]) is QuadraticExpression and scalars[0] == 1.:
+        base = exprs[0]
+        exprs = exprs[1:]
+        scalars = scalars[1:]
+
+    rows = []
+    cols = []
+    values = []
+    lin = [base.linear] if base is not None else []
+    lin_scalars = [1.] if base is not None else []
+    for x, s in zip(exprs, scalars):
+        if isinstance(x, QuadraticExpression):
+            rows.extend(x.rows)
+            cols.extend(x.cols)
+            values.append(s*x.values if s != 1. else x.values)
+            lin.append(x.linear)
+        else:
+            lin.append(x)
+        lin_scalars.append(s)
+
+    linear = linear_combination(lin, lin_scalars)
+    if base is not None:
+        return extend_quadratic(base, rows, cols, values, linear)
+    if not rows:
+        return linear
+    return QuadraticExpression(rows, cols, np.concatenate(values), linear)
+
+
+def extend_quadratic(x, rows, cols, values, linear):
+
+    n = x.__size__
+    buf = x.__values__ if len(x.__rows__) == n else x.__values__[:n]
+    rows = extend_list(x.__rows__, n, rows)
+    cols = extend_list(x.__cols__, n, cols)
+    buf = extend_array(buf, n, np.concatenate(values) if values else [])
+    return QuadraticExpression(rows, cols, buf, linear, size=len(rows))
+
+
+def quadratic_product(a, b):
+
+    def split(x):
+        if isinstance(x, Constant):
+            return [], np.zeros(0), x.__value__
+        if isinstance(x, VariableScalar):
+            return [x], np.ones(1), 0.
+        return x.variables, x.coefficients, x.constant
+
+    va, ca, ka = split(a)
+    vb, cb, kb = split(b)
+
+    # Cross terms of the variable parts
+    rows = [x for x in va for y in vb]
+    cols = [y for x in va for y in vb]
+    values = np.outer(ca, cb).ravel()
+
+    # Linear part
+    linear = make_linear((va if kb != 0. else []) + (vb if ka != 0. else []),
+                         np.concatenate([kb*ca if kb != 0. else [],
+                                         ka*cb if ka != 0. else []]),
+                         ka*kb)
+
+    if not rows:
+        return linear
+    return QuadraticExpression(rows, cols, values, linear)
+
+
 class sin(ElementWiseFunction):
 
+    __slots__ = ()
+
     def __new__(cls, arg):
 
         if isinstance(arg, Constant):
@@ -265,6 +814,8 @@ class sin(ElementWiseFunction):
 
 class cos(ElementWiseFunction):
 
+    __slots__ = ()
+
     def __new__(cls, arg):
 
         if isinstance(arg, Constant):
@@ -1,10 +1,11 @@
 import time
 import types
 import numpy as np
-from . import coptmod
-from scipy.sparse import coo_matrix
+from scipy.sparse import coo_matrix, tril
 from .constraint import Constraint, ConstraintArray
 from .expression import make_Expression, ExpressionMatrix
+from .function import QuadraticExpression
+from .variable import VariableVector
 
 
 class Objective(object):
@@ -15,7 +16,7 @@ class Objective(object):
 
         self.function = make_Expression(func)
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
 
         return NotImplemented
 
@@ -38,9 +39,9 @@ class minimize(Objective):
 
         return 'minimize %s' %self.function
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
 
-        return self.function.__get_std_components__()
+        return self.function.__get_std_components__(derivatives=derivatives)
 
 
 class maximize(Objective):
@@ -53,9 +54,9 @@ class maximize(Objective):
 
         return 'maximize %s' %self.function
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
 
-        return (-self.function).__get_std_components__()
+        return (-self.function).__get_std_components__(derivatives=derivatives)
 
 
 class EmptyObjective(minimize):
@@ -68,9 +69,40 @@ class EmptyObjective(minimize):
 
         return 'empty'
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
 
-        return self.function.__get_std_components__()
+        return self.function.__get_std_components__(derivatives=derivatives)
+
+
+def std_variables(comp):
+
+    # Variables of standard problem (ordered by id)
+    vars = set(comp['phi_prop']['a'].keys())
+    for prop in comp['prop_list']:
+        vars |= set(list(prop['a'].keys()))
+    return sorted(list(vars), key=lambda x: x.id)
+
+
+def same_objects(a, b):
+
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+def pattern_matrix(entries, shape):
+
+    row, col = zip(*entries) if entries else ([], [])
+    m = coo_matrix((np.ones(len(row)),
+                    (np.array(row, dtype=int), np.array(col, dtype=int))),
+                   shape=shape).tocsr()
+    m.data[:] = 1.
+    return m.tocoo()
+
+
+def eval_quadratic_objective(p, x):
+
+    p.gphi[:] = p.Q_phi*x + p.c_phi
+    p.phi = 0.5*np.dot(x, p.gphi + p.c_phi) + p.d_phi
+    p.Hphi.data[:] = p.Hphi_values
 
 
 class Problem(object):
@@ -81,6 +113,9 @@ class Problem(object):
     constraints = None
     sense = None
 
+    __comp_cache__ = None  # dict: id -> (key objects, derivatives, components)
+    __std_problem__ = None # (key objects, standard problem)
+
     def __init__(self, objective=None, constraints=[]):
 
         if objective is None:
@@ -113,32 +148,70 @@ class Problem(object):
 
         return s
 
-    def __get_std_components__(self):
+    def __get_std_components__(self, derivatives=True):
+
+        # Components of an unchanged objective or constraint are reused
+        # (constraint rows are numbered from zero and shifted here)
+        cached = self.__comp_cache__ if self.__comp_cache__ is not None else {}
+        cache = {}
+
+        def get_comp(obj, key, build):
+            entry = cached.get(id(obj))
+            if entry is None or not same_objects(entry[0], key) or (derivatives and not entry[1]):
+                entry = (key, derivatives, build())
+            cache[id(obj)] = entry
+            return entry[2]
 
-        obj_comp = self.objective.__get_std_components__()
+        obj_comp = get_comp(self.objective,
+                            [self.objective, self.objective.function],
+                            lambda: self.objective.__get_std_components__(derivatives=derivatives))
 
         counters = {'A_row': 0, 'J_row': 0}
         constr_comp = dict([(key, list()) for key in Constraint.__get_std_keys__()])
         for c in self.constraints:
-            comp = c.__get_std_components__(counters=counters)
+            comp = get_comp(c,
+                            [c, c.lhs, c.rhs, c.op],
+                            lambda: c.__get_std_components__(derivatives=derivatives))
             for key in comp:
-                constr_comp[key] += comp[key]
+                if key == 'A_list' and counters['A_row']:
+                    constr_comp[key] += [(i+counters['A_row'], x, val) for i, x, val in comp[key]]
+                elif key == 'J_list' and counters['J_row']:
+                    constr_comp[key] += [(i+counters['J_row'], x, val) for i, x, val in comp[key]]
+                else:
+                    constr_comp[key] += comp[key]
+            counters['A_row'] += len(comp['b_list'])
+            counters['J_row'] += len(comp['f_list'])
+
+        self.__comp_cache__ = cache
 
         return dict(obj_comp, **constr_comp)
 
+    def get_std_problem(self, fast_evaluator=True):
+
+        # Standard problem is rebuilt only if the objective or constraints
+        # changed, and its point is set to the current variable values
+        key = [fast_evaluator, self.objective, self.objective.function]
+        for c in self.constraints:
+            key += [c, c.lhs, c.rhs, c.op]
+        if self.__std_problem__ is None or not same_objects(self.__std_problem__[0], key):
+            self.__std_problem__ = (key, self.__get_std_problem__(fast_evaluator=fast_evaluator))
+
+        p = self.__std_problem__[1]
+        p.x = p.variables.get_value()
+        return p
+
     def __get_std_problem__(self, fast_evaluator=True):
 
         from optalg.opt_solver import OptProblem
 
-        comp = self.__get_std_components__()
+        # Symbolic derivatives are only needed by the slow evaluator
+        comp = self.__get_std_components__(derivatives=not fast_evaluator)
 
         # Vars
-        vars = set(comp['phi_prop']['a'].keys())
-        for prop in comp['prop_list']:
-            vars |= set(list(prop['a'].keys()))
-        vars = sorted(list(vars), key=lambda x: x.id)
+        vars = std_variables(comp)
         num_vars = len(vars)
-        var_values = np.array([x.get_value() for x in vars])
+        variables = VariableVector(vars)
+        var_values = variables.get_value()
 
         # Index map
         var2index = dict(zip(vars, range(len(vars))))
@@ -146,26 +219,24 @@ class Problem(object):
 
         # Objective
         phi_data = ExpressionMatrix(comp['phi'])
-        gphi_list = comp['gphi_list']
-        Hphi_list = comp['Hphi_list']
-        gphi_indices = np.array([var2index[x] for x, exp in gphi_list])
-        gphi_data = ExpressionMatrix([exp for x, exp in gphi_list])
-        row = []
-        col = []
-        data = []
-        for vari, varj, d in Hphi_list:
-            i = var2index[vari]
-            j = var2index[varj]
-            if i >= j:
-                row.append(i)
-                col.append(j)
-            else:
-                row.append(j)
-                col.append(i)
-            data.append(d)
-        Hphi_row = np.array(row, dtype=int)
-        Hphi_col = np.array(col, dtype=int)
-        Hphi_data = ExpressionMatrix(data)
+
+        # Quadratic objective (0.5x^TQx + c^Tx + d, Hessian is constant)
+        if isinstance(comp['phi'], QuadraticExpression):
+            phi = comp['phi']
+            rows = np.array([var2index[x] for x in phi.rows], dtype=int)
+            cols = np.array([var2index[x] for x in phi.cols], dtype=int)
+            Q_phi = coo_matrix((np.concatenate([phi.values, phi.values]),
+                                (np.concatenate([rows, cols]),
+                                 np.concatenate([cols, rows]))),
+                               shape=(num_vars, num_vars)).tocsr()
+            c_phi = np.zeros(num_vars)
+            for x, val in phi.linear.__analyze__()['a'].items():
+                c_phi[var2index[x]] = val
+            d_phi = phi.linear.__analyze__()['b']
+            Hphi = tril(Q_phi).tocoo()
+            Hphi_row, Hphi_col, Hphi_values = Hphi.row, Hphi.col, Hphi.data
+        else:
+            Q_phi = None
 
         # Linear constraints
         Aindex2constr = dict(enumerate(comp['cA_list']))
@@ -181,23 +252,20 @@ class Problem(object):
         # Nonlinear constraints
         Jindex2constr = dict(enumerate(comp['cJ_list']))
         f_list = comp['f_list']
-        J_list = comp['J_list']
-        H_list = comp['H_list']
         f_data = ExpressionMatrix(f_list)
-        row, col, data = zip(*J_list) if J_list else ([], [], [])
-        J_row = np.array(row, dtype=int)
-        J_col = np.array([var2index[x] for x in col], dtype=int)
-        J_data = ExpressionMatrix(data)
-        H_comb_row = []
-        H_comb_col = []
-        H_comb_data = []
-        H_comb_nnz = []
-        H_comb_broad_col = []
-        for k, HH_list in enumerate(H_list):
+
+        # Symbolic derivatives
+        if not fast_evaluator:
+
+            # Objective
+            gphi_list = comp['gphi_list'] if Q_phi is None else []
+            Hphi_list = comp['Hphi_list'] if Q_phi is None else []
+            gphi_indices = np.array([var2index[x] for x, exp in gphi_list])
+            gphi_data = ExpressionMatrix([exp for x, exp in gphi_list])
             row = []
             col = []
             data = []
-            for vari, varj, d in HH_list:
+            for vari, varj, d in Hphi_list:
                 i = var2index[vari]
                 j = var2index[varj]
                 if i >= j:
@@ -207,16 +275,58 @@ class Problem(object):
                     row.append(j)
                     col.append(i)
                 data.append(d)
-            nnz = len(data)
-            H_comb_row.extend(row)
-            H_comb_col.extend(col)
-            H_comb_data.extend(data)
-            H_comb_nnz.append(nnz)
-            H_comb_broad_col.extend([k]*nnz)
-        H_comb_row = np.array(H_comb_row)
-        H_comb_col = np.array(H_comb_col)
-        H_comb_data = ExpressionMatrix(H_comb_data)
-        H_comb_nnz = np.array(H_comb_nnz)
+            if Q_phi is None:
+                Hphi_row = np.array(row, dtype=int)
+                Hphi_col = np.array(col, dtype=int)
+            Hphi_data = ExpressionMatrix(data)
+
+            # Nonlinear constraints
+            J_list = comp['J_list']
+            H_list = comp['H_list']
+            row, col, data = zip(*J_list) if J_list else ([], [], [])
+            J_row = np.array(row, dtype=int)
+            J_col = np.array([var2index[x] for x in col], dtype=int)
+            J_data = ExpressionMatrix(data)
+            H_comb_row = []
+            H_comb_col = []
+            H_comb_data = []
+            H_comb_nnz = []
+            H_comb_broad_col = []
+            for k, HH_list in enumerate(H_list):
+                row = []
+                col = []
+                data = []
+                for vari, varj, d in HH_list:
+                    i = var2index[vari]
+                    j = var2index[varj]
+                    if i >= j:
+                        row.append(i)
+                        col.append(j)
+                    else:
+                        row.append(j)
+                        col.append(i)
+                    data.append(d)
+                nnz = len(data)
+                H_comb_row.extend(row)
+                H_comb_col.extend(col)
+                H_comb_data.extend(data)
+                H_comb_nnz.append(nnz)
+                H_comb_broad_col.extend([k]*nnz)
+            H_comb_row = np.array(H_comb_row, dtype=int)
+            H_comb_col = np.array(H_comb_col, dtype=int)
+            H_comb_data = ExpressionMatrix(H_comb_data)
+            H_comb_nnz = np.array(H_comb_nnz)
+
+        # Native derivatives (coptmod evaluators)
+        else:
+
+            e_phi = phi_data.get_fast_evaluator(vars) if Q_phi is None else None
+            e_f = f_data.get_fast_evaluator(vars)
+
+            if Q_phi is None:
+                Hphi_row, Hphi_col = e_phi.get_hessian_structure()
+            J_row, J_col = e_f.get_jacobian_structure()
+            H_comb_row, H_comb_col = e_f.get_hessian_structure()
 
         # Bounds
         uindex2constr = {}
@@ -242,7 +352,7 @@ class Problem(object):
 
         p.phi = 0.
         p.gphi = np.zeros(num_vars)
-        p.Hphi = coo_matrix((np.zeros(Hphi_data.shape[1]),
+        p.Hphi = coo_matrix((np.zeros(Hphi_row.size),
                              (Hphi_row, Hphi_col)),
                             shape=(num_vars, num_vars))
 
@@ -250,15 +360,12 @@ class Problem(object):
         p.b = b
 
         p.f = np.zeros(f_data.shape[1])
-        p.J = coo_matrix((np.zeros(J_data.shape[1]),
+        p.J = coo_matrix((np.zeros(J_row.size),
                           (J_row, J_col)),
                          shape=(p.f.size, num_vars))
-        p.H_combined = coo_matrix((np.zeros(int(np.sum(H_comb_nnz))),
+        p.H_combined = coo_matrix((np.zeros(H_comb_row.size),
                                    (H_comb_row, H_comb_col)),
                                   shape=(num_vars, num_vars))
-        p.H_combined_broad = coo_matrix((np.ones(p.H_combined.nnz),
-                                         (range(p.H_combined.nnz), H_comb_broad_col)),
-                                        shape=(p.H_combined.nnz, p.f.size)).tocsr()
 
         p.u = u
         p.l = l
@@ -270,18 +377,20 @@ class Problem(object):
         # Aux data
         p.var2index = var2index         # dict: var -> index
         p.index2var = index2var         # dict: index -> var
+        p.variables = variables         # variable vector (bulk values)
         p.Aindex2constr = Aindex2constr # dict: index -> constraint
         p.Jindex2constr = Jindex2constr # dict: index -> constraint
         p.uindex2constr = uindex2constr # dict: index -> constraint
         p.lindex2constr = lindex2constr # dict: index -> constraint
         p.phi_data = phi_data           # expression matrix
-        p.gphi_indices = gphi_indices   # array of indices
-        p.gphi_data = gphi_data         # expression matrix
-        p.Hphi_data = Hphi_data         # expression matrix
         p.f_data = f_data               # expression matrix
-        p.J_data = J_data               # expression matrix
-        p.H_comb_data = H_comb_data     # expression matrix
-        p.H_comb_nnz = H_comb_nnz       # array
+
+        # Aux data (quadratic objective)
+        p.Q_phi = Q_phi                 # sparse matrix or None
+        if Q_phi is not None:
+            p.c_phi = c_phi             # array
+            p.d_phi = d_phi             # float
+            p.Hphi_values = Hphi_values # array (lower triangle of Q_phi)
 
         # Properties (curvature)
         p.properties = []
@@ -305,90 +414,109 @@ class Problem(object):
         # Slow evaluator
         if not fast_evaluator:
 
+            p.H_combined_broad = coo_matrix((np.ones(p.H_combined.nnz),
+                                             (range(p.H_combined.nnz), H_comb_broad_col)),
+                                            shape=(p.H_combined.nnz, p.f.size)).tocsr()
+
+            p.gphi_indices = gphi_indices   # array of indices
+            p.gphi_data = gphi_data         # expression matrix
+            p.Hphi_data = Hphi_data         # expression matrix
+            p.J_data = J_data               # expression matrix
+            p.H_comb_data = H_comb_data     # expression matrix
+            p.H_comb_nnz = H_comb_nnz       # array
+
             # Eval
             def eval(obj, x):
 
                 # Set values
-                for i, var in obj.index2var.items():
-                    var.set_value(x[i])
+                obj.variables.set_value(x)
 
                 # Eval experssions
-                obj.phi = obj.phi_data[0,0].get_value()
-                if obj.gphi_indices.size:
-                    obj.gphi[obj.gphi_indices] = obj.gphi_data.get_value()
-                obj.Hphi.data[:] = obj.Hphi_data.get_value()
+                if obj.Q_phi is not None:
+                    eval_quadratic_objective(obj, x)
+                else:
+                    obj.phi = obj.phi_data[0,0].get_value()
+                    if obj.gphi_indices.size:
+                        obj.gphi[obj.gphi_indices] = obj.gphi_data.get_value()
+                    obj.Hphi.data[:] = obj.Hphi_data.get_value()
                 obj.f[:] = obj.f_data.get_value()
                 obj.J.data[:] = obj.J_data.get_value()
                 obj.H_combined.data[:] = obj.H_comb_data.get_value()
 
             p.eval = types.MethodType(eval, p)
 
+            # Combine H
+            def combine_H(obj, lam, ensure_psd=False):
+                obj.H_combined.data *= obj.H_combined_broad*lam
+
+            p.combine_H = types.MethodType(combine_H, p)
+
         # Fast evaluator
         else:
 
-            offset_phi_data = 0
-            offset_gphi_data = offset_phi_data + phi_data.shape[1]
-            offset_Hphi_data = offset_gphi_data + gphi_data.shape[1]
-            offset_f_data = offset_Hphi_data + Hphi_data.shape[1]
-            offset_J_data = offset_f_data + f_data.shape[1]
-            offset_H_comb_data = offset_J_data + J_data.shape[1]
-            total_size = offset_H_comb_data + H_comb_data.shape[1]
-
-            e = coptmod.Evaluator(len(vars),
-                                  total_size,
-                                  shape=(1, total_size),
-                                  scalar_output=False)
-
-            for offset, exp_mat in [(offset_phi_data, phi_data),
-                                    (offset_gphi_data, gphi_data),
-                                    (offset_Hphi_data, Hphi_data),
-                                    (offset_f_data, f_data),
-                                    (offset_J_data, J_data),
-                                    (offset_H_comb_data, H_comb_data)]:
-
-                data = exp_mat.get_data()
-                for i in range(data.size):
-                    data[0,i].__fill_evaluator__(e)
-                    e.set_output_node(offset+i, id(data[0,i]))
-
-            for i, var in enumerate(vars):
-                e.set_input_var(i, id(var))
-
-            p.e = e
-            p.offset_phi_data = offset_phi_data
-            p.offset_gphi_data = offset_gphi_data
-            p.offset_Hphi_data = offset_Hphi_data
-            p.offset_f_data = offset_f_data
-            p.offset_J_data = offset_J_data
-            p.offset_H_comb_data  = offset_H_comb_data
+            p.e_phi = e_phi                 # evaluator: phi
+            p.e_f = e_f                     # evaluator: f
+            p.x_eval = var_values.copy()    # point of last eval
 
             # Eval
             def eval(obj, x):
 
-                # Eval experssions
-                obj.e.eval(x)
-
-                # Extract values
-                value = obj.e.get_value()
-                obj.phi = value[0,obj.offset_phi_data]
-                if obj.gphi_indices.size:
-                    obj.gphi[obj.gphi_indices] = value[0,obj.offset_gphi_data:obj.offset_Hphi_data]
-                obj.Hphi.data[:] = value[0,obj.offset_Hphi_data:obj.offset_f_data]
-                obj.f[:] = value[0,obj.offset_f_data:obj.offset_J_data]
-                obj.J.data[:] = value[0,obj.offset_J_data:obj.offset_H_comb_data]
-                obj.H_combined.data[:] = value[0,obj.offset_H_comb_data:]
+                obj.x_eval[:] = x
+
+                # Objective (value, gradient and Hessian)
+                if obj.Q_phi is not None:
+                    eval_quadratic_objective(obj, x)
+                else:
+                    obj.e_phi.eval_gradient(x, obj.gphi)
+                    obj.phi = obj.e_phi.get_value()[0,0]
+                    obj.e_phi.eval_hessian(x, np.ones(1), obj.Hphi.data)
+
+                # Nonlinear constraints (values and Jacobian)
+                obj.e_f.eval_jacobian(x, obj.J.data)
+                obj.f[:] = obj.e_f.get_value()
 
             p.eval = types.MethodType(eval, p)
 
-        # Combine H
-        def combine_H(obj, lam, ensure_psd=False):
-            obj.H_combined.data *= obj.H_combined_broad*lam
+            # Combine H (Hessian of lam^T f at point of last eval)
+            def combine_H(obj, lam, ensure_psd=False):
+                obj.e_f.eval_hessian(obj.x_eval, lam, obj.H_combined.data)
 
-        p.combine_H = types.MethodType(combine_H, p)
+            p.combine_H = types.MethodType(combine_H, p)
 
         # Return
         return p
 
+    def get_sparsity(self):
+
+        # Nonzero patterns of A, J, Hphi and H_combined (lower triangles)
+        # of the standard problem, no derivatives are constructed
+        comp = self.__get_std_components__(derivatives=False)
+
+        vars = std_variables(comp)
+        num_vars = len(vars)
+        var2index = dict(zip(vars, range(num_vars)))
+
+        def hessian_entries(pairs):
+            for x, y in pairs:
+                i = var2index[x]
+                j = var2index[y]
+                yield (i, j) if i >= j else (j, i)
+
+        A_entries = [(i, var2index[x]) for i, x, val in comp['A_list']]
+        J_entries = []
+        H_entries = []
+        for k, f in enumerate(comp['f_list']):
+            f_vars, f_pairs = f.__sparsity__()
+            J_entries.extend((k, var2index[x]) for x in f_vars)
+            H_entries.extend(hessian_entries(f_pairs))
+        Hphi_entries = list(hessian_entries(comp['phi'].__sparsity__()[1]))
+
+        return {'variables': vars,
+                'A': pattern_matrix(A_entries, (len(comp['b_list']), num_vars)),
+                'J': pattern_matrix(J_entries, (len(comp['f_list']), num_vars)),
+                'Hphi': pattern_matrix(Hphi_entries, (num_vars, num_vars)),
+                'H_combined': pattern_matrix(H_entries, (num_vars, num_vars))}
+
     #def get_variables(self):
     #
     #    return self.get_variables().union(*[c.get_variables() for c in self.constraints])
@@ -407,7 +535,7 @@ class Problem(object):
 
         # Problem
         t0 = time.time()
-        std_prob = self.__get_std_problem__(fast_evaluator=fast_evaluator)
+        std_prob = self.get_std_problem(fast_evaluator=fast_evaluator)
         time_transformation = time.time()-t0
 
         # Info
@@ -432,8 +560,7 @@ class Problem(object):
         # Get primal values
         x = solver.get_primal_variables()
         if x is not None and x.size:
-            for i, var in std_prob.index2var.items():
-                var.set_value(x[i])
+            std_prob.variables.set_value(x)
 
         # Get dual variables
         # Unable to get duals from Cbc API right now
@@ -1,5 +1,5 @@
 import numpy as np
-from .expression import Expression, ExpressionMatrix
+from .expression import Expression, ExpressionMatrix, make_Expression
 
 def repr_number(x):
 
@@ -7,13 +7,36 @@ def repr_number(x):
 
 def sum(x, axis=None):
 
+    from .function import sum_terms
+
+    # Scalar
     if isinstance(x, Expression):
         return np.sum(x, axis=axis)
+
+    # All terms (streamed into one n-ary add)
+    if axis is None:
+        return sum_terms(map(make_Expression, iter_terms(x)))
+
+    # Along axis
+    data = np.asarray(ExpressionMatrix(x).data)
+    if axis in [0, -2]:
+        return ExpressionMatrix([[sum_terms(data[:,j]) for j in range(data.shape[1])]])
+    elif axis in [1, -1]:
+        return ExpressionMatrix([[sum_terms(data[i,:])] for i in range(data.shape[0])])
     else:
-        s = np.sum(ExpressionMatrix(x).data, axis=axis)
-        if isinstance(s, np.ndarray):
-            return ExpressionMatrix(s)
-        else:
-            return s    
+        raise ValueError('invalid axis')
 
-    
+def iter_terms(x):
+
+    if isinstance(x, ExpressionMatrix):
+        x = x.data
+    if isinstance(x, np.ndarray):
+        for t in np.asarray(x).flat:
+            yield t
+    else:
+        for t in x:
+            if isinstance(t, (list, tuple, np.ndarray, ExpressionMatrix)):
+                for tt in iter_terms(t):
+                    yield tt
+            else:
+                yield t
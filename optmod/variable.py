@@ -1,6 +1,6 @@
 import numpy as np
 from . import coptmod
-from itertools import count
+from collections import OrderedDict
 from .expression import Expression, ExpressionMatrix, make_Expression
 
 
@@ -19,7 +19,9 @@ class VariableDict(dict):
 
 class VariableScalar(Expression):
 
-    _ids = count(0)
+    __slots__ = ('type', 'id')
+
+    next_id = 0
 
     def __init__(self, name='var', value=0., type='continuous'):
 
@@ -34,22 +36,23 @@ class VariableScalar(Expression):
         self.name = name
         self.__value__ = np.float64(value) if value is not None else 0.
         self.type = type
-        self.id = next(self._ids)
+        self.id = VariableScalar.new_ids(1)
 
     def __repr__(self):
 
         return self.name
 
-    def __evaluator_node_type__(self):
+    @staticmethod
+    def new_ids(n):
 
-        return coptmod.NODE_TYPE_VARIABLE
+        # First of n consecutive ids
+        base = VariableScalar.next_id
+        VariableScalar.next_id += n
+        return base
 
-    def __fill_evaluator__(self, evaluator):
+    def __evaluator_node_type__(self):
 
-        evaluator.add_node(self.__evaluator_node_type__(),
-                           id(self),
-                           self.__value__,
-                           [])
+        return coptmod.NODE_TYPE_VARIABLE
 
     def __analyze__(self):
 
@@ -83,12 +86,47 @@ class VariableScalar(Expression):
         self.__value__ = val
 
 
+class VariableView(VariableScalar):
+    """
+    Entry of a VariableMatrix. Its value lives in the value array
+    of the matrix.
+    """
+
+    __slots__ = ('matrix', 'index')
+
+    def __init__(self, matrix, index):
+
+        self.matrix = matrix
+        self.index = index
+        self.name = '%s[%d,%d]' %(matrix.name, index // matrix.shape[1], index % matrix.shape[1])
+        self.type = matrix.type
+        self.id = matrix.base_id + index
+
+    @property
+    def __value__(self):
+
+        return self.matrix.values[self.index]
+
+    @__value__.setter
+    def __value__(self, val):
+
+        self.matrix.values[self.index] = val
+
+
 class VariableMatrix(ExpressionMatrix):
+    """
+    Matrix of variables whose values are stored in one contiguous array
+    (row-major) and whose ids are consecutive. Scalar variables are
+    created on first access.
+    """
 
     def __init__(self, name='var', value=None, shape=None, type='continuous'):
 
         ExpressionMatrix.__init__(self)
 
+        if type not in ['integer', 'continuous']:
+            raise ValueError('invalid variable type')
+
         if shape is None and value is None:
             shape = (1,1)
 
@@ -105,13 +143,54 @@ class VariableMatrix(ExpressionMatrix):
         if value.shape != shape:
             value = value.reshape(shape)
 
+        self.name = name
+        self.type = type
         self.shape = shape
-        self.data = np.asmatrix([[VariableScalar(name=name+'[%d,%d]' %(i,j),
-                                                 value=np.float64(value[i,j]),
-                                                 type=type)
-                                  for j in range(shape[1])]
-                                 for i in range(shape[0])],
-                                dtype=object)
+        self.values = np.asarray(value, dtype=np.float64).flatten()
+        self.base_id = VariableScalar.new_ids(self.values.size)
+        self.__views__ = {}
+        self.__data__ = None
+
+    @property
+    def data(self):
+
+        if self.__data__ is None:
+            views = [self.__get_view__(k) for k in range(self.values.size)]
+            self.__data__ = np.asmatrix(np.array(views, dtype=object).reshape(self.shape))
+        return self.__data__
+
+    def __getitem__(self, key):
+
+        # Entry
+        if (isinstance(key, tuple) and len(key) == 2 and
+            all([isinstance(k, (int, np.integer)) for k in key])):
+            i, j = key
+            m, n = self.shape
+            if not (-m <= i < m and -n <= j < n):
+                raise IndexError('index out of bounds')
+            return self.__get_view__((i % m)*n + (j % n))
+
+        # Submatrix
+        index = np.asmatrix(np.arange(self.values.size).reshape(self.shape))[key]
+        if isinstance(index, np.integer):
+            return self.__get_view__(int(index))
+        return ExpressionMatrix(np.vectorize(self.__get_view__, otypes=[object])(index))
+
+    def __get_view__(self, index):
+
+        view = self.__views__.get(index)
+        if view is None:
+            view = VariableView(self, index)
+            self.__views__[index] = view
+        return view
+
+    def get_value(self):
+
+        return np.asmatrix(self.values.reshape(self.shape).copy())
+
+    def get_variables(self):
+
+        return set([self.__get_view__(k) for k in range(self.values.size)])
 
     def set_value(self, val):
 
@@ -120,6 +199,45 @@ class VariableMatrix(ExpressionMatrix):
         if val.shape != self.shape:
             raise ValueError('invalid shape of value')
 
-        for i in range(self.shape[0]):
-            for j in range(self.shape[1]):
-                self.data[i,j].set_value(val[i,j])
+        self.values[:] = np.asarray(val, dtype=np.float64).ravel()
+
+
+class VariableVector(object):
+    """
+    Ordered variables whose values are read and written as one array.
+    Entries of variable matrices are gathered and scattered with array
+    indexing; only other scalar variables are visited one by one.
+    """
+
+    def __init__(self, variables):
+
+        blocks = OrderedDict()
+        scalars = []
+        for k, var in enumerate(variables):
+            if isinstance(var, VariableView):
+                matrix, positions, indices = blocks.setdefault(id(var.matrix), (var.matrix, [], []))
+                positions.append(k)
+                indices.append(var.index)
+            else:
+                scalars.append((k, var))
+
+        self.size = len(variables)
+        self.blocks = [(matrix, np.array(positions, dtype=int), np.array(indices, dtype=int))
+                       for matrix, positions, indices in blocks.values()]
+        self.scalars = scalars
+
+    def get_value(self):
+
+        x = np.zeros(self.size)
+        for matrix, positions, indices in self.blocks:
+            x[positions] = matrix.values[indices]
+        for k, var in self.scalars:
+            x[k] = var.__value__
+        return x
+
+    def set_value(self, x):
+
+        for matrix, positions, indices in self.blocks:
+            matrix.values[indices] = x[positions]
+        for k, var in self.scalars:
+            var.__value__ = x[k]
@@ -8,6 +8,8 @@
 
 import os
 import sys
+import shutil
+import tempfile
 import numpy as np
 from subprocess import call
 from Cython.Build import cythonize
@@ -56,6 +58,45 @@ else:
     extra_cmd_classes = {'bdist_wheel_compiled': bdist_wheel_compiled,
                          'bdist_egg_compiled': bdist_egg_compiled}
 
+def has_openmp(compile_args, link_args):
+    """Checks whether the C compiler builds an OpenMP program with the given flags."""
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    tmp = tempfile.mkdtemp()
+    try:
+        compiler = new_compiler()
+        customize_compiler(compiler)
+        source = os.path.join(tmp, 'openmp.c')
+        with open(source, 'w') as f:
+            f.write('#ifndef _OPENMP\n#error no OpenMP\n#endif\n'
+                    'int main(void) {\n  int i, s = 0;\n'
+                    '  #pragma omp parallel for reduction(+:s)\n'
+                    '  for (i = 0; i < 4; i++) s += i;\n  return s != 6;\n}\n')
+        objects = compiler.compile([source], output_dir=tmp, extra_postargs=compile_args)
+        compiler.link_executable(objects, os.path.join(tmp, 'openmp'), extra_postargs=link_args)
+        return True
+    except Exception:
+        return False
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# OpenMP (multithreaded evaluators); OPTMOD_OPENMP=0 builds serial evaluators
+if sys.platform.startswith('win'):
+    openmp_compile_args = ['/openmp']
+    openmp_link_args = []
+elif sys.platform.startswith('darwin'):
+    openmp_compile_args = []
+    openmp_link_args = []
+else:
+    openmp_compile_args = ['-fopenmp']
+    openmp_link_args = ['-fopenmp']
+if openmp_compile_args and (os.environ.get('OPTMOD_OPENMP', '1') == '0' or
+                            not has_openmp(openmp_compile_args, openmp_link_args)):
+    log.warn('OpenMP not used, evaluators are serial')
+    openmp_compile_args = []
+    openmp_link_args = []
+
 ext_modules = cythonize([Extension(name='optmod.coptmod.coptmod',
                                    sources=['./optmod/coptmod/coptmod.pyx',
                                             './optmod/coptmod/evaluator.c',
@@ -63,7 +104,8 @@ ext_modules = cythonize([Extension(name='optmod.coptmod.coptmod',
                                    libraries=[],
                                    include_dirs=[np.get_include(), './optmod/coptmod'],
                                    library_dirs=[],
-                                   extra_link_args=[])])
+                                   extra_compile_args=openmp_compile_args,
+                                   extra_link_args=openmp_link_args)])
 
 # Import version
 exec(open(os.path.join('optmod', 'version.py')).read())
@@ -33,36 +33,47 @@ class TestAdd(unittest.TestCase):
         y = optmod.variable.VariableScalar(name='y', value=3.)
         
         f = x + 1.
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(isinstance(f.arguments[1], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), 1.)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], 1.)
+        self.assertEqual(f.constant, 1.)
         self.assertEqual(f.get_value(), 3.)
         self.assertEqual(str(f), 'x + %s' %optmod.utils.repr_number(1.))
         
         f = 1. + x
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(isinstance(f.arguments[1], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), 1.)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], 1.)
+        self.assertEqual(f.constant, 1.)
         self.assertEqual(f.get_value(), 3.)
         self.assertEqual(str(f), 'x + %s' %optmod.utils.repr_number(1.))
 
         f = x + y
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1] is y)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertTrue(f.variables[1] is y)
+        self.assertEqual(f.constant, 0.)
         self.assertEqual(f.get_value(), 5.)
         self.assertEqual(str(f), 'x + y')
 
         f = 4. + x + y
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(isinstance(f.arguments[1], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), 4.)
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[2] is y)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(f.constant, 4.)
+        self.assertTrue(f.variables[0] is x)
+        self.assertTrue(f.variables[1] is y)
         self.assertEqual(f.get_value(), 9.)
-        self.assertEqual(str(f), 'x + %s + y' %optmod.utils.repr_number(4.))
+        self.assertEqual(str(f), 'x + y + %s' %optmod.utils.repr_number(4.))
+
+        f = x + 2.*y + x + 1.
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(len(f.variables), 3)
+        self.assertTrue(np.all(f.coefficients == np.array([1., 2., 1.])))
+        self.assertEqual(f.get_value(), 11.)
+        self.assertEqual(str(f), 'x + y*%s + x + %s' %(optmod.utils.repr_number(2.),
+                                                       optmod.utils.repr_number(1.)))
+        prop = f.__analyze__()
+        self.assertDictEqual(prop['a'], {x: 2., y: 2.})
+        self.assertEqual(prop['b'], 1.)
         
     def test_scalar_matrix(self):
 
@@ -78,9 +89,9 @@ class TestAdd(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is x)
-                self.assertEqual(fij.arguments[1].get_value(), r[i,j])
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is x)
+                self.assertEqual(fij.constant, r[i,j])
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == 2. + r))
         self.assertEqual(str(f),
@@ -92,9 +103,9 @@ class TestAdd(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is x)
-                self.assertEqual(fij.arguments[1].get_value(), r[i,j])
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is x)
+                self.assertEqual(fij.constant, r[i,j])
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == 2. + r))
         self.assertEqual(str(f),
@@ -120,9 +131,9 @@ class TestAdd(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is y[i,j])
-                self.assertEqual(fij.arguments[1].get_value(), 1.)
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is y[i,j])
+                self.assertEqual(fij.constant, 1.)
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == np.array(value) + 1))
         self.assertEqual(str(f),
@@ -141,9 +152,9 @@ class TestAdd(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is y[i,j])
-                self.assertTrue(fij.arguments[1] is x)
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is y[i,j])
+                self.assertTrue(fij.variables[1] is x)
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == np.array(value) + 2.))
         self.assertEqual(str(f),
@@ -155,9 +166,9 @@ class TestAdd(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is y[i,j])
-                self.assertTrue(fij.arguments[1] is x)
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is y[i,j])
+                self.assertTrue(fij.variables[1] is x)
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == np.array(value) + 2.))
         self.assertEqual(str(f),
@@ -168,11 +179,10 @@ class TestAdd(unittest.TestCase):
         self.assertTrue(isinstance(f, optmod.expression.ExpressionMatrix))
         for i in range(2):
             for j in range(3):
-                self.assertEqual(str(f[i,j]), 'y[%d,%d] + %s + x + %s' %(i, j, rn(1), rn(3)))
-                self.assertTrue(f[i,j].arguments[0] is y[i,j])
-                self.assertTrue(f[i,j].arguments[1].is_constant())
-                self.assertTrue(f[i,j].arguments[2] is x)
-                self.assertTrue(f[i,j].arguments[3].is_constant())
+                self.assertEqual(str(f[i,j]), 'y[%d,%d] + x + %s' %(i, j, rn(4)))
+                self.assertTrue(f[i,j].variables[0] is y[i,j])
+                self.assertTrue(f[i,j].variables[1] is x)
+                self.assertEqual(f[i,j].constant, 4.)
         self.assertTrue(np.all(f.get_value() == np.array(value) + 1. + 3. + 2.))
 
     def test_matrix_matrix(self):
@@ -334,4 +344,46 @@ class TestAdd(unittest.TestCase):
         self.assertEqual(exp.get_value(), 1.)
 
         self.assertEqual(len(Hphi_list), 0)
-    
+
+    def test_accumulation(self):
+
+        n = 10000
+        x = [optmod.VariableScalar(name='x', value=1.) for i in range(n)]
+
+        # Nonlinear terms: one n-ary add
+        f = 0.
+        for i in range(n):
+            f = f + optmod.sin(x[i])
+            if i == 9:
+                f10 = f
+        self.assertTrue(type(f) is optmod.function.add)
+        self.assertEqual(len(f.arguments), n)
+        self.assertEqual(len(f10.arguments), 10)
+        self.assertAlmostEqual(f10.get_value(), 10*np.sin(1.))
+
+        # Sums branching off a shared prefix do not affect each other
+        g1 = f10 + x[0]
+        g2 = f10 + optmod.cos(x[1])
+        self.assertEqual(len(f10.arguments), 10)
+        self.assertTrue(g1.arguments[10] is x[0])
+        self.assertTrue(g2.arguments[10].name == 'cos')
+        self.assertEqual(len(g2.arguments), 11)
+
+        # Linear and quadratic terms
+        f = 0.
+        g = 0.
+        for i in range(n):
+            f = f + 2*x[i]
+            g = g + (x[i]-1)*(x[i]+1)
+            if i == 9:
+                f10 = f
+                g10 = g
+        self.assertEqual(len(f.variables), n)
+        self.assertEqual(len(g.rows), n)
+        self.assertEqual(f.get_value(), 2.*n)
+        self.assertEqual(g.get_value(), 0.)
+        self.assertEqual(f10.get_value(), 20.)
+        self.assertEqual((f10 + 3*x[0]).get_value(), 23.)
+        self.assertEqual(len(f10.variables), 10)
+        self.assertEqual(len(g10.rows), 10)
+        self.assertEqual(g10.linear.constant, -10.)
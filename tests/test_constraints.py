@@ -175,10 +175,10 @@ class TestConstraints(unittest.TestCase):
                 cij = c[i,j]
                 self.assertTrue(isinstance(cij, optmod.constraint.Constraint))
                 self.assertEqual(cij.op, '==')
-                self.assertTrue(isinstance(cij.lhs, optmod.function.multiply))
-                self.assertTrue(isinstance(cij.rhs, optmod.function.add))
-                self.assertTrue(cij.lhs.arguments[0] is z[i,j])
-                self.assertTrue(cij.rhs.arguments[0] is z[i,j])
+                self.assertTrue(isinstance(cij.lhs, optmod.function.LinearExpression))
+                self.assertTrue(isinstance(cij.rhs, optmod.function.LinearExpression))
+                self.assertTrue(cij.lhs.variables[0] is z[i,j])
+                self.assertTrue(cij.rhs.variables[0] is z[i,j])
 
     def test_bad_array_construction(self):
 
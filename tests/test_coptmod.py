@@ -40,7 +40,7 @@ class TestCoptmod(unittest.TestCase):
         f.__fill_evaluator__(E)
         
         self.assertEqual(E.max_nodes, 20)
-        self.assertEqual(E.num_nodes, 8)
+        self.assertEqual(E.num_nodes, 9)
         self.assertEqual(E.num_inputs, 2)
         self.assertEqual(E.num_outputs, 20)
 
@@ -58,7 +58,7 @@ class TestCoptmod(unittest.TestCase):
         f.__fill_evaluator__(E)
         
         self.assertEqual(E.max_nodes, 20)
-        self.assertEqual(E.num_nodes, 9)
+        self.assertEqual(E.num_nodes, 8)
         self.assertEqual(E.num_inputs, 2)
         self.assertEqual(E.num_outputs, 20)        
 
@@ -81,7 +81,7 @@ class TestCoptmod(unittest.TestCase):
         f.__fill_evaluator__(E)
         
         self.assertEqual(E.max_nodes, 10)
-        self.assertEqual(E.num_nodes, 8)
+        self.assertEqual(E.num_nodes, 9)
         self.assertEqual(E.num_inputs, 2)
         self.assertEqual(E.num_outputs, 5)
 
@@ -192,4 +192,416 @@ class TestCoptmod(unittest.TestCase):
         e.eval([5., 8.])
         val = e.get_value()
         self.assertAlmostEqual(val[0,0], 3.*(5.+np.sin(8.)))
-        self.assertAlmostEqual(val[0,1], 5.+8.)        
+        self.assertAlmostEqual(val[0,1], 5.+8.)
+
+    def test_evaluator_multi_fill_terms(self):
+
+        x = optmod.VariableScalar(name='x', value=1.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        # Term nodes of separate fills are distinct
+        for f1, f2 in [(2*x + 3*y + 1, 5*x + 7*y - 2),
+                       ((x + 1)*(y + 2) + 2*x*y, (2*x + 1)*(y + 3) + 5*x*y)]:
+            for visited in [None, set()]:
+                e = optmod.coptmod.Evaluator(2, 2)
+                f1.__fill_evaluator__(e, visited)
+                f2.__fill_evaluator__(e, visited)
+                e.set_input_var(0, id(x))
+                e.set_input_var(1, id(y))
+                e.set_output_node(0, id(f1))
+                e.set_output_node(1, id(f2))
+                e.eval([1., 3.])
+                val = e.get_value()
+                self.assertEqual(val[0,0], f1.get_value())
+                self.assertEqual(val[0,1], f2.get_value())
+
+        # Reserved ids are odd (not object addresses) and come from a counter
+        e = optmod.coptmod.Evaluator(2, 1)
+        base = e.node_ids(id(x), 3)
+        self.assertEqual(base % 2, 1)
+        self.assertEqual(e.node_ids(id(y), 2), base + 6)
+        self.assertEqual(e.node_ids(id(x), 3), base)
+
+        # Filling again replaces term nodes
+        f = 2*x + 3*y + 1
+        f.__fill_evaluator__(e)
+        num_nodes = e.num_nodes
+        f.__fill_evaluator__(e)
+        self.assertEqual(e.num_nodes, num_nodes)
+
+    def test_evaluator_tape(self):
+
+        x = optmod.VariableScalar(name='x', value=3.)
+        y = optmod.VariableScalar(name='y', value=4.)
+
+        # shared subexpression
+        g = optmod.cos(x-y)
+        f1 = 3*g + x*g
+        f2 = g*g
+        e = optmod.coptmod.Evaluator(2, 2)
+        f1.__fill_evaluator__(e)
+        f2.__fill_evaluator__(e)
+        e.set_input_var(0, id(x))
+        e.set_input_var(1, id(y))
+        e.set_output_node(0, id(f1))
+        e.set_output_node(1, id(f2))
+        e.compile()
+        self.assertEqual(e.tape_size, e.num_nodes)
+        for i in range(3):
+            xval, yval = np.random.randn(2)
+            e.eval([xval, yval])
+            val = e.get_value()
+            gval = np.cos(xval-yval)
+            self.assertAlmostEqual(val[0,0], 3.*gval + xval*gval)
+            self.assertAlmostEqual(val[0,1], gval*gval)
+
+        # nodes not reachable from outputs are not evaluated
+        e = optmod.coptmod.Evaluator(2, 1)
+        f1.__fill_evaluator__(e)
+        f2.__fill_evaluator__(e)
+        e.set_input_var(0, id(x))
+        e.set_input_var(1, id(y))
+        e.set_output_node(0, id(f2))
+        self.assertEqual(e.tape_size, 6)
+        e.eval([1., 2.])
+        self.assertAlmostEqual(e.get_value()[0,0], np.cos(-1.)**2.)
+
+        # tape is rebuilt after changes
+        e.set_output_node(0, id(f1))
+        e.eval([1., 2.])
+        self.assertAlmostEqual(e.get_value()[0,0], 3.*np.cos(-1.) + np.cos(-1.))
+
+    def test_evaluator_eval_batch(self):
+
+        x = optmod.VariableScalar(name='x', value=3.)
+        y = optmod.VariableScalar(name='y', value=4.)
+
+        f1 = 3*(x+optmod.sin(y))
+        f2 = x*optmod.cos(x-y)
+        e = optmod.coptmod.Evaluator(2, 2)
+        f1.__fill_evaluator__(e)
+        f2.__fill_evaluator__(e)
+        e.set_input_var(0, id(x))
+        e.set_input_var(1, id(y))
+        e.set_output_node(0, id(f1))
+        e.set_output_node(1, id(f2))
+
+        X = np.random.randn(50, 2)
+        V = e.eval_batch(X)
+        self.assertTrue(isinstance(V, np.ndarray))
+        self.assertTupleEqual(V.shape, (50, 2))
+        for k in range(X.shape[0]):
+            e.eval(X[k,:])
+            self.assertTrue(np.all(V[k,:] == e.get_value()))
+        self.assertTrue(np.allclose(V[:,0], 3.*(X[:,0]+np.sin(X[:,1]))))
+        self.assertTrue(np.allclose(V[:,1], X[:,0]*np.cos(X[:,0]-X[:,1])))
+
+        V = e.eval_batch(np.zeros((0, 2)))
+        self.assertTupleEqual(V.shape, (0, 2))
+
+        self.assertRaises(AssertionError, e.eval_batch, np.zeros((3, 3)))
+        self.assertRaises(ValueError, e.eval_batch, np.zeros(2))
+
+    def test_evaluator_num_threads(self):
+
+        from multiprocessing.pool import ThreadPool
+
+        x = optmod.VariableMatrix(name='x', value=np.random.randn(50,40))
+        y = optmod.VariableScalar(name='y', value=2.)
+
+        f = optmod.sin(3*x+10.)*y + optmod.cos(y-x)
+        vars = list(f.get_variables())
+        var_values = np.random.randn(len(vars))
+
+        e1 = f.get_fast_evaluator(vars)
+        self.assertEqual(e1.num_threads, 1)
+        e1.eval(var_values)
+
+        e4 = f.get_fast_evaluator(vars)
+        e4.set_num_threads(4)
+        self.assertEqual(e4.num_threads, 4)
+        e4.eval(var_values)
+        self.assertTrue(np.all(e1.get_value() == e4.get_value()))
+
+        e = optmod.coptmod.Evaluator(2, 2, num_threads=3)
+        self.assertEqual(e.num_threads, 3)
+        self.assertRaises(ValueError, e.set_num_threads, 0)
+        self.assertRaises(ValueError, optmod.coptmod.Evaluator, 2, 2, num_threads=0)
+
+        # concurrent evaluators
+        evaluators = [f.get_fast_evaluator(vars) for i in range(4)]
+        X = np.random.randn(4, len(vars))
+        def work(k):
+            evaluators[k].eval(X[k,:])
+            return evaluators[k].get_value()
+        pool = ThreadPool(4)
+        values = pool.map(work, range(4))
+        pool.close()
+        pool.join()
+        for k in range(4):
+            e1.eval(X[k,:])
+            self.assertTrue(np.all(values[k] == e1.get_value()))
+
+    def test_evaluator_node_storage(self):
+
+        c = optmod.coptmod
+
+        # placeholder arguments and redefinition
+        e = c.Evaluator(1, 1, scalar_output=True)
+        e.add_node(c.NODE_TYPE_ADD, 100, 0., [101, 102, 103])
+        self.assertEqual(e.num_nodes, 4)
+        e.add_node(c.NODE_TYPE_VARIABLE, 101, 0., [])
+        e.add_node(c.NODE_TYPE_CONSTANT, 102, 2., [])
+        e.add_node(c.NODE_TYPE_CONSTANT, 103, 3., [])
+        e.set_input_var(0, 101)
+        e.set_output_node(0, 100)
+        e.eval([4.])
+        self.assertEqual(e.get_value(), 9.)
+        e.add_node(c.NODE_TYPE_MULTIPLY, 100, 0., [101, 103])
+        self.assertEqual(e.num_nodes, 4)
+        e.eval([4.])
+        self.assertEqual(e.get_value(), 12.)
+        e.add_node(c.NODE_TYPE_ADD, 100, 0., [101, 102, 103, 101])
+        e.eval([4.])
+        self.assertEqual(e.get_value(), 13.)
+
+        # many nodes
+        n = 20000
+        e = c.Evaluator(1, 1, scalar_output=True)
+        e.add_node(c.NODE_TYPE_ADD, 1, 0., list(range(2, n+2)))
+        for i in range(2, n+2):
+            e.add_node(c.NODE_TYPE_MULTIPLY, i, 0., [n+2, n+3])
+        e.add_node(c.NODE_TYPE_VARIABLE, n+2, 0., [])
+        e.add_node(c.NODE_TYPE_CONSTANT, n+3, 0.5, [])
+        self.assertEqual(e.num_nodes, n+3)
+        e.set_input_var(0, n+2)
+        e.set_output_node(0, 1)
+        e.eval([3.])
+        self.assertAlmostEqual(e.get_value(), n*1.5)
+
+    def test_evaluator_reserve(self):
+
+        c = optmod.coptmod
+
+        e = c.Evaluator(2, 1, max_nodes=100)
+        self.assertEqual(e.max_nodes, 100)
+        self.assertEqual(e.num_nodes, 0)
+
+        e = c.Evaluator(2, 5)
+        self.assertEqual(e.max_nodes, 5)
+        e.reserve(1000)
+        self.assertEqual(e.max_nodes, 1000)
+        e.reserve(10)
+        self.assertEqual(e.max_nodes, 1000)
+
+        x = optmod.VariableScalar(name='x', value=3.)
+        y = optmod.VariableScalar(name='y', value=4.)
+        f = 4*(x + 1) + optmod.sin(-y)
+        f.__fill_evaluator__(e)
+        self.assertEqual(e.max_nodes, 1000)
+        self.assertEqual(e.num_nodes, 9)
+
+    def test_evaluator_add_nodes(self):
+
+        c = optmod.coptmod
+
+        # f = x*(y+2) + sin(x)
+        types = [c.NODE_TYPE_ADD,
+                 c.NODE_TYPE_MULTIPLY,
+                 c.NODE_TYPE_ADD,
+                 c.NODE_TYPE_SIN,
+                 c.NODE_TYPE_VARIABLE,
+                 c.NODE_TYPE_VARIABLE,
+                 c.NODE_TYPE_CONSTANT]
+        ids = [10, 11, 12, 13, 14, 15, 16]
+        values = [0., 0., 0., 0., 0., 0., 2.]
+        arg_ptr = [0, 2, 4, 6, 7, 7, 7, 7]
+        arg_ids = [11, 13, 14, 12, 15, 16, 14]
+
+        e = c.Evaluator(2, 1, scalar_output=True)
+        e.add_nodes(types, ids, values, arg_ptr, arg_ids)
+        self.assertEqual(e.num_nodes, 7)
+        self.assertGreaterEqual(e.max_nodes, 7)
+        e.set_input_var(0, 14)
+        e.set_input_var(1, 15)
+        e.set_output_node(0, 10)
+        e.eval([3., 5.])
+        self.assertAlmostEqual(e.get_value(), 3.*(5.+2.)+np.sin(3.))
+
+        # same result as one node at a time
+        e1 = c.Evaluator(2, 1, scalar_output=True)
+        for k in range(len(ids)):
+            e1.add_node(types[k], ids[k], values[k], arg_ids[arg_ptr[k]:arg_ptr[k+1]])
+        e1.set_input_var(0, 14)
+        e1.set_input_var(1, 15)
+        e1.set_output_node(0, 10)
+        e1.eval([3., 5.])
+        self.assertEqual(e.get_value(), e1.get_value())
+
+        # empty
+        e.add_nodes([], [], [], [0], [])
+        self.assertEqual(e.num_nodes, 7)
+
+        # invalid
+        self.assertRaises(ValueError, e.add_nodes, [1], [1, 2], [0.], [0, 0], [])
+        self.assertRaises(ValueError, e.add_nodes, [1], [1], [0.], [0, 1], [])
+        self.assertRaises(ValueError, e.add_nodes, [1, 1], [1, 2], [0., 0.], [0, 1, 0], [3])
+
+    def test_evaluator_fill_shared(self):
+
+        x = optmod.VariableScalar(name='x', value=0.3)
+
+        # number of paths is exponential in depth
+        f = x
+        for i in range(60):
+            f = optmod.sin(f) + optmod.cos(f)*f
+
+        e = f.get_fast_evaluator([x])
+        self.assertEqual(e.num_nodes, 1 + 60*4)
+
+        val = 0.7
+        for i in range(60):
+            val = np.sin(val) + np.cos(val)*val
+        e.eval([0.7])
+        self.assertAlmostEqual(e.get_value(), val)
+
+        # visited set shared across fills
+        g = f*x
+        e = optmod.coptmod.Evaluator(1, 2)
+        visited = set()
+        f.__fill_evaluator__(e, visited)
+        self.assertEqual(len(visited), 1 + 60*4)
+        g.__fill_evaluator__(e, visited)
+        self.assertEqual(len(visited), 2 + 60*4)
+        self.assertEqual(e.num_nodes, 2 + 60*4)
+        e.set_input_var(0, id(x))
+        e.set_output_node(0, id(f))
+        e.set_output_node(1, id(g))
+        e.eval([0.7])
+        self.assertAlmostEqual(e.get_value()[0,0], val)
+        self.assertAlmostEqual(e.get_value()[0,1], val*0.7)
+
+        # expression matrix
+        m = optmod.expression.ExpressionMatrix([f, g, f])
+        e = m.get_fast_evaluator([x])
+        self.assertEqual(e.num_nodes, 2 + 60*4)
+        e.eval([0.7])
+        self.assertTrue(np.allclose(e.get_value(), [[val, val*0.7, val]]))
+
+    def test_evaluator_eval_gradient(self):
+
+        x = optmod.VariableScalar(name='x', value=3.)
+        y = optmod.VariableScalar(name='y', value=4.)
+        z = optmod.VariableScalar(name='z', value=5.)
+
+        g = optmod.cos(x*y-z)
+        f = 3*g*g + x*optmod.sin(g) - 2.*y + x*x
+
+        e = f.get_fast_evaluator([x, y, z])
+        grad = np.zeros(3)
+        for i in range(5):
+            X = np.random.randn(3)
+            e.eval_gradient(X, grad)
+            x.set_value(X[0])
+            y.set_value(X[1])
+            z.set_value(X[2])
+            self.assertAlmostEqual(e.get_value(), f.get_value())
+            for k, var in enumerate([x, y, z]):
+                self.assertAlmostEqual(grad[k], f.get_derivative(var).get_value())
+
+        # inputs not in expression
+        w = optmod.VariableScalar(name='w')
+        f = x*optmod.sin(y)
+        e = f.get_fast_evaluator([w, y, x])
+        grad = np.ones(3)
+        e.eval_gradient([1., 2., 3.], grad)
+        self.assertEqual(grad[0], 0.)
+        self.assertAlmostEqual(grad[1], 3.*np.cos(2.))
+        self.assertAlmostEqual(grad[2], np.sin(2.))
+
+        self.assertRaises(AssertionError, e.eval_gradient, [1., 2., 3.], np.zeros(2))
+        self.assertRaises(AssertionError, e.eval_gradient, [1., 2., 3.], grad, 1)
+
+    def test_evaluator_eval_jacobian(self):
+
+        x = optmod.VariableMatrix(name='x', value=np.random.randn(4,1))
+        y = optmod.VariableScalar(name='y', value=2.)
+
+        f = optmod.sin(x*y) + 3*x - y*optmod.cos(x)
+        vars = [y] + [x[i,0] for i in range(4)]
+
+        e = f.get_fast_evaluator(vars)
+        row, col = e.get_jacobian_structure()
+        self.assertEqual(row.size, 8)
+        self.assertListEqual(row.tolist(), [0, 0, 1, 1, 2, 2, 3, 3])
+        self.assertListEqual(col.tolist(), [0, 1, 0, 2, 0, 3, 0, 4])
+
+        X = np.random.randn(5)
+        data = np.zeros(row.size)
+        e.eval_jacobian(X, data)
+        for var, val in zip(vars, X):
+            var.set_value(val)
+        self.assertTrue(np.allclose(e.get_value(), f.get_value()))
+        for k in range(row.size):
+            d = f[row[k],0].get_derivative(vars[col[k]])
+            self.assertAlmostEqual(data[k], d.get_value())
+
+        e.set_num_threads(3)
+        data3 = np.zeros(row.size)
+        e.eval_jacobian(X, data3)
+        self.assertTrue(np.all(data == data3))
+
+        self.assertRaises(AssertionError, e.eval_jacobian, X, np.zeros(7))
+
+    def test_evaluator_eval_hessian(self):
+
+        x = optmod.VariableScalar(name='x', value=3.)
+        y = optmod.VariableScalar(name='y', value=4.)
+        z = optmod.VariableScalar(name='z', value=5.)
+        w = optmod.VariableScalar(name='w', value=6.)
+        vars = [x, y, z, w]
+
+        f1 = 3*optmod.cos(x*y-z)*x + x*x + 2*w
+        f2 = optmod.sin(z)*y + w*w*w
+        f3 = x + 4*y
+
+        m = optmod.expression.ExpressionMatrix([f1, f2, f3])
+        e = m.get_fast_evaluator(vars)
+        row, col = e.get_hessian_structure()
+        self.assertTrue(np.all(row >= col))
+        self.assertListEqual(list(zip(row.tolist(), col.tolist())),
+                             [(0, 0), (1, 0), (1, 1), (2, 0), (2, 1), (2, 2), (3, 3)])
+        self.assertGreaterEqual(e.num_colors, 3)
+
+        for i in range(5):
+            X = np.random.randn(4)
+            lam = np.random.randn(3)
+            data = np.zeros(row.size)
+            e.eval_hessian(X, lam, data)
+            for var, val in zip(vars, X):
+                var.set_value(val)
+            self.assertTrue(np.allclose(e.get_value(), m.get_value()))
+            for k in range(row.size):
+                vari = vars[row[k]]
+                varj = vars[col[k]]
+                d = 0.
+                for l, f in enumerate([f1, f2, f3]):
+                    d += lam[l]*f.get_derivative(vari).get_derivative(varj).get_value()
+                self.assertAlmostEqual(data[k], d)
+
+            e.set_num_threads(2)
+            data2 = np.zeros(row.size)
+            e.eval_hessian(X, lam, data2)
+            self.assertTrue(np.all(data == data2))
+            e.set_num_threads(1)
+
+        # linear
+        e = f3.get_fast_evaluator(vars)
+        row, col = e.get_hessian_structure()
+        self.assertEqual(row.size, 0)
+        self.assertEqual(e.num_colors, 0)
+        data = np.zeros(0)
+        e.eval_hessian(np.ones(4), [1.], data)
+
+        self.assertRaises(AssertionError, e.eval_hessian, np.ones(4), [1., 2.], data)
+        self.assertRaises(AssertionError, e.eval_hessian, np.ones(4), [1.], np.zeros(1))
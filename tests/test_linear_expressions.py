@@ -0,0 +1,91 @@
+import optmod
+import unittest
+import numpy as np
+
+class TestLinearExpressions(unittest.TestCase):
+
+    def test_construction(self):
+
+        x = optmod.VariableMatrix(name='x', value=np.random.randn(100,1))
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        f = optmod.sum(3*x) - 2*y + 5.
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(len(f.variables), 101)
+        self.assertTrue(all([v.is_variable() for v in f.variables]))
+        self.assertTrue(np.all(f.coefficients[:100] == 3.))
+        self.assertEqual(f.coefficients[100], -2.)
+        self.assertEqual(f.constant, 5.)
+        self.assertAlmostEqual(f.get_value(), 3.*np.sum(x.get_value())-6.+5.)
+
+        prop = f.__analyze__()
+        self.assertTrue(prop['affine'])
+        self.assertEqual(len(prop['a']), 101)
+        self.assertEqual(prop['a'][y], -2.)
+        self.assertEqual(prop['b'], 5.)
+
+        # Simplifications
+        self.assertTrue((y + 1) - 1 is y)
+        self.assertEqual(((y + 1) - y).__analyze__()['a'], {y: 0.})
+        self.assertTrue(isinstance(y*optmod.sin(y) + y, optmod.function.add))
+
+    def test_derivatives(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        f = 3*x - y + x + 4.
+        d = f.get_derivatives([x, y])
+        self.assertEqual(d[x].get_value(), 4.)
+        self.assertEqual(d[y].get_value(), -1.)
+
+        f = optmod.sin(3*x - y)*(x + 1)
+        d = f.get_derivatives([x, y])
+        self.assertAlmostEqual(d[x].get_value(), 3*np.cos(3.)*3. + np.sin(3.))
+        self.assertAlmostEqual(d[y].get_value(), -np.cos(3.)*3.)
+
+    def test_fast_evaluator(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+        z = optmod.VariableScalar(name='z', value=4.)
+
+        for f in [3*x - y + x + 4.,
+                  -x,
+                  2*y,
+                  x - y - z,
+                  optmod.cos(x - 2*y)*(z + 1) + 4*z]:
+
+            e = f.get_fast_evaluator([x, y, z])
+            e.eval(np.array([2., 3., 4.]))
+            self.assertAlmostEqual(e.get_value(), f.get_value())
+
+            g = np.zeros(3)
+            e.eval_gradient(np.array([2., 3., 4.]), g)
+            d = f.get_derivatives([x, y, z])
+            for i, var in enumerate([x, y, z]):
+                self.assertAlmostEqual(g[i], d[var].get_value())
+
+        # Repeated variables share one term
+        e = (3*x - y + x + 4.).get_fast_evaluator([x, y, z])
+        self.assertEqual(e.num_nodes, 7)
+
+    def test_std_problem(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        p = optmod.Problem(optmod.minimize(x + 2*y),
+                           [x + y + x >= 1, 3*y - x == 4, x <= 5])
+        std_prob = p.__get_std_problem__()
+        A = std_prob.A.toarray()
+        index_x = std_prob.var2index[x]
+        index_y = std_prob.var2index[y]
+        self.assertEqual(A.shape[0], 2)
+        self.assertEqual(A[0,index_x], 2.)
+        self.assertEqual(A[0,index_y], 1.)
+        self.assertEqual(A[1,index_x], -1.)
+        self.assertEqual(A[1,index_y], 3.)
+        self.assertEqual(std_prob.u[index_x], 5.)
+        std_prob.eval(np.ones(A.shape[1]))
+        self.assertEqual(std_prob.phi, 3.)
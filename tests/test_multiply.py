@@ -35,59 +35,61 @@ class TestMultiply(unittest.TestCase):
         y = optmod.variable.VariableScalar(name='y', value=3.)
 
         f = x*2
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_constant())
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], 2.)
         self.assertEqual(f.get_value(), 4.)
         self.assertEqual(str(f), 'x*%s' %rn(2.))
 
         f = 2.*x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_constant())
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], 2.)
         self.assertEqual(f.get_value(), 4.)
         self.assertEqual(str(f), 'x*%s' %rn(2.))
 
         f = x*y
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1] is y)
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertTrue(f.rows[0] is x)
+        self.assertTrue(f.cols[0] is y)
+        self.assertEqual(f.values[0], 1.)
         self.assertEqual(f.get_value(), 6)
         self.assertEqual(str(f), 'x*y')
 
         f = x*(y+3.)
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_function())
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertTrue(f.rows[0] is x)
+        self.assertTrue(f.cols[0] is y)
         self.assertEqual(f.get_value(), 12)
-        self.assertEqual(str(f), 'x*(y + %s)' %rn(3.))
+        self.assertEqual(str(f), 'x*y + x*%s' %rn(3.))
 
         f = (1-y)*x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0].is_function())
-        self.assertTrue(f.arguments[1] is x)
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertTrue(f.rows[0] is y)
+        self.assertTrue(f.cols[0] is x)
+        self.assertTrue(f.linear is x)
         self.assertEqual(f.get_value(), -4)
-        self.assertEqual(str(f), '(%s + y*%s)*x' %(rn(1.), rn(-1.)))
+        self.assertEqual(str(f), 'y*%s*x + x' %rn(-1.))
 
         f = (4.*x)*(3*y)
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0].is_function())
-        self.assertTrue(f.arguments[1].is_function())
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertEqual(f.values[0], 12.)
+        self.assertTrue(f.linear.is_zero())
         self.assertEqual(f.get_value(), 72)
-        self.assertEqual(str(f), 'x*%s*y*%s' %(rn(4), rn(3)))
+        self.assertEqual(str(f), 'x*%s*y' %rn(12))
 
         f = -x*5
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[1].is_constant())
-        self.assertTrue(f.arguments[0].is_variable())
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(f.coefficients[0], -5.)
+        self.assertTrue(f.variables[0] is x)
         self.assertEqual(str(f), 'x*%s' %rn(-5))
         self.assertEqual(f.get_value(), -10.)
 
         f = y*-x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertTrue(f.arguments[0] is y)
-        self.assertTrue(f.arguments[1].is_function())
-        self.assertEqual(str(f), 'y*x*%s' %rn(-1))
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertTrue(f.rows[0] is y)
+        self.assertTrue(f.cols[0] is x)
+        self.assertEqual(str(f), 'y*%s*x' %rn(-1))
         self.assertEqual(f.get_value(), -6.)
 
         f = optmod.sin(x)*y
@@ -117,6 +119,56 @@ class TestMultiply(unittest.TestCase):
 
         pass
 
+    def test_matmul(self):
+
+        import scipy.sparse as sp
+
+        r = np.random.randn(4,1)
+        x = optmod.VariableMatrix(name='x', value=r)
+        A = np.random.randn(3,4)
+        A[1,2] = 0.
+
+        for AA in [A, np.asmatrix(A), sp.csr_matrix(A), sp.coo_matrix(A)]:
+            f = AA @ x
+            self.assertTrue(isinstance(f, optmod.expression.ExpressionMatrix))
+            self.assertTupleEqual(f.shape, (3,1))
+            self.assertTrue(isinstance(f[0,0], optmod.function.LinearExpression))
+            self.assertEqual(len(f[0,0].variables), 4)
+            self.assertEqual(len(f[1,0].variables), 3)
+            self.assertLess(np.max(np.abs(f.get_value() - A.dot(r))), 1e-12)
+
+        # Expression on the left
+        B = np.random.randn(4,2)
+        f = x.get_data().T
+        f = optmod.expression.ExpressionMatrix(f) @ sp.csr_matrix(B)
+        self.assertTupleEqual(f.shape, (1,2))
+        self.assertLess(np.max(np.abs(f.get_value() - r.T.dot(B))), 1e-12)
+
+        # Affine and nonlinear entries
+        f = A @ (2*x + 1)
+        self.assertTrue(isinstance(f[2,0], optmod.function.LinearExpression))
+        self.assertLess(np.max(np.abs(f.get_value() - A.dot(2*r+1))), 1e-12)
+        f = A @ optmod.sin(x)
+        self.assertTrue(isinstance(f[2,0], optmod.function.add))
+        self.assertLess(np.max(np.abs(f.get_value() - A.dot(np.sin(r)))), 1e-12)
+
+        # Constraints go to the linear part of the problem
+        p = optmod.Problem(optmod.minimize(0.), [sp.csr_matrix(A) @ x == np.ones((3,1))])
+        std_prob = p.__get_std_problem__()
+        self.assertTupleEqual(std_prob.A.shape, (3,4))
+        self.assertEqual(std_prob.A.nnz, 11)
+        self.assertEqual(std_prob.f.size, 0)
+
+        self.assertRaises(ValueError, lambda: np.ones((3,3)) @ x)
+
+        # Lists and tuples are constant matrices, other operands are not
+        f = A.tolist() @ x
+        self.assertLess(np.max(np.abs(f.get_value() - A.dot(r))), 1e-12)
+        f = optmod.expression.ExpressionMatrix(x.get_data().T) @ tuple(map(tuple, B))
+        self.assertLess(np.max(np.abs(f.get_value() - r.T.dot(B))), 1e-12)
+        self.assertRaises(TypeError, lambda: x @ 2.)
+        self.assertRaises(TypeError, lambda: 'A' @ x)
+
     def test_one(self):
 
         x = optmod.variable.VariableScalar(name='x', value=3.)
@@ -8,11 +8,11 @@ class TestNegate(unittest.TestCase):
 
         x = optmod.variable.VariableScalar(name='x')
         f = -x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertEqual(f.name, 'multiply')
-        self.assertEqual(len(f.arguments), 2)
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_constant(-1.))
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(len(f.variables), 1)
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], -1.)
+        self.assertEqual(f.constant, 0.)
 
     def test_constant(self):
 
@@ -29,11 +29,10 @@ class TestNegate(unittest.TestCase):
         x = optmod.variable.VariableScalar(name='x', value=2.)
 
         f = -x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
-        self.assertEqual(f.name, 'multiply')
-        self.assertEqual(len(f.arguments), 2)
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_constant())
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(len(f.variables), 1)
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], -1.)
         
         self.assertEqual(f.get_value(), -2.)
         self.assertEqual(str(f), 'x*%s' %rn(-1.))
@@ -50,9 +49,9 @@ class TestNegate(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.multiply))
-                self.assertEqual(len(fij.arguments), 2)
-                self.assertTrue(fij.arguments[0] is x[i,j])
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertEqual(len(fij.variables), 1)
+                self.assertTrue(fij.variables[0] is x[i,j])
                 self.assertEqual(fij.get_value(), -value[i,j])
                 self.assertEqual(str(fij), 'x[%d,%d]*%s' %(i,j,rn(-1.)))
 
@@ -67,11 +66,11 @@ class TestNegate(unittest.TestCase):
 
         f = -(x + 1)
         self.assertEqual(f.get_value(), -(3.+1.))
-        self.assertEqual(str(f), '%s*x + %s' %(rn(-1),rn(-1)))
+        self.assertEqual(str(f), 'x*%s + %s' %(rn(-1),rn(-1)))
 
         f = -(1 - x)
         self.assertEqual(f.get_value(), -(1.-3.))
-        self.assertEqual(str(f), '%s + x' %rn(-1.))
+        self.assertEqual(str(f), 'x + %s' %rn(-1.))
 
         f = -(-x)
         self.assertEqual(f.get_value(), 3.)
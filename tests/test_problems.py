@@ -236,12 +236,10 @@ class TestProblems(unittest.TestCase):
         self.assertTrue(np.all(std_prob.J.col == np.array([index_x, index_y, index_x, index_s2, index_y, index_s3])))
         self.assertTrue(np.all(std_prob.J.data == np.zeros(6)))
         self.assertEqual(std_prob.H_combined.nnz, 3)
-        if index_x <= index_y:
-            self.assertTrue(np.all(std_prob.H_combined.row == np.array([index_y, index_x, index_y])))
-            self.assertTrue(np.all(std_prob.H_combined.col == np.array([index_x, index_x, index_y])))
-        else:
-            self.assertTrue(np.all(std_prob.H_combined.row == np.array([index_x, index_x, index_y])))
-            self.assertTrue(np.all(std_prob.H_combined.col == np.array([index_y, index_x, index_y])))
+        self.assertSetEqual(set(zip(std_prob.H_combined.row, std_prob.H_combined.col)),
+                            set([(max(index_x, index_y), min(index_x, index_y)),
+                                 (index_x, index_x),
+                                 (index_y, index_y)]))
         self.assertTrue(np.all(std_prob.H_combined.data == np.zeros(3)))
         
         var = np.random.randn(5)
@@ -272,22 +270,99 @@ class TestProblems(unittest.TestCase):
 
         # Combine H - ones
         std_prob.combine_H(np.ones(3))
-        self.assertTrue(np.all(std_prob.H_combined.data == np.array([1.,
-                                                                     -np.sin(var[index_x]),
-                                                                     -np.cos(var[index_y])])))
+        temp = np.zeros((5, 5))
+        temp[max(index_x, index_y), min(index_x, index_y)] = 1.
+        temp[index_x, index_x] = -np.sin(var[index_x])
+        temp[index_y, index_y] = -np.cos(var[index_y])
+        self.assertTrue(norm(std_prob.H_combined.toarray() - temp) < 1e-8)
 
         # Combine H - rand
         lam = np.random.randn(3)
         std_prob.combine_H(lam)
-        self.assertTrue(np.all(std_prob.H_combined.data == np.array([1.*lam[0],
-                                                                     -np.sin(var[index_x])*lam[1],
-                                                                     -np.cos(var[index_y])*lam[2]])))
+        temp = np.zeros((5, 5))
+        temp[max(index_x, index_y), min(index_x, index_y)] = 1.*lam[0]
+        temp[index_x, index_x] = -np.sin(var[index_x])*lam[1]
+        temp[index_y, index_y] = -np.cos(var[index_y])*lam[2]
+        self.assertTrue(norm(std_prob.H_combined.toarray() - temp) < 1e-8)
 
         # Properties
         self.assertTrue(len(std_prob.properties), 3)
         self.assertTrue('continuous' in std_prob.properties)
         self.assertTrue('optimization' in std_prob.properties)
-        self.assertTrue('nonlinear' in std_prob.properties)        
+        self.assertTrue('nonlinear' in std_prob.properties)
+
+    def test_sparsity(self):
+
+        x = optmod.VariableMatrix(name='x', value=np.random.rand(5,1))
+        y = optmod.VariableScalar(name='y', value=2.)
+
+        f = sin(x[0,0]*x[1,0]) + x[2,0]*x[3,0] + cos(y) + 3*x[4,0]
+        p = optmod.Problem(minimize(f), [x[0,0]*x[1,0] + x[2,0] <= 4,
+                                         sin(x[3,0]) + y == 1,
+                                         x[2,0] + x[4,0] == 2,
+                                         cos(x[4,0]*y)*x[0,0] >= 0])
+
+        sp = p.get_sparsity()
+        for fast_evaluator in [True, False]:
+            std_prob = p.__get_std_problem__(fast_evaluator=fast_evaluator)
+            self.assertEqual(sp['variables'], [std_prob.index2var[i] for i in range(std_prob.x.size)])
+            for key in ['A', 'J', 'Hphi', 'H_combined']:
+                m = getattr(std_prob, key).tocoo()
+                self.assertTupleEqual(sp[key].shape, m.shape)
+                self.assertSetEqual(set(zip(sp[key].row, sp[key].col)), set(zip(m.row, m.col)))
+        self.assertEqual(sp['Hphi'].nnz, 5)
+        self.assertTrue(np.all(sp['Hphi'].row >= sp['Hphi'].col))
+
+        # Separable objective: second derivatives of diagonal entries only
+        z = optmod.VariableMatrix(name='z', value=np.random.rand(300,1))
+        f = optmod.sum(sin(z))
+        self.assertEqual(len(f.__sparsity__()[1]), 300)
+        comp = f.__get_std_components__()
+        self.assertEqual(len(comp['Hphi_list']), 300)
+        self.assertTrue(all(v1 is v2 for v1, v2, d in comp['Hphi_list']))
+
+    def test_std_problem_cache(self):
+
+        x = optmod.VariableMatrix(name='x', value=np.random.rand(4,1))
+
+        c1 = x[0,0] + 2*x[1,0] <= 3
+        c2 = x[0,0]*x[2,0] == 1
+        c3 = sin(x[3,0]) + x[1,0] >= 0.5
+        p = optmod.Problem(minimize(x[0,0]*x[0,0] + cos(x[1,0])), [c1, c2])
+
+        # Unchanged problem is reused with current values
+        std_prob = p.get_std_problem()
+        self.assertTrue(p.get_std_problem() is std_prob)
+        x.set_value(np.ones((4,1)))
+        self.assertTrue(p.get_std_problem() is std_prob)
+        self.assertTrue(np.all(std_prob.x[[std_prob.var2index[x[i,0]] for i in range(3)]] == 1.))
+        self.assertFalse(p.get_std_problem(fast_evaluator=False) is std_prob)
+
+        # Components of unchanged constraints are reused
+        comp1 = p.__comp_cache__[id(c1)][2]
+        comp2 = p.__comp_cache__[id(c2)][2]
+        p.constraints.append(c3)
+        new_prob = p.get_std_problem()
+        self.assertFalse(new_prob is std_prob)
+        self.assertTrue(p.__comp_cache__[id(c1)][2] is comp1)
+        self.assertTrue(p.__comp_cache__[id(c2)][2] is comp2)
+
+        # Same as new problem
+        p.objective = maximize(x[2,0]*x[3,0])
+        for fast_evaluator in [True, False]:
+            std_prob = p.get_std_problem(fast_evaluator=fast_evaluator)
+            new_prob = optmod.Problem(maximize(x[2,0]*x[3,0]), [c1, c2, c3]).__get_std_problem__(fast_evaluator=fast_evaluator)
+            point = np.random.randn(std_prob.x.size)
+            std_prob.eval(point)
+            new_prob.eval(point)
+            self.assertEqual(std_prob.phi, new_prob.phi)
+            self.assertTrue(np.all(std_prob.gphi == new_prob.gphi))
+            self.assertTrue(np.all(std_prob.A.toarray() == new_prob.A.toarray()))
+            self.assertTrue(np.all(std_prob.b == new_prob.b))
+            self.assertTrue(np.all(std_prob.f == new_prob.f))
+            self.assertTrue(np.all(std_prob.J.toarray() == new_prob.J.toarray()))
+            self.assertTrue(np.all(std_prob.u == new_prob.u))
+            self.assertTrue(np.all(std_prob.l == new_prob.l))
 
     def test_solve_LP(self):
 
@@ -0,0 +1,111 @@
+import optmod
+import unittest
+import numpy as np
+
+class TestQuadraticExpressions(unittest.TestCase):
+
+    def test_construction(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        f = (2*x + 1)*(y - 3) + x*x
+        self.assertTrue(isinstance(f, optmod.function.QuadraticExpression))
+        self.assertEqual(len(f.rows), 2)
+        self.assertTrue(f.rows[0] is x and f.cols[0] is y)
+        self.assertTrue(f.rows[1] is x and f.cols[1] is x)
+        self.assertTrue(np.all(f.values == np.array([2., 1.])))
+        self.assertTrue(isinstance(f.linear, optmod.function.LinearExpression))
+        self.assertEqual(f.linear.constant, -3.)
+        self.assertEqual(f.get_value(), 5.*0. + 4.)
+
+        prop = f.__analyze__()
+        self.assertFalse(prop['affine'])
+        self.assertEqual(set(prop['a'].keys()), set([x, y]))
+        self.assertEqual(prop['b'], -3.)
+
+        # Scaling and sums stay quadratic
+        g = 3*f - x*y + 2*x
+        self.assertTrue(isinstance(g, optmod.function.QuadraticExpression))
+        self.assertEqual(len(g.rows), 3)
+        self.assertEqual(g.get_value(), 3*4. - 6. + 4.)
+        self.assertTrue(isinstance(-g, optmod.function.QuadraticExpression))
+        self.assertEqual((-g).get_value(), -g.get_value())
+
+        # Products with nonlinear expressions are general
+        self.assertTrue(isinstance(optmod.sin(x)*(x*y), optmod.function.multiply))
+        self.assertTrue(isinstance((x*y)*(x*y), optmod.function.multiply))
+
+    def test_derivatives(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        f = 3*x*x + y*y + 2*x*y + x + 6*y + 2
+        d = f.get_derivatives([x, y])
+        self.assertEqual(d[x].get_value(), 6*2. + 2*3. + 1.)
+        self.assertEqual(d[y].get_value(), 2*3. + 2*2. + 6.)
+
+        comp = f.__get_std_components__()
+        self.assertTrue(comp['phi'] is f)
+        gphi = dict(comp['gphi_list'])
+        self.assertEqual(gphi[x].get_value(), d[x].get_value())
+        self.assertEqual(gphi[y].get_value(), d[y].get_value())
+        Hphi = dict(((v1, v2), dd.get_value()) for v1, v2, dd in comp['Hphi_list'])
+        self.assertEqual(len(Hphi), 3)
+        self.assertEqual(Hphi[(x, x)], 6.)
+        self.assertEqual(Hphi[(y, y)], 2.)
+        self.assertEqual(Hphi[(x, y)], 2.)
+
+    def test_fast_evaluator(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+        z = optmod.VariableScalar(name='z', value=4.)
+        point = np.array([2., 3., 4.])
+
+        for f in [x*y,
+                  3*x*x - y*z + 4.,
+                  (x - 2*y + 1)*(z + 3) + z,
+                  optmod.cos(x*y)*(z - x*z)]:
+
+            e = f.get_fast_evaluator([x, y, z])
+            e.eval(point)
+            self.assertAlmostEqual(e.get_value(), f.get_value())
+
+            g = np.zeros(3)
+            e.eval_gradient(point, g)
+            d = f.get_derivatives([x, y, z])
+            for i, var in enumerate([x, y, z]):
+                self.assertAlmostEqual(g[i], d[var].get_value())
+
+    def test_std_problem(self):
+
+        x = optmod.VariableScalar(name='x', value=2.)
+        y = optmod.VariableScalar(name='y', value=3.)
+
+        f = 3*x*x + y*y + 2*x*y + x + 6*y + 2
+
+        for fast_evaluator in [True, False]:
+            for obj in [optmod.minimize(f), optmod.maximize(-f)]:
+
+                p = optmod.Problem(obj, [x*y <= 4, x + y >= 1])
+                std_prob = p.__get_std_problem__(fast_evaluator=fast_evaluator)
+                index_x = std_prob.var2index[x]
+                index_y = std_prob.var2index[y]
+                self.assertTrue(std_prob.Q_phi is not None)
+
+                point = np.zeros(std_prob.x.size)
+                point[index_x] = 2.
+                point[index_y] = 3.
+                std_prob.eval(point)
+
+                self.assertAlmostEqual(std_prob.phi, f.get_value())
+                self.assertEqual(std_prob.gphi[index_x], 6*2. + 2*3. + 1.)
+                self.assertEqual(std_prob.gphi[index_y], 2*3. + 2*2. + 6.)
+                H = std_prob.Hphi.toarray()
+                self.assertTrue(np.all(np.triu(H, 1) == 0.))
+                self.assertEqual(H[index_x,index_x], 6.)
+                self.assertEqual(H[index_y,index_y], 2.)
+                self.assertEqual(H[max(index_x,index_y),min(index_x,index_y)], 2.)
+                self.assertEqual(std_prob.f[0], 2.)
@@ -0,0 +1,118 @@
+import optmod
+import unittest
+import numpy as np
+import scipy.sparse as sp
+from optmod.expression import SparseExpressionMatrix, ExpressionMatrix
+
+class TestSparseExpressionMatrices(unittest.TestCase):
+
+    def test_construction(self):
+
+        x = optmod.VariableMatrix(name='x', value=[[1.], [2.], [3.]])
+
+        # Sparse constant
+        A = sp.coo_matrix(([1., 2., 3., -3.], ([0, 1, 1, 2], [0, 2, 2, 1])), shape=(3,3))
+        s = SparseExpressionMatrix(A)
+        self.assertTupleEqual(s.shape, (3,3))
+        self.assertEqual(s.nnz, 3)
+        self.assertTrue(np.all(s.row == np.array([0, 1, 2])))
+        self.assertTrue(np.all(s.col == np.array([0, 2, 1])))
+        self.assertEqual(s[1,2].get_value(), 5.)
+        self.assertTrue(s[1,1].is_zero())
+        self.assertTrue(np.all(s.get_value().toarray() == A.toarray()))
+
+        # Entries and coordinates (duplicates are summed, zeros dropped)
+        s = SparseExpressionMatrix(([x[0,0], x[1,0], optmod.sin(x[2,0]), x[0,0], 0.],
+                                    ([2, 0, 1, 2, 1], [0, 1, 1, 0, 0])),
+                                   shape=(3,2))
+        self.assertEqual(s.nnz, 3)
+        self.assertTrue(np.all(s.row == np.array([0, 1, 2])))
+        self.assertTrue(isinstance(s[2,0], optmod.function.LinearExpression))
+        self.assertEqual(s[2,0].get_value(), 2.)
+        self.assertEqual(s.get_variables(), set([x[0,0], x[1,0], x[2,0]]))
+        self.assertRaises(ValueError, SparseExpressionMatrix, ([x[0,0]], ([3], [0])), (3,2))
+
+        # Dense
+        s = SparseExpressionMatrix(ExpressionMatrix([[x[0,0], 0.], [0., 2*x[1,0]]]))
+        self.assertEqual(s.nnz, 2)
+        self.assertEqual(s[1,1].get_value(), 4.)
+        d = s.todense()
+        self.assertTupleEqual(d.shape, (2,2))
+        self.assertTrue(np.all(d.get_value() == np.array([[1., 0.], [0., 4.]])))
+
+        # Storage scales with nonzeros
+        n = 1000000
+        s = SparseExpressionMatrix(([x[0,0], x[1,0]], ([0, n-1], [n-1, 0])), shape=(n,n))
+        self.assertEqual(s.nnz, 2)
+        self.assertEqual((2*s).get_value().sum(), 6.)
+
+    def test_operations(self):
+
+        r = np.random.randn(4,1)
+        x = optmod.VariableMatrix(name='x', value=r)
+        A = sp.random(4, 3, density=0.5, format='coo', random_state=1)
+        s = SparseExpressionMatrix(A)
+        t = SparseExpressionMatrix(([x[0,0], x[1,0]*x[2,0], optmod.cos(x[3,0])],
+                                    ([0, 1, 3], [2, 0, 0])), shape=(4,3))
+        S = s.get_value().toarray()
+        T = t.get_value().toarray()
+
+        self.assertTrue(np.allclose((s + t).get_value().toarray(), S + T))
+        self.assertTrue(np.allclose((t - s).get_value().toarray(), T - S))
+        self.assertTrue(np.allclose((A - t).get_value().toarray(), S - T))
+        self.assertTrue(np.allclose((-t).get_value().toarray(), -T))
+        self.assertTrue(np.allclose((3.*t*x[0,0]).get_value().toarray(), 3*T*r[0,0]))
+        self.assertTrue(np.allclose((x[0,0]*t).get_value().toarray(), T*r[0,0]))
+        self.assertEqual((0.*t).nnz, 0)
+
+        # Dense results
+        f = t + np.ones((4,3))
+        self.assertTrue(isinstance(f, ExpressionMatrix))
+        self.assertTrue(np.allclose(f.get_value(), T + 1.))
+        self.assertTrue(np.allclose((1. - t).get_value(), 1. - T))
+
+        # Products with constants
+        B = sp.random(3, 5, density=0.4, format='csr', random_state=2)
+        f = t @ B
+        self.assertTrue(isinstance(f, SparseExpressionMatrix))
+        self.assertTupleEqual(f.shape, (4,5))
+        self.assertTrue(np.allclose(f.get_value().toarray(), T.dot(B.toarray())))
+        C = np.random.randn(2,4)
+        f = C @ t
+        self.assertTupleEqual(f.shape, (2,3))
+        self.assertTrue(np.allclose(f.get_value().toarray(), C.dot(T)))
+        self.assertRaises(ValueError, lambda: t @ np.ones((4,4)))
+        f = t @ B.toarray().tolist()
+        self.assertTrue(np.allclose(f.get_value().toarray(), T.dot(B.toarray())))
+        f = C.tolist() @ t
+        self.assertTrue(np.allclose(f.get_value().toarray(), C.dot(T)))
+        self.assertRaises(TypeError, lambda: t @ 2.)
+
+        # Transpose
+        self.assertTrue(np.allclose(t.transpose().get_value().toarray(), T.T))
+
+    def test_constraints(self):
+
+        x = optmod.VariableMatrix(name='x', value=[[1.], [2.]])
+        A = sp.coo_matrix(([1., 2., 3.], ([0, 1, 1], [0, 0, 1])), shape=(3,2))
+
+        # Constraints only for stored entries
+        s = SparseExpressionMatrix(([x[0,0], x[1,0]], ([0, 2], [0, 1])), shape=(3,2))
+        c = s <= 5.
+        self.assertTrue(isinstance(c, optmod.constraint.ConstraintArray))
+        self.assertTupleEqual(c.shape, (2,))
+        self.assertTrue(c[1].lhs is x[1,0])
+        self.assertRaises(ValueError, s.__eq__, 1.)
+        b = np.zeros((3,2))
+        b[0,0] = 4.
+        c = s == b
+        self.assertEqual(c[0].rhs.get_value(), 4.)
+        b[1,1] = 1.
+        self.assertRaises(ValueError, s.__eq__, b)
+        c = s == A
+        self.assertTupleEqual(c.shape, (4,))
+
+        p = optmod.Problem(optmod.minimize(x[0,0]), [s >= -1., s <= 10.])
+        std_prob = p.__get_std_problem__()
+        self.assertTrue(np.all(std_prob.l == -1.))
+        self.assertTrue(np.all(std_prob.u == 10.))
@@ -10,10 +10,11 @@ class TestSubtract(unittest.TestCase):
 
         f = x-1
         self.assertEqual(f.name, 'add')
-        self.assertEqual(len(f.arguments), 2)
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(isinstance(f.arguments[1], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), -1.)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(len(f.variables), 1)
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], 1.)
+        self.assertEqual(f.constant, -1.)
 
     def test_constant_constant(self):
 
@@ -32,36 +33,34 @@ class TestSubtract(unittest.TestCase):
         y = optmod.variable.VariableScalar(name='y', value=3.)
 
         f = x - 1.
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(isinstance(f.arguments[1], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), -1.)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.constant, -1.)
         self.assertEqual(f.get_value(), 1.)
         self.assertEqual(str(f), 'x + %s' %rn(-1.))
         
         f = 1. - x
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[1].is_function())
-        self.assertTrue(isinstance(f.arguments[0], optmod.constant.Constant))
-        self.assertEqual(f.arguments[1].get_value(), -2)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertEqual(f.coefficients[0], -1.)
+        self.assertEqual(f.constant, 1.)
         self.assertEqual(f.get_value(), -1.)
-        self.assertEqual(str(f), '%s + x*%s' %(rn(1.), rn(-1.)))
+        self.assertEqual(str(f), 'x*%s + %s' %(rn(-1.), rn(1.)))
 
         f = x - y
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(f.arguments[0] is x)
-        self.assertTrue(f.arguments[1].is_function())
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(f.variables[0] is x)
+        self.assertTrue(f.variables[1] is y)
+        self.assertTrue(np.all(f.coefficients == np.array([1., -1.])))
         self.assertEqual(f.get_value(), -1.)
         self.assertEqual(str(f), 'x + y*%s' %rn(-1.))
 
         f = 3. - x - y
-        self.assertTrue(isinstance(f, optmod.function.add))
-        self.assertTrue(isinstance(f.arguments[1], optmod.function.multiply))
-        self.assertTrue(isinstance(f.arguments[2], optmod.function.multiply))
-        self.assertTrue(f.arguments[0].is_constant())
-        self.assertEqual(f.arguments[0].get_value(), 3)
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertTrue(np.all(f.coefficients == np.array([-1., -1.])))
+        self.assertEqual(f.constant, 3)
         self.assertEqual(f.get_value(), -2.)
-        self.assertEqual(str(f), '%s + x*%s + y*%s' %(rn(3.), rn(-1.), rn(-1.)))
+        self.assertEqual(str(f), 'x*%s + y*%s + %s' %(rn(-1.), rn(-1.), rn(3.)))
 
     def test_scalar_matrix(self):
 
@@ -77,9 +76,9 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is x)
-                self.assertEqual(fij.arguments[1].get_value(), -r[i,j])
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is x)
+                self.assertEqual(fij.constant, -r[i,j])
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == 2. - r))
         self.assertEqual(str(f),
@@ -91,9 +90,9 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0].is_constant())
-                self.assertEqual(fij.arguments[0].get_value(), r[i,j])
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertEqual(fij.coefficients[0], -1.)
+                self.assertEqual(fij.constant, r[i,j])
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == r - 2.))
 
@@ -110,9 +109,9 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is y[i,j])
-                self.assertEqual(fij.arguments[1].get_value(), -1.)
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is y[i,j])
+                self.assertEqual(fij.constant, -1.)
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == np.array(value) - 1))
         self.assertEqual(str(f),
@@ -132,9 +131,9 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[1].is_function())
-                self.assertTrue(fij.arguments[0] is x)
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is x)
+                self.assertTrue(fij.variables[1] is y[i,j])
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == 2. - np.array(value)))
         self.assertEqual(str(f),
@@ -146,9 +145,9 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertTrue(isinstance(fij, optmod.function.add))
-                self.assertTrue(fij.arguments[0] is y[i,j])
-                self.assertTrue(fij.arguments[1].is_function())
+                self.assertTrue(isinstance(fij, optmod.function.LinearExpression))
+                self.assertTrue(fij.variables[0] is y[i,j])
+                self.assertTrue(fij.variables[1] is x)
         self.assertTrue(isinstance(f.get_value(), np.matrix))
         self.assertTrue(np.all(f.get_value() == np.array(value) - 2.))
         self.assertEqual(str(f),
@@ -159,9 +158,9 @@ class TestSubtract(unittest.TestCase):
         self.assertTrue(isinstance(f, optmod.expression.ExpressionMatrix))
         for i in range(2):
             for j in range(3):
-                self.assertEqual(str(f[i,j]), 'y[%d,%d] + %s + %s + x' %(i, j, rn(-1), rn(-3)))
+                self.assertEqual(str(f[i,j]), 'y[%d,%d] + x + %s' %(i, j, rn(-4)))
                 self.assertTrue(f[i,j].is_function())
-                self.assertEqual(len(f[i,j].arguments), 4)
+                self.assertEqual(len(f[i,j].variables), 2)
         self.assertTrue(np.all(f.get_value() == (np.array(value) - 1.) - (3. - 2.)))
 
     def test_matrix_matrix(self):
@@ -188,7 +187,7 @@ class TestSubtract(unittest.TestCase):
         for i in range(2):
             for j in range(3):
                 fij = f[i,j]
-                self.assertEqual(str(fij), '%s + x[%d,%d]*%s' %(rn(value2[i,j]), i,j, rn(-1)))
+                self.assertEqual(str(fij), 'x[%d,%d]*%s + %s' %(i,j, rn(-1), rn(value2[i,j])))
         self.assertTrue(np.all(f.get_value() == value2 - np.matrix(value1)))
 
         f = x - y
@@ -217,7 +216,7 @@ class TestSubtract(unittest.TestCase):
         self.assertTrue(f is x)
 
         f = 0 - x
-        self.assertTrue(isinstance(f, optmod.function.multiply))
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
         self.assertEqual(str(f), 'x*-1.00e+00')
 
     def test_analyze(self):
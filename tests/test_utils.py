@@ -44,3 +44,32 @@ class TestUtils(unittest.TestCase):
                                   ' [ y[2,0] + y[2,1] ]]\n'))
         
         self.assertRaises(Exception, optmod.sum, x, 2)
+
+    def test_sum_iterable(self):
+
+        x = optmod.VariableMatrix('x', value=np.ones((4,3)))
+        y = optmod.VariableScalar('y', value=2.)
+
+        # Generator with affine and nonlinear terms
+        f = optmod.sum(3*x[i,j] + optmod.sin(x[i,j]) for i in range(4) for j in range(3))
+        self.assertTrue(type(f) is optmod.function.add)
+        self.assertEqual(len(f.arguments), 13)
+        self.assertTrue(isinstance(f.arguments[-1], optmod.function.LinearExpression))
+        self.assertEqual(len(f.arguments[-1].variables), 12)
+        self.assertAlmostEqual(f.get_value(), 12*(3.+np.sin(1.)))
+
+        # Lists with numbers, nested lists and matrices
+        f = optmod.sum([y, 1., [2*y, 3.], x])
+        self.assertTrue(isinstance(f, optmod.function.LinearExpression))
+        self.assertEqual(f.constant, 4.)
+        self.assertEqual(f.get_value(), 2.+4.+4.+12.)
+        self.assertTrue(optmod.sum([]).is_zero())
+
+        # Axis with nonlinear entries
+        f = optmod.sum(optmod.sin(x) + 2*x, axis=0)
+        self.assertTupleEqual(f.shape, (1,3))
+        self.assertLess(np.max(np.abs(f.get_value() - 4*(np.sin(1.)+2.))), 1e-12)
+        f = optmod.sum(x*y, axis=1)
+        self.assertTupleEqual(f.shape, (4,1))
+        self.assertTrue(isinstance(f[0,0], optmod.function.QuadraticExpression))
+        self.assertTrue(np.all(f.get_value() == 6.))
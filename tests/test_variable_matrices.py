@@ -141,3 +141,52 @@ class TestVariableMatrices(unittest.TestCase):
             for j in range(3):
                 self.assertEqual(x[i,j].get_value(), r[i,j])
         
+
+    def test_views(self):
+
+        x = optmod.VariableMatrix(name='x', shape=(1000,1000))
+        self.assertEqual(x.values.size, 1000000)
+        self.assertEqual(len(x.__views__), 0)
+
+        # Entries are created on access and cached
+        v = x[3,4]
+        self.assertTrue(isinstance(v, optmod.variable.VariableScalar))
+        self.assertTrue(x[3,4] is v)
+        self.assertTrue(x[-997,-996] is v)
+        self.assertEqual(v.id, x.base_id + 3004)
+        self.assertEqual(x[999,999].id, x.base_id + 999999)
+        self.assertEqual(len(x.__views__), 2)
+        self.assertRaises(IndexError, x.__getitem__, (1000,0))
+
+        # Values are stored in the matrix array
+        v.set_value(5.)
+        self.assertEqual(x.values[3004], 5.)
+        x.set_value(np.ones((1000,1000)))
+        self.assertEqual(v.get_value(), 1.)
+        self.assertEqual((2*v + 1).get_value(), 3.)
+
+        # Submatrices
+        y = x[3,2:5]
+        self.assertTrue(isinstance(y, optmod.expression.ExpressionMatrix))
+        self.assertTupleEqual(y.shape, (1,3))
+        self.assertTrue(y[0,2] is v)
+
+    def test_variable_vector(self):
+
+        x = optmod.VariableMatrix(name='x', shape=(2,3))
+        y = optmod.VariableScalar(name='y', value=7.)
+        z = optmod.VariableMatrix(name='z', shape=(4,1))
+
+        variables = [x[1,2], y, z[3,0], x[0,0], z[0,0]]
+        v = optmod.variable.VariableVector(variables)
+        self.assertEqual(len(v.blocks), 2)
+        self.assertEqual(len(v.scalars), 1)
+        self.assertTrue(np.all(v.get_value() == np.array([0., 7., 0., 0., 0.])))
+
+        v.set_value(np.array([1., 2., 3., 4., 5.]))
+        self.assertTrue(np.all(v.get_value() == np.array([1., 2., 3., 4., 5.])))
+        self.assertTrue(np.all(x.get_value() == np.array([[4., 0., 0.], [0., 0., 1.]])))
+        self.assertTrue(np.all(z.get_value().T == np.array([5., 0., 0., 3.])))
+        self.assertEqual(y.get_value(), 2.)
+        for var, val in zip(variables, [1., 2., 3., 4., 5.]):
+            self.assertEqual(var.get_value(), val)